@@ -4,8 +4,10 @@
 # Standard python libraries
 import os
 import json
+import time
+import threading
 # Third-party libraries
-from flask import Flask, redirect, request, url_for, render_template, session
+from flask import Flask, redirect, request, url_for, render_template, session, jsonify
 from flask_login import (
     UserMixin,
     LoginManager,
@@ -21,8 +23,8 @@ import pandas as pd
 import numpy as np
 import plotly
 # Internal imports
-from ffpackage import mfl, analysis, viz
-from appmanager import db, user
+from ffpackage import mfl, analysis, viz, league, simulation, draft
+from appmanager import db, user, cache
 
 
 
@@ -61,6 +63,11 @@ app.secret_key = os.environ.get("SECRET_KEY")
 
 
 
+# In-process copy of the predictions table, reloaded only when the scheduler publishes a new version
+predictionsCache = cache.TableCache("predictions")
+
+
+
 ### Login and Logout pages
 # Index route
 @app.route('/')
@@ -144,6 +151,15 @@ def logout():
 
 
 
+### Status pages
+# Database connection pool usage for this worker
+@app.route("/status/db")
+#@login_required
+def dbStatus():
+    return jsonify(db.pool_stats())
+
+
+
 ### Landing pages
 
 # Collect league/franchise data from the user 
@@ -196,80 +212,49 @@ def franchiseCallback():
 def predictive():
     user_league = session.get('user_league', None)
 
-    # Get Franchises in the league
-    franchise_df = mfl.get_franchises(user_league)
+    # Get Franchises, franchise rosters, and Free Agents in the league; the three MFL calls run concurrently
+    mflData = mfl.fetch_concurrently({
+        "franchises": (mfl.get_franchises, user_league),
+        "rosters": (mfl.get_rosters, user_league),
+        "freeAgents": (mfl.get_freeAgents, user_league),
+    })
+    franchise_df = mflData["franchises"]
+    rosters_df = mflData["rosters"]
+    freeAgent_df = mflData["freeAgents"]
+
     # Append a row to carry free agents
     freeAgentRow =  {"franchiseID":["FA"], "franchiseName":["Free Agent"], "franchiseAbbrev":["FA"]}
     freeAgentRow = pd.DataFrame.from_dict(freeAgentRow)
     franchise_df = pd.concat([franchise_df, freeAgentRow], axis=0, ignore_index=True)
 
-    # Get franchise rosters
-    rosters_df = mfl.get_rosters(user_league)
-
-    # Get Free Agents
-    freeAgent_df = mfl.get_freeAgents(user_league)
-
     # Combine Franchise rosters with free agents to get all players
     rosters_df = pd.concat([rosters_df, freeAgent_df], axis=0)
 
     # Get all players, sharkRank, and ADP
-    player_df = db.read_db("predictions")
+    player_df = predictionsCache.get()
 
     # Merge all dfs
     complete = player_df.merge(rosters_df, on=['id_mfl', 'week'], how='left').merge(franchise_df, on='franchiseID', how='left')
     complete = complete.loc[complete['franchiseID'].notna()]
 
     ## Calculate fantasy scores customized based on league-specific scoring rules
-    scoringDict = {
-        'passA': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
-        'passC': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
-        'passY': {"multiplier":0.04, "bins":[-np.inf, np.inf], "labels":[0]},
-        'passT': {"multiplier":4, "bins":[-np.inf, np.inf], "labels":[0]},
-        'passI': {"multiplier":-2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'pass2': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'rushA': {"multiplier":0.1, "bins":[-np.inf, np.inf], "labels":[0]},
-        'rushY': {"multiplier":0.1, "bins":[-np.inf, np.inf], "labels":[0]},
-        'rushT': {"multiplier":6, "bins":[-np.inf, np.inf], "labels":[0]},
-        'rush2': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'recC': {"multiplier":0.25, "bins":[-np.inf, np.inf], "labels":[0]},
-        'recY': {"multiplier":0.1, "bins":[-np.inf, np.inf], "labels":[0]},
-        'recT': {"multiplier":6, "bins":[-np.inf, np.inf], "labels":[0]},
-        'rec2': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'fum': {"multiplier":-2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'XPA': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
-        'XPM': {"multiplier":3, "bins":[-np.inf, np.inf], "labels":[0]},
-        'FGA': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
-        'FGM': {"multiplier":3, "bins":[-np.inf, np.inf], "labels":[0]},
-        'FG50': {"multiplier":5, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defSack': {"multiplier":1, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defI': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defSaf': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defFum': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defBlk': {"multiplier":1.5, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defT': {"multiplier":6, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defPtsAgainst': {"multiplier":0, "bins":[-5,0,6,13,17,21,27,34,45,59,99], "labels":[10,8,7,5,3,2,0,-1,-3,-5]},
-        'defPassYAgainst': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defRushYAgainst': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defYdsAgainst': {"multiplier":0, "bins":[0,274,324,375,425,999], "labels":[5,2,0,-2,-5]}
-    }
+    # The league's scoring and lineup rules are read from MFL and compiled once per league
+    profile = league.get_profile(user_league)
     # Calculate predicted fantasy scores based on predicted NFL stats and league-specific scoring rules
-    analyzed = analysis.calculate_scoresFF(complete, scoringDict)
+    analyzed = analysis.calculate_scoresFF(complete, profile.scoring)
 
     # Calculate relative values
     # Get league-specific info on available slots
-    posMax = {"QB":2, "RB":5, "WR":6, "TE":5, "PK":2, "DF":2}
-    posMin = {"QB":1, "RB":2, "WR":2, "TE":2, "PK":2, "DF":2}
-    totalStarters = 15
+    posMax = profile.lineup.posMax
+    posMin = profile.lineup.posMin
+    totalStarters = profile.lineup.startersMax
     predMethod = "scoreTotal"
 
     # Select starters
-    analyzed = analysis.starterSelector(analyzed, how=predMethod, startersMax=totalStarters, posMax=posMax, posMin=posMin)
+    analyzed = analysis.optimalStarters(analyzed, how=predMethod, startersMax=totalStarters, posMax=posMax, posMin=posMin)
 
-    # Find the lowest scoring player on the field and set them as the low bar
-    for x in ["QB", "RB", "WR", "TE", "PK", "DF"]:
-        positionMinPred = analyzed.loc[(analyzed['pos']==x) & (analyzed['startSelector']=='Starter'), predMethod].min()
-        # Calculate relative values
-        analyzed.loc[analyzed['pos']==x, 'relativeValue'] = analyzed.loc[analyzed['pos']==x, predMethod] - positionMinPred
+    # Find the lowest scoring player on the field at each position and set them as the low bar
+    analyzed['relativeValue'] = analysis.relativeValues(analyzed, predMethod, method="lastStarter")
 
     # Convert to json
     predictiveData = analyzed.to_json()
@@ -286,53 +271,32 @@ def live():
     user_league = session.get("user_league")
 
     ## Calculate fantasy scores customized based on league-specific scoring rules
-    scoringDict = {
-        'passA': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
-        'passC': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
-        'passY': {"multiplier":0.04, "bins":[-np.inf, np.inf], "labels":[0]},
-        'passT': {"multiplier":4, "bins":[-np.inf, np.inf], "labels":[0]},
-        'passI': {"multiplier":-2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'pass2': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'rushA': {"multiplier":0.1, "bins":[-np.inf, np.inf], "labels":[0]},
-        'rushY': {"multiplier":0.1, "bins":[-np.inf, np.inf], "labels":[0]},
-        'rushT': {"multiplier":6, "bins":[-np.inf, np.inf], "labels":[0]},
-        'rush2': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'recC': {"multiplier":0.25, "bins":[-np.inf, np.inf], "labels":[0]},
-        'recY': {"multiplier":0.1, "bins":[-np.inf, np.inf], "labels":[0]},
-        'recT': {"multiplier":6, "bins":[-np.inf, np.inf], "labels":[0]},
-        'rec2': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'fum': {"multiplier":-2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'XPA': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
-        'XPM': {"multiplier":3, "bins":[-np.inf, np.inf], "labels":[0]},
-        'FGA': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
-        'FGM': {"multiplier":3, "bins":[-np.inf, np.inf], "labels":[0]},
-        'FG50': {"multiplier":5, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defSack': {"multiplier":1, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defI': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defSaf': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defFum': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defBlk': {"multiplier":1.5, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defT': {"multiplier":6, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defPtsAgainst': {"multiplier":0, "bins":[-5,0,6,13,17,21,27,34,45,59,99], "labels":[10,8,7,5,3,2,0,-1,-3,-5]},
-        'defPassYAgainst': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defRushYAgainst': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
-        'defYdsAgainst': {"multiplier":0, "bins":[0,274,324,375,425,999], "labels":[5,2,0,-2,-5]}
-    }
-
-    # Get MFL scoring data
-    liveScores = mfl.get_liveScoring(user_league)
-    # Get Franchises in the league
-    franchises = mfl.get_franchises(user_league)
-    # Get all players and predictions
-    predictions = db.read_db("predictions")
+    profile = league.get_profile(user_league)
+
+    # Get MFL scoring data and the Franchises in the league; the two MFL calls run concurrently
+    mflData = mfl.fetch_concurrently({
+        "liveScores": (mfl.get_liveScoring, user_league),
+        "franchises": (mfl.get_franchises, user_league),
+    })
+    liveScores = mflData["liveScores"]
+    franchises = mflData["franchises"]
+    # The week being scored live
+    current_week = liveScores['week'].max()
+    # Get predictions for the current week only, with just the columns needed for scoring and charting
+    columns = ['id_mfl', 'week', 'playerName', 'pos'] + profile.scoring.columns
+    if predictionsCache.loaded():
+        predictions = predictionsCache.get()
+        predictions = predictions.loc[predictions['week']==current_week, columns]
+    # A worker that has not loaded the predictions yet reads just this week's rows from the database while the cache loads
+    else:
+        predictionsCache.warm()
+        predictions = db.read_predictions(columns=columns, weeks=[current_week], dtypes={'pos':'category'})
 
     # Calculate predicted fantasy scores based on predicted NFL stats and league-specific scoring rules
-    predictions = analysis.calculate_scoresFF(predictions, scoringDict)
-    # Filter:
-    predictions = predictions.loc[predictions['week']==current_week]
+    predictions = analysis.calculate_scoresFF(predictions, profile.scoring)
 
     # Merge: merge liveScores, franchises, and predictions
-    df = liveScores.merge(franchises, how='left', on='franchiseID').merge(predictions, how='left', on='id_mfl')
+    df = liveScores.merge(franchises, how='left', on='franchiseID').merge(predictions, how='left', on=['id_mfl', 'week'])
 
     # Clean: convert to float data types
     df['liveScore'] = df['liveScore'].astype('float64')
@@ -343,13 +307,108 @@ def live():
 
     # Analyze:
     # Calculate each player's expected score at the end of the game
-    df['expectedLiveScore'] = df.apply(analysis.expectedLiveScore, axis=1)
+    df['expectedLiveScore'] = analysis.expectedLiveScores(df)
     # Set colors for chart 
-    df['color'] = df.apply(analysis.colorPicker, axis=1)
+    df['color'] = analysis.liveColors(df)
 
     # Convert to JSON
     liveData = df.to_json()
     # Render html template in flask
     return render_template('live.html', liveData=liveData)
 
+
+@app.route('/odds')
+#@login_required
+def odds():
+    # Retrieve the user's leagueID from the session data
+    user_league = session.get("user_league")
+    profile = league.get_profile(user_league)
+
+    # Get MFL scoring data, rosters, schedule and standings; the four MFL calls run concurrently
+    mflData = mfl.fetch_concurrently({
+        "liveScores": (mfl.get_liveScoring, user_league),
+        "rosters": (mfl.get_rosters, user_league),
+        "schedule": (mfl.get_schedule, user_league),
+        "standings": (mfl.get_standings, user_league),
+    })
+    liveScores = mflData["liveScores"]
+    current_week = liveScores['week'].max()
+
+    # Calculate predicted fantasy scores for every week based on league-specific scoring rules
+    predictions = predictionsCache.get()
+    predictions = predictions[['id_mfl', 'week', 'pos', 'team'] + profile.scoring.columns]
+    predictions = analysis.calculate_scoresFF(predictions, profile.scoring)
+
+    # Simulate this week's matchups from the live scores, and the rest of the season from the current standings
+    matchupOdds = simulation.matchup_odds(liveScores, predictions.loc[predictions['week']==current_week])
+    playoffOdds = simulation.playoff_odds(
+        predictions, mflData["rosters"], mflData["schedule"], mflData["standings"], current_week,
+        profile.lineup.startersMax, profile.lineup.posMax, profile.lineup.posMin
+    )
+    return jsonify(matchups=matchupOdds.to_dict(orient='records'), playoffs=playoffOdds.to_dict(orient='records'))
+
+
+@app.route('/draft')
+#@login_required
+def draftBoard():
+    # Retrieve the user's leagueID from the session data
+    user_league = session.get("user_league")
+    profile = league.get_profile(user_league)
+
+    # Get the draft so far and the Franchises in the league; the two MFL calls run concurrently
+    mflData = mfl.fetch_concurrently({
+        "draftResults": (mfl.get_draftResults, user_league),
+        "franchises": (mfl.get_franchises, user_league),
+    })
+    draftResults = mflData["draftResults"]
+
+    # Bring the league's board up to date with the picks made since the last request, on MFL or entered by hand in any worker
+    board = get_draftBoard(user_league, profile, len(mflData["franchises"]))
+    board.sync(draft.merge_picks(draftResults, db.read_draftPicks(user_league)))
+
+    # Recommend players for the franchise on the clock
+    onTheClock = draft.on_the_clock(draftResults)
+    recommendations = board.recommend(onTheClock)
+    return jsonify(onTheClock=onTheClock, recommendations=recommendations.to_dict(orient='records'))
+
+# Manually enter a pick that MFL does not know about yet
+# The pick is stored in the database, so every worker's board picks it up on its next /draft request
+@app.route('/draft/pick', methods=['POST'])
+#@login_required
+def draftPick():
+    user_league = session.get("user_league")
+    # The franchise is required: a pick without one would not count against any franchise's positions
+    if not request.form.get("id_mfl") or not request.form.get("franchiseID"):
+        return "id_mfl and franchiseID are required.", 400
+    db.save_draftPick(user_league, request.form["id_mfl"], request.form["franchiseID"])
+    return jsonify(picks=len(db.read_draftPicks(user_league)))
+
+# Draft boards by league as (predictions version, expiry time, board), rebuilt when a new predictions version is published
+# Each use pushes a board's expiry back; boards of leagues that stop drafting expire and are dropped on the next write
+DRAFT_BOARD_TTL = 6 * 3600
+draftBoards = {}
+draftBoardsLock = threading.Lock()
+
+# Return the league's draft board for the current predictions, building it on first use
+# Built under the lock so concurrent first requests share one board; a new board has no picks until the caller syncs it
+def get_draftBoard(user_league, profile, nFranchises):
+    # The frame and its version are read together, so a fresh worker's first board is stored under the version it was built from
+    (predictions, version) = predictionsCache.get_with_version()
+    now = time.time()
+    with draftBoardsLock:
+        cached = draftBoards.get(user_league)
+        if cached is not None and cached[0] == version:
+            draftBoards[user_league] = (version, now + DRAFT_BOARD_TTL, cached[2])
+            return cached[2]
+        # Calculate season values based on league-specific scoring rules
+        predictions = predictions[['id_mfl', 'week', 'pos'] + profile.scoring.columns]
+        predictions = analysis.calculate_scoresFF(predictions, profile.scoring)
+        values = draft.season_values(predictions, 'scoreTotal')
+        board = draft.DraftBoard(values, 'scoreTotal', draft.replacement_ranks(nFranchises, profile.lineup.posMin), profile.lineup.posMax)
+        # Drop expired boards, then store this one
+        for expiredLeague in [key for (key, entry) in draftBoards.items() if entry[1] < now]:
+            del draftBoards[expiredLeague]
+        draftBoards[user_league] = (version, now + DRAFT_BOARD_TTL, board)
+    return board
+
 # Sleeper 2
\ No newline at end of file
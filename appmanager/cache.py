@@ -0,0 +1,111 @@
+# Import dependencies
+import os
+import select
+import threading
+import psycopg2
+# Internal imports
+from appmanager import db, snapshot
+
+
+# In-process copy of a published table, shared by all routes in a worker
+# The frame is reloaded in the background only when the table's version in table_versions changes
+# A watcher thread LISTENs for the notification sent by db.publish_df and also re-checks the version every pollSeconds
+class TableCache:
+    def __init__(self, tableName, pollSeconds=60, loader=None):
+        self.tableName = tableName
+        self.pollSeconds = pollSeconds
+        # Function that reads the whole table given its version; by default the memory-mapped snapshot, falling back to the database
+        self.loader = loader or (lambda version: snapshot.load_table(tableName, version))
+        # (frame, version), swapped in as one object so readers never see a frame with another version's stamp
+        self._entry = None
+        self._lock = threading.Lock()
+        self._watcherPid = None
+
+    # Return the cached frame, loading it on first use
+    # Routes get a shallow copy: they can add or replace columns freely but must not modify values in place
+    def get(self):
+        return self.get_with_version()[0]
+
+    # Return the cached frame and the version it was loaded for, read together
+    def get_with_version(self):
+        if self._entry is None:
+            with self._lock:
+                if self._entry is None:
+                    # Without the published version, load whatever snapshot is on disk; the watcher reloads once it can read the version
+                    try:
+                        version = db.get_version(self.tableName)
+                    except Exception as error:
+                        print(f"{self.tableName} version unavailable, loading the latest snapshot: {error}")
+                        version = None
+                    self._load(version)
+        self._start_watcher()
+        (frame, version) = self._entry
+        return (frame.copy(deep=False), version)
+
+    # Whether the frame has been loaded in this process
+    def loaded(self):
+        return self._entry is not None
+
+    # Load the frame in a background thread, for routes that can answer a cold request another way in the meantime
+    # get() loads under the lock, so threads started while a load is running just wait for it
+    def warm(self):
+        if self._entry is None and not self._lock.locked():
+            threading.Thread(target=self._warm, name=f"{self.tableName}-warm", daemon=True).start()
+
+    def _warm(self):
+        try:
+            self.get()
+        except Exception as error:
+            print(f"{self.tableName} cache load failed: {error}")
+
+    # Version of the cached frame, None before it is loaded
+    def version(self):
+        entry = self._entry
+        return entry[1] if entry is not None else None
+
+    # Read the table and swap it in; routes holding the old frame keep using it until they finish
+    def _load(self, version):
+        self._entry = (self.loader(version), version)
+
+    # Reload if the published version differs from the cached one
+    # If the version cannot be read the error is raised and the cached frame is kept
+    def refresh(self):
+        version = db.get_version(self.tableName)
+        if version != self.version():
+            with self._lock:
+                if version != self.version():
+                    self._load(version)
+
+    # Start the watcher thread once per process; threads do not survive gunicorn's fork, so check the pid
+    def _start_watcher(self):
+        if self._watcherPid == os.getpid():
+            return
+        with self._lock:
+            if self._watcherPid != os.getpid():
+                self._watcherPid = os.getpid()
+                threading.Thread(target=self._watch, name=f"{self.tableName}-cache", daemon=True).start()
+
+    # Wait for a publish notification (or the poll interval), then check the version
+    def _watch(self):
+        connection = None
+        while True:
+            # Wait on a dedicated LISTEN connection outside the pool, since it is held for the life of the worker
+            try:
+                if connection is None:
+                    connection = psycopg2.connect(db.DATABASE_URL)
+                    connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                    connection.cursor().execute("LISTEN table_versions")
+                if select.select([connection], [], [], self.pollSeconds) != ([], [], []):
+                    connection.poll()
+                    connection.notifies.clear()
+            # Without notifications, fall back to polling the version
+            except Exception:
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                threading.Event().wait(self.pollSeconds)
+            # Keep serving the cached frame if the reload fails; it is retried after the next wait
+            try:
+                self.refresh()
+            except Exception as error:
+                print(f"{self.tableName} cache reload failed: {error}")
@@ -1,8 +1,13 @@
 # Import dependencies
 import os
+import time
+import io
+import threading
+from datetime import datetime, timezone
 import pandas as pd
 import psycopg2
-from sqlalchemy import create_engine
+from psycopg2 import sql
+from sqlalchemy import create_engine, event, select, table, column, literal_column
 
 # Find environment variables
 DATABASE_URL = os.environ.get("DATABASE_URL", None)
@@ -10,50 +15,389 @@ DATABASE_URL = os.environ.get("DATABASE_URL", None)
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# Connection pool settings
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+POOL_MAX_OVERFLOW = int(os.environ.get("DB_POOL_MAX_OVERFLOW", 5))
+POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+# Recycle connections before Heroku Postgres or a proxy drops them as idle
+POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+
+# One engine (and connection pool) per process, created the first time it is needed
+_engine = None
+_engineLock = threading.Lock()
+# Pool usage counters, updated from every request thread under _statsLock
+_poolStats = {"checkouts": 0, "checkins": 0, "connects": 0, "waitSeconds": 0.0, "maxWaitSeconds": 0.0}
+_statsLock = threading.Lock()
+
+# Return the process-wide engine, creating it on first use
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engineLock:
+            if _engine is None:
+                engine = create_engine(
+                    DATABASE_URL,
+                    pool_size=POOL_SIZE,
+                    max_overflow=POOL_MAX_OVERFLOW,
+                    pool_timeout=POOL_TIMEOUT,
+                    pool_recycle=POOL_RECYCLE,
+                    # Test each connection on checkout so a dropped connection is replaced instead of failing the request
+                    pool_pre_ping=True,
+                )
+                # Count pool events
+                event.listen(engine, "connect", lambda dbapiConnection, record: _count("connects"))
+                event.listen(engine, "checkout", lambda dbapiConnection, record, proxy: _count("checkouts"))
+                event.listen(engine, "checkin", lambda dbapiConnection, record: _count("checkins"))
+                _engine = engine
+    return _engine
+
+def _count(key):
+    with _statsLock:
+        _poolStats[key] += 1
+
+# Add one checkout's wait to the totals
+def _record_wait(wait):
+    with _statsLock:
+        _poolStats["waitSeconds"] += wait
+        _poolStats["maxWaitSeconds"] = max(_poolStats["maxWaitSeconds"], wait)
+
+# Check a connection out of the pool, recording how long the checkout waited
+def connect():
+    start = time.perf_counter()
+    connection = get_engine().connect()
+    _record_wait(time.perf_counter() - start)
+    return connection
+
+# Check a raw psycopg2 connection out of the pool, for cursor-level work such as COPY
+def raw_connect():
+    start = time.perf_counter()
+    connection = get_engine().raw_connection()
+    _record_wait(time.perf_counter() - start)
+    return connection
+
+# Report pool usage: current pool state plus checkout counts and time spent waiting for a connection
+def pool_stats():
+    with _statsLock:
+        stats = dict(_poolStats)
+    if _engine is not None:
+        pool = _engine.pool
+        stats.update({
+            "size": pool.size(),
+            "checkedIn": pool.checkedin(),
+            "checkedOut": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "status": pool.status(),
+        })
+    return stats
+
+# gunicorn forks workers after import; a child must never reuse the parent's sockets
+# dispose(close=False) drops the inherited pool without closing connections the parent still uses
+def _reset_after_fork():
+    global _engineLock, _statsLock
+    _engineLock = threading.Lock()
+    _statsLock = threading.Lock()
+    if _engine is not None:
+        _engine.dispose(close=False)
+    for key in _poolStats:
+        _poolStats[key] = 0
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
 # query the database, return a dataframe
 def read_db(tableName):
+    return read_table(tableName)
+
+# query the database for only the requested columns and rows, return a dataframe
+#   columns: list of columns to select (all columns when None)
+#   filters: {column: value or list of accepted values}, combined with AND
+#   dtypes:  {column: pandas dtype} applied while the result is built
+# Table and column names are quoted identifiers and filter values are bound parameters; nothing is formatted into the SQL text
+def read_table(tableName, columns=None, filters=None, dtypes=None):
     # Ensure there are no pre-existing connections
     connection = False
     try:
-        # Connect to database
-        engine = create_engine(DATABASE_URL)
-        connection = engine.connect()
+        # Check out a pooled connection
+        connection = connect()
         # Write query
-        query = f'SELECT * FROM {tableName}'
+        filters = filters or {}
+        columnNames = list(dict.fromkeys(list(columns or []) + list(filters)))
+        source = table(tableName, *[column(name) for name in columnNames])
+        if columns:
+            query = select(*[source.c[name] for name in columns])
+        else:
+            query = select(literal_column("*")).select_from(source)
+        for (name, value) in filters.items():
+            if isinstance(value, (list, tuple, set)) or getattr(value, "ndim", 0) > 0:
+                query = query.where(source.c[name].in_([_plain(v) for v in value]))
+            else:
+                query = query.where(source.c[name] == _plain(value))
         # Execute query and convert the response to a pandas df
-        result = pd.read_sql(query, connection)
+        result = pd.read_sql(query, connection, dtype=dtypes)
         return result
     # If there is an error interacting with the db, raise the error
     except (Exception, psycopg2.Error) as error:
         raise error
     finally:
-        # If the connection was opened, close it
+        # If the connection was opened, return it to the pool
         if connection:
             connection.close()
 
+# Convert numpy scalars to plain python values so the database driver can bind them
+def _plain(value):
+    return value.item() if hasattr(value, "item") else value
+
+# query the predictions table, return a dataframe
+# Only the requested columns are transferred, and week/position/id filters run in the database
+def read_predictions(columns=None, weeks=None, positions=None, ids=None, dtypes=None):
+    filters = {}
+    if weeks is not None:
+        filters['week'] = weeks
+    if positions is not None:
+        filters['pos'] = positions
+    if ids is not None:
+        filters['id_mfl'] = ids
+    return read_table("predictions", columns=columns, filters=filters, dtypes=dtypes)
+
+# Postgres column type for a pandas dtype
+def column_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype):
+        return "BOOLEAN"
+    if pd.api.types.is_integer_dtype(dtype):
+        return {1:"SMALLINT", 2:"SMALLINT", 4:"INTEGER"}.get(dtype.itemsize, "BIGINT")
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL" if dtype.itemsize == 4 else "DOUBLE PRECISION"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "TIMESTAMPTZ" if getattr(dtype, "tz", None) is not None else "TIMESTAMP"
+    return "TEXT"
+
+# Column definitions for CREATE TABLE, derived from the df's dtypes
+def table_definition(df):
+    return sql.SQL(", ").join(
+        sql.SQL("{} {}").format(sql.Identifier(str(name)), sql.SQL(column_type(dtype)))
+        for (name, dtype) in df.dtypes.items()
+    )
+
+# Stream a df into a table with COPY FROM STDIN, using an open psycopg2 cursor
+# The caller owns the transaction, so this can be combined with other statements
+#   ifExists: 'replace' drops and recreates the table, 'append' creates it only if it is missing
+#   dataDef:  optional column definitions overriding the ones derived from the dtypes
+def copy_df(cursor, df, tableName, ifExists='replace', dataDef=None):
+    tableId = sql.Identifier(tableName)
+    columnDefs = sql.SQL(dataDef) if dataDef else table_definition(df)
+    if ifExists == 'replace':
+        cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(tableId))
+    cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} ({})").format(tableId, columnDefs))
+    # Write the rows to an in-memory csv buffer; missing values become unquoted empty fields, which COPY reads as NULL
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        tableId, sql.SQL(", ").join(sql.Identifier(str(name)) for name in df.columns)
+    )
+    cursor.copy_expert(query, buffer)
+
 # Write a new table to the database
-def write_df(df, tableName, dataDef):
+# Rows are bulk loaded with COPY and the table is replaced in a single transaction
+def write_df(df, tableName, dataDef=None):
     # Ensure there are no pre-existing connections
     connection = False
     try:
-        # Connect to database
-        engine = create_engine(DATABASE_URL)
-        # Create psycopg2 connection
-        connection = psycopg2.connect(DATABASE_URL, sslmode='require')
-        cursor = connection.cursor()
-        # Create table if it does not already exist
-        query = f'CREATE TABLE IF NOT EXISTS {tableName}({dataDef})'
-        cursor.execute(query)
+        # Check out a pooled psycopg2 connection
+        connection = raw_connect()
+        with connection.cursor() as cursor:
+            copy_df(cursor, df, tableName, ifExists='replace', dataDef=dataDef)
         connection.commit()
-        # Populate table with data
-        df.to_sql(tableName, engine, if_exists='replace', index = False)
-    # If there is an error interacting with the db, raise the error
+    # If there is an error interacting with the db, undo the partial write and raise the error
+    except (Exception, psycopg2.Error) as error:
+        if connection:
+            connection.rollback()
+        raise error
+    finally:
+        # If the connection was opened, return it to the pool
+        if connection:
+            connection.close()
+
+# Append rows to a table, creating it if it does not exist yet
+def append_df(df, tableName):
+    # Ensure there are no pre-existing connections
+    connection = False
+    try:
+        # Check out a pooled psycopg2 connection
+        connection = raw_connect()
+        with connection.cursor() as cursor:
+            copy_df(cursor, df, tableName, ifExists='append')
+        connection.commit()
+    # If there is an error interacting with the db, undo the partial write and raise the error
+    except (Exception, psycopg2.Error) as error:
+        if connection:
+            connection.rollback()
+        raise error
+    finally:
+        # If the connection was opened, return it to the pool
+        if connection:
+            connection.close()
+# Make sure the table that records the published version of each table exists
+def _ensure_versionTable(cursor):
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS table_versions ('
+        '"tableName" TEXT PRIMARY KEY, "version" TEXT, "previousVersion" TEXT, "publishedAt" TIMESTAMPTZ DEFAULT now())'
+    )
+
+# Version stamp for a new publish of a table
+def new_version():
+    return datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+
+# Publish a new version of a table without readers ever seeing it missing or half loaded
+# The rows are loaded and indexed in a staging table, which is then swapped in with transactional renames
+# The replaced version is kept as <tableName>__previous so rollback_publish can bring it back instantly
+#   indexes:     columns to index on the staging table before the swap
+#   lockTimeout: how long the swap may wait for running queries; the swap is retried rather than queueing readers behind it
+#   version:     from new_version; pass it when a snapshot of the same version has to be written before workers are notified
+def publish_df(df, tableName, indexes=None, lockTimeout='2s', swapRetries=10, version=None):
+    version = version or new_version()
+    stagingName = f'{tableName}__{version}'
+    previousName = f'{tableName}__previous'
+    # Ensure there are no pre-existing connections
+    connection = False
+    try:
+        # Check out a pooled psycopg2 connection
+        connection = raw_connect()
+        # Load, index and analyze the staging table; readers of the live table are not touched
+        with connection.cursor() as cursor:
+            copy_df(cursor, df, stagingName, ifExists='replace')
+            for columnName in (indexes or []):
+                cursor.execute(sql.SQL("CREATE INDEX {} ON {} ({})").format(
+                    sql.Identifier(f'{stagingName}_{columnName}_idx'), sql.Identifier(stagingName), sql.Identifier(columnName)
+                ))
+            cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(stagingName)))
+        connection.commit()
+        # Swap the staging table in; all renames and the version stamp commit together
+        for attempt in range(swapRetries):
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL lock_timeout = %s", (lockTimeout,))
+                    _ensure_versionTable(cursor)
+                    cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(previousName)))
+                    cursor.execute(sql.SQL("ALTER TABLE IF EXISTS {} RENAME TO {}").format(sql.Identifier(tableName), sql.Identifier(previousName)))
+                    cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(stagingName), sql.Identifier(tableName)))
+                    cursor.execute(
+                        'INSERT INTO table_versions ("tableName", "version", "previousVersion", "publishedAt") '
+                        'VALUES (%s, %s, NULL, now()) '
+                        'ON CONFLICT ("tableName") DO UPDATE SET "previousVersion" = table_versions."version", '
+                        '"version" = EXCLUDED."version", "publishedAt" = EXCLUDED."publishedAt"',
+                        (tableName, version)
+                    )
+                    # Let listening app workers know a new version is live
+                    cursor.execute("SELECT pg_notify('table_versions', %s)", (f'{tableName}:{version}',))
+                connection.commit()
+                break
+            # A long-running query held the table past lockTimeout; back off and try again
+            except psycopg2.errors.LockNotAvailable:
+                connection.rollback()
+                time.sleep(2 ** min(attempt, 4))
+        else:
+            raise RuntimeError(f"could not swap in {stagingName} after {swapRetries} attempts; it is left in place")
+        return version
+    # If there is an error interacting with the db, undo the partial write and raise the error
     except (Exception, psycopg2.Error) as error:
+        if connection:
+            connection.rollback()
+        raise error
+    finally:
+        # If the connection was opened, return it to the pool
+        if connection:
+            connection.close()
+
+# Whether a database error is a missing table, raised directly by psycopg2 or wrapped by sqlalchemy
+def _missing_table(error):
+    return isinstance(getattr(error, 'orig', error), psycopg2.errors.UndefinedTable)
+
+# Return the published version of a table, or None if it has never been published with publish_df
+# Any other database error is raised, so callers keep the version they have instead of treating the table as unpublished
+def get_version(tableName):
+    try:
+        result = read_table('table_versions', columns=['version'], filters={'tableName': tableName})
+    # Nothing has been published yet if the version table does not exist
+    except Exception as error:
+        if _missing_table(error):
+            return None
+        raise error
+    return result['version'].iloc[0] if len(result) else None
+
+# Make sure the table of manually entered draft picks exists; a player is picked at most once per league
+def _ensure_draftPicksTable(cursor):
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS draft_picks ('
+        '"league" TEXT, "id_mfl" TEXT, "franchiseID" TEXT, "pickedAt" TIMESTAMPTZ DEFAULT now(), PRIMARY KEY ("league", "id_mfl"))'
+    )
+
+# Save a draft pick entered by hand, so every app worker replays it; entering the player again replaces his franchise
+def save_draftPick(league, id_mfl, franchiseID):
+    # Ensure there are no pre-existing connections
+    connection = False
+    try:
+        # Check out a pooled psycopg2 connection
+        connection = raw_connect()
+        with connection.cursor() as cursor:
+            _ensure_draftPicksTable(cursor)
+            cursor.execute(
+                'INSERT INTO draft_picks ("league", "id_mfl", "franchiseID") VALUES (%s, %s, %s) '
+                'ON CONFLICT ("league", "id_mfl") DO UPDATE SET "franchiseID" = EXCLUDED."franchiseID", "pickedAt" = now()',
+                (league, id_mfl, franchiseID)
+            )
+        connection.commit()
+    # If there is an error interacting with the db, undo the partial write and raise the error
+    except (Exception, psycopg2.Error) as error:
+        if connection:
+            connection.rollback()
+        raise error
+    finally:
+        # If the connection was opened, return it to the pool
+        if connection:
+            connection.close()
+
+# A league's manually entered draft picks (id_mfl, franchiseID) in the order they were entered
+def read_draftPicks(league):
+    try:
+        result = read_table('draft_picks', columns=['id_mfl', 'franchiseID', 'pickedAt'], filters={'league': league})
+    # No pick has been entered in any league yet
+    except Exception as error:
+        if _missing_table(error):
+            return pd.DataFrame(columns=['id_mfl', 'franchiseID'])
+        raise error
+    return result.sort_values('pickedAt', kind='stable')[['id_mfl', 'franchiseID']].reset_index(drop=True)
+
+# Swap the previous version of a published table back in; calling it again undoes the rollback
+def rollback_publish(tableName, lockTimeout='2s'):
+    previousName = f'{tableName}__previous'
+    swapName = f'{tableName}__swap'
+    # Ensure there are no pre-existing connections
+    connection = False
+    try:
+        # Check out a pooled psycopg2 connection
+        connection = raw_connect()
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL lock_timeout = %s", (lockTimeout,))
+            cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(tableName), sql.Identifier(swapName)))
+            cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(previousName), sql.Identifier(tableName)))
+            cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(swapName), sql.Identifier(previousName)))
+            cursor.execute(
+                'UPDATE table_versions SET "version" = "previousVersion", "previousVersion" = "version", "publishedAt" = now() '
+                'WHERE "tableName" = %s RETURNING "version"',
+                (tableName,)
+            )
+            version = cursor.fetchone()[0]
+            cursor.execute("SELECT pg_notify('table_versions', %s)", (f'{tableName}:{version}',))
+        connection.commit()
+        return version
+    # If there is an error interacting with the db, undo the partial write and raise the error
+    except (Exception, psycopg2.Error) as error:
+        if connection:
+            connection.rollback()
         raise error
     finally:
-        # If the connection was opened, close it
+        # If the connection was opened, return it to the pool
         if connection:
-            cursor.close()
             connection.close()
 
 
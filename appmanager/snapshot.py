@@ -0,0 +1,55 @@
+# Import dependencies
+import os
+import pyarrow as pa
+import pyarrow.ipc
+# Internal imports
+from appmanager import db
+
+# Directory holding Arrow IPC snapshots of published tables; must be shared by the scheduler and the web workers
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "snapshots"))
+
+
+# Location of a table's snapshot file
+def snapshot_path(tableName):
+    return os.path.join(SNAPSHOT_DIR, f"{tableName}.arrow")
+
+# Write a df as an Arrow IPC file tagged with the table version it was published as
+# The file is written under a temporary name and renamed into place, so readers never see a partial snapshot
+def write_snapshot(df, tableName, version):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(tableName)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"version"] = str(version).encode()
+    table = table.replace_schema_metadata(metadata)
+    tempPath = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tempPath, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tempPath, path)
+    return path
+
+# Memory-map a table's snapshot and return it as a df, or None if it is missing or not the expected version
+# Numeric columns without nulls point straight into the mapped file, so every worker shares one page-cache copy
+def read_snapshot(tableName, version=None):
+    path = snapshot_path(tableName)
+    if not os.path.exists(path):
+        return None
+    source = pa.memory_map(path, "r")
+    table = pa.ipc.open_file(source).read_all()
+    snapshotVersion = (table.schema.metadata or {}).get(b"version", b"").decode()
+    if version is not None and snapshotVersion != str(version):
+        return None
+    # split_blocks keeps one block per column instead of consolidating (and copying) columns of the same dtype
+    return table.to_pandas(split_blocks=True)
+
+# Load a published table: from its snapshot when it matches the published version, otherwise from the database
+def load_table(tableName, version=None):
+    df = None
+    try:
+        df = read_snapshot(tableName, version)
+    except (OSError, pa.ArrowException) as error:
+        print(f"{tableName} snapshot unreadable, reading the database instead: {error}")
+    if df is None:
+        df = db.read_db(tableName)
+    return df
@@ -0,0 +1,79 @@
+# Benchmark COPY-based db.write_df against DataFrame.to_sql on a full-season predictions frame
+# Needs DATABASE_URL pointing at a scratch Postgres database; the benchmark tables are dropped afterwards
+# Usage:
+#   python benchmarks/bench_db_write.py [--players 1500] [--weeks 18] [--repeat 3]
+import os
+import sys
+import argparse
+import timeit
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from appmanager import db
+
+statColumns = [
+    'passA', 'passC', 'passY', 'passT', 'passI', 'pass2',
+    'rushA', 'rushY', 'rushT', 'rush2',
+    'recC', 'recY', 'recT', 'rec2', 'fum',
+    'XPA', 'XPM', 'FGA', 'FGM', 'FG50',
+    'defSack', 'defI', 'defSaf', 'defFum', 'defBlk', 'defT',
+    'defPtsAgainst', 'defPassYAgainst', 'defRushYAgainst', 'defYdsAgainst'
+]
+
+# Build a predictions frame with one row per player per week, shaped like the scheduler's output
+def season_frame(nPlayers, nWeeks, seed=0):
+    rng = np.random.default_rng(seed)
+    nRows = nPlayers * nWeeks
+    positions = np.array(['QB', 'RB', 'WR', 'TE', 'PK', 'DF'])
+    df = pd.DataFrame({
+        'id_mfl': np.repeat([str(10000 + i) for i in range(nPlayers)], nWeeks),
+        'season': 2022,
+        'week': np.tile(np.arange(1, nWeeks + 1, dtype='int16'), nPlayers),
+        'team': rng.choice(['ARI', 'ATL', 'BAL', 'BUF', 'CAR', 'CHI'], nRows),
+        'playerName': np.repeat([f'PLAYER {i}' for i in range(nPlayers)], nWeeks),
+        'age': rng.integers(21, 38, nRows),
+        'sharkRank': rng.integers(1, 3000, nRows),
+        'adp': rng.uniform(1, 300, nRows).astype('float32'),
+        'pos': np.repeat(rng.choice(positions, nPlayers), nWeeks),
+        'posRank': 'WR1',
+        'opponent': rng.choice(['DAL', 'DEN', 'DET', 'GBP'], nRows),
+    })
+    for name in statColumns:
+        df[name] = rng.gamma(2.0, 10.0, nRows)
+    return df
+
+def drop(tableName):
+    connection = db.raw_connect()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS "{tableName}"')
+    connection.commit()
+    connection.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=1500)
+    parser.add_argument('--weeks', type=int, default=18)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = season_frame(args.players, args.weeks)
+    print(f'{len(df):,} rows x {len(df.columns)} columns')
+    engine = db.get_engine()
+    writers = {
+        'to_sql': lambda: df.to_sql('bench_to_sql', engine, if_exists='replace', index=False),
+        'to_sql multi': lambda: df.to_sql('bench_to_sql_multi', engine, if_exists='replace', index=False, method='multi', chunksize=1000),
+        'write_df (COPY)': lambda: db.write_df(df, 'bench_copy'),
+    }
+    try:
+        baseline = None
+        for (name, writer) in writers.items():
+            seconds = min(timeit.repeat(writer, number=1, repeat=args.repeat))
+            baseline = baseline or seconds
+            print(f'{name:<18}{seconds:>8.2f} s{baseline / seconds:>8.1f}x')
+        # The COPY table must hold the same rows
+        check = db.read_db('bench_copy')
+        assert len(check) == len(df)
+    finally:
+        for tableName in ['bench_to_sql', 'bench_to_sql_multi', 'bench_copy']:
+            drop(tableName)
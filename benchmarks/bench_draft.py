@@ -0,0 +1,73 @@
+# Benchmark a full mock draft on the DraftBoard against re-ranking the whole pool after every pick
+# Usage:
+#   python benchmarks/bench_draft.py [--players 1500] [--teams 12] [--rounds 20]
+import os
+import sys
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ffpackage import draft, league
+
+# Re-rank the whole available pool: replacement level per position, then the best players by value over it
+# The replacement rank among the available players is the full-pool rank less the players drafted at the position
+def rerank(players, drafted, ranks, topK=10):
+    draftedCounts = players.loc[players['id_mfl'].isin(drafted), 'pos'].value_counts()
+    available = players.loc[~players['id_mfl'].isin(drafted)].sort_values(['value', 'id_mfl'], ascending=[False, True])
+    position = available.groupby('pos').cumcount() + 1
+    counts = available.groupby('pos')['value'].transform('size')
+    availableRanks = np.maximum(available['pos'].map(ranks) - available['pos'].map(draftedCounts).fillna(0), 1)
+    levels = available.loc[position == np.minimum(availableRanks, counts)].set_index('pos')['value']
+    available = available.assign(vorp=available['value'] - available['pos'].map(levels))
+    return available.sort_values(['vorp', 'value', 'id_mfl'], ascending=[False, False, True]).head(topK)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=1500)
+    parser.add_argument('--teams', type=int, default=12)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    players = pd.DataFrame({
+        'id_mfl': [str(10000 + i) for i in range(args.players)],
+        'pos': rng.choice(['QB', 'RB', 'WR', 'TE', 'PK', 'DF'], args.players),
+        'value': rng.gamma(2.0, 50.0, args.players).round(1),
+    })
+    ranks = draft.replacement_ranks(args.teams, league.defaultPosMin)
+    board = draft.DraftBoard(players, 'value', ranks)
+    # Each player's (position, rank in the full pool), and each position's replacement player in the full pool
+    pool = players.sort_values(['value', 'id_mfl'], ascending=[False, True])
+    pool = pool.assign(rank=pool.groupby('pos').cumcount() + 1)
+    poolRank = {id_mfl: (pos, rank) for (id_mfl, pos, rank) in pool[['id_mfl', 'pos', 'rank']].itertuples(index=False)}
+    fixedLevels = pool.loc[pool['rank'] == pool['pos'].map(ranks), ['pos', 'value', 'id_mfl']]
+    drafted = set()
+    (boardTime, rerankTime) = (0.0, 0.0)
+    nPicks = args.teams * args.rounds
+    for pickNumber in range(nPicks):
+        franchiseID = f'{pickNumber % args.teams + 1:04d}'
+        start = time.perf_counter()
+        recommended = board.recommend(topK=10)
+        boardTime += time.perf_counter() - start
+        start = time.perf_counter()
+        reranked = rerank(players, drafted, ranks)
+        rerankTime += time.perf_counter() - start
+        # Both must recommend the same players
+        assert list(recommended['id_mfl']) == list(reranked['id_mfl'])
+        # While every pick at a position came from above its replacement player in the full pool, the replacement level
+        # is that fixed player's value, however many players have been drafted there
+        for (pos, fixedLevel, fixedID) in fixedLevels.itertuples(index=False):
+            draftedThere = [id_mfl for id_mfl in drafted if poolRank[id_mfl][0] == pos]
+            if all(poolRank[id_mfl][1] < ranks[pos] for id_mfl in draftedThere) and fixedID not in drafted:
+                assert board.replacement(pos) == fixedLevel
+        # Each franchise takes one of the top three
+        choice = recommended['id_mfl'].iloc[rng.integers(min(3, len(recommended)))]
+        start = time.perf_counter()
+        board.pick(choice, franchiseID)
+        boardTime += time.perf_counter() - start
+        drafted.add(choice)
+    print(f'{nPicks} picks from {args.players:,} players, recommendations identical')
+    print(f'DraftBoard  {boardTime / nPicks * 1000:>7.2f} ms per pick')
+    print(f're-rank     {rerankTime / nPicks * 1000:>7.2f} ms per pick')
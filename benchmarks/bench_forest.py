@@ -0,0 +1,44 @@
+# Benchmark the flattened forest evaluator against sklearn's RandomForestRegressor.predict
+# A forest is fitted on synthetic data shaped like a position model (119 features, 30 stats), exported, memory-mapped
+# back, and both must reach the same leaves and predictions within float32 precision
+# Usage:
+#   python benchmarks/bench_forest.py [--rows 2000] [--trees 50] [--batch 1 50 500 2000]
+import os
+import sys
+import argparse
+import tempfile
+import timeit
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ffpackage import forest, predictions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--trees', type=int, default=50)
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 50, 500, 2000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    nFeatures = len(predictions.featureColumns) + 4
+    X = rng.gamma(1.5, 3.0, (args.rows, nFeatures))
+    y = X[:, :len(predictions.labelColumns)] * 0.5 + rng.normal(0, 1, (args.rows, len(predictions.labelColumns)))
+    model = RandomForestRegressor(n_estimators=args.trees, random_state=0).fit(X, y)
+    with tempfile.TemporaryDirectory() as modelDir:
+        path = os.path.join(modelDir, 'forest.flat.joblib')
+        forest.save_forest(forest.flatten_forest(model), path)
+        flat = forest.load_forest(path)
+        XTest = rng.gamma(1.5, 3.0, (max(args.batch), nFeatures))
+        # Same leaf in every tree, and predictions within float32 precision
+        sklearnLeaves = np.stack([tree.apply(XTest.astype('float32')) for tree in model.estimators_], axis=1)
+        assert (flat.leaves(XTest.astype('float32')) - flat.roots == sklearnLeaves).all()
+        np.testing.assert_allclose(flat.predict(XTest), model.predict(XTest), rtol=1e-6, atol=1e-6)
+        print(f'{args.trees} trees, {len(flat.feature):,} nodes, leaves and predictions match')
+        print(f'{"rows":>6} {"sklearn":>10} {"flat":>10}')
+        for batch in args.batch:
+            sklearnTime = min(timeit.repeat(lambda: model.predict(XTest[:batch]), number=1, repeat=args.repeat))
+            flatTime = min(timeit.repeat(lambda: flat.predict(XTest[:batch]), number=1, repeat=args.repeat))
+            print(f'{batch:>6} {sklearnTime * 1000:>8.2f}ms {flatTime * 1000:>8.2f}ms  ({sklearnTime / flatTime:.1f}x)')
@@ -0,0 +1,116 @@
+# Benchmark the single-pass inference pipeline against the scheduler's six copy-pasted position blocks
+# Small random forests are fitted on synthetic data and saved the way the scheduler's models are, then both paths
+# predict the same synthetic player_df and their `complete` frames must match (exactly for positions predicted through
+# sklearn, to float32 precision for the small ones that go through the flattened forests)
+# Usage:
+#   python benchmarks/bench_inference.py [--players 600] [--weeks 17] [--trees 20]
+import os
+import sys
+import argparse
+import tempfile
+import timeit
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from joblib import dump, load
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ffpackage import predictions
+
+# Build a scheduler-style player_df, including unusable rows (missing values, fourth-string players)
+def player_frame(nPlayers, nWeeks, seed=0):
+    rng = np.random.default_rng(seed)
+    nRows = nPlayers * nWeeks
+    pos = np.repeat(rng.choice(predictions.positions, nPlayers), nWeeks)
+    rank = np.repeat(rng.integers(1, 5, nPlayers), nWeeks)
+    df = pd.DataFrame({
+        'id_mfl': np.repeat([str(10000 + i) for i in range(nPlayers)], nWeeks),
+        'season': 2022,
+        'week': np.tile(np.arange(1, nWeeks + 1), nPlayers),
+        'team': np.repeat(rng.choice([f'T{i:02d}' for i in range(32)], nPlayers), nWeeks),
+        'player': np.repeat([f'Player {i}' for i in range(nPlayers)], nWeeks),
+        'age': np.repeat(rng.integers(21, 36, nPlayers), nWeeks),
+        'sharkRank': np.repeat(rng.integers(1, 500, nPlayers), nWeeks),
+        'adp': np.repeat(rng.uniform(1, 300, nPlayers).round(1), nWeeks),
+        'KR': 'no', 'PR': 'no', 'RES': 'no',
+        'pos': pos,
+        'posRank': [f'{p}{r}' for (p, r) in zip(pos, rank)],
+        'opponent': rng.choice([f'T{i:02d}' for i in range(32)], nRows),
+    })
+    features = pd.DataFrame(rng.gamma(1.5, 3.0, (nRows, len(predictions.featureColumns) - 2)), columns=predictions.featureColumns[2:])
+    df = pd.concat([df, features], axis=1)
+    df.loc[rng.random(nRows) < 0.03, 'passY_prior2'] = np.nan
+    return df
+
+# Fit a small model per position on the columns the scheduler feeds it, and save it where load() looks
+def save_models(df, modelDir, nTrees, seed=0):
+    rng = np.random.default_rng(seed)
+    for pos in predictions.positions:
+        xl2 = df.loc[df['posRank'].isin([f'{pos}1', f'{pos}2', f'{pos}3']) & (df['pos'] == pos)].dropna()
+        X = pd.get_dummies(xl2[predictions.featureColumns + ['pos', 'posRank']], columns=['pos', 'posRank'])
+        if pos != 'DF':
+            for rank in [f'posRank_{pos}1', f'posRank_{pos}2', f'posRank_{pos}3']:
+                if rank not in X.columns:
+                    X[rank] = 0
+        y = rng.gamma(1.5, 3.0, (len(X), len(predictions.labelColumns)))
+        y[:, predictions.labelColumns.index('defPtsAgainst')] = rng.uniform(-10, 60, len(X))
+        y[:, predictions.labelColumns.index('defYdsAgainst')] = rng.uniform(150, 500, len(X))
+        model = RandomForestRegressor(n_estimators=nTrees, max_depth=8, random_state=0).fit(X, y)
+        dump(model, os.path.join(modelDir, f'rfmodel_{pos}1.joblib'))
+
+# The scheduler's position block, kept here as the reference
+def position_block(player_df, pos, modelDir):
+    xl2 = player_df.copy()
+    xl2 = xl2.loc[xl2.posRank.isin([f'{pos}1', f'{pos}2', f'{pos}3'])]
+    xl2 = xl2.loc[xl2.pos==pos]
+    xl2 = xl2.dropna()
+    xl2.reset_index(inplace=True, drop=True)
+    X = xl2[predictions.featureColumns + ['pos', 'posRank']]
+    header = xl2[predictions.headerColumns]
+    X = pd.get_dummies(X, columns = ['pos', 'posRank'])
+    if pos != 'DF':
+        for rank in [f'posRank_{pos}1', f'posRank_{pos}2', f'posRank_{pos}3']:
+            if rank not in list(X.columns):
+                X[rank] = 0
+        X = X[predictions.featureColumns + [f'pos_{pos}', f'posRank_{pos}1', f'posRank_{pos}2', f'posRank_{pos}3']]
+    regressor = load(os.path.join(modelDir, f'rfmodel_{pos}1.joblib'))
+    y_pred = regressor.predict(X)
+    y_pred = pd.DataFrame(y_pred)
+    y_pred.columns = predictions.labelColumns
+    multiplier = list(predictions.multiplier)
+    y_pred['defPtsBin'] = pd.cut(y_pred['defPtsAgainst'], bins=predictions.binList_defPts, include_lowest=True, labels=list(predictions.ptList_defPts.astype(int)))
+    y_pred['defYdsBin'] = pd.cut(y_pred['defYdsAgainst'], bins=predictions.binList_defYds, include_lowest=True, labels=list(predictions.ptList_defYds.astype(int)))
+    a_pred = header.merge(y_pred, left_index=True, right_index=True)
+    a_pred.loc[a_pred['pos']!='DF', 'defPtsBin'] = 0
+    a_pred.loc[a_pred['pos']!='DF', 'defYdsBin'] = 0
+    a_pred = a_pred.drop(columns=predictions.headerColumns)
+    def multer(row):
+        return row.multiply(multiplier)
+    c = a_pred.apply(multer, axis=1)
+    c = c.apply(np.sum, axis=1)
+    c = pd.DataFrame(c, columns=['pred'])
+    return header.merge(c, left_index=True, right_index=True)
+
+# The scheduler's six blocks and final concat
+def complete_reference(player_df, modelDir):
+    return pd.concat([position_block(player_df, pos, modelDir) for pos in predictions.positions], axis=0)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=600)
+    parser.add_argument('--weeks', type=int, default=17)
+    parser.add_argument('--trees', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    player_df = player_frame(args.players, args.weeks)
+    with tempfile.TemporaryDirectory() as modelDir:
+        save_models(player_df, modelDir, args.trees)
+        reference = complete_reference(player_df, modelDir)
+        pipeline = predictions.predictAll(player_df, modelDir=modelDir)
+        pd.testing.assert_frame_equal(pipeline, reference, check_exact=False, rtol=1e-6, atol=1e-6)
+        referenceTime = min(timeit.repeat(lambda: complete_reference(player_df, modelDir), number=1, repeat=args.repeat))
+        pipelineTime = min(timeit.repeat(lambda: predictions.predictAll(player_df, modelDir=modelDir), number=1, repeat=args.repeat))
+    print(f'{len(player_df):,} player-weeks, {len(reference):,} predicted, outputs match')
+    print(f'six position blocks  {referenceTime * 1000:>8.0f} ms')
+    print(f'predictAll           {pipelineTime * 1000:>8.0f} ms  ({referenceTime / pipelineTime:.1f}x)')
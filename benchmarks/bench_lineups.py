@@ -0,0 +1,61 @@
+# Benchmark the optimal lineup solver against starterSelector on 12, 16 and 32 team leagues
+# Usage:
+#   python benchmarks/bench_lineups.py [--roster 28] [--repeat 5]
+import os
+import sys
+import argparse
+import timeit
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ffpackage import analysis, league
+
+# Build a league of rostered players plus a free agent pool, with some taxi squad/IR players and tied scores
+def league_frame(nTeams, rosterSize, seed=0):
+    rng = np.random.default_rng(seed)
+    franchises = [f'{i:04d}' for i in range(1, nTeams + 1)] + ['FA']
+    sizes = [rosterSize] * nTeams + [rosterSize * 8]
+    nRows = sum(sizes)
+    df = pd.DataFrame({
+        'id_mfl': [str(10000 + i) for i in range(nRows)],
+        'franchiseID': np.repeat(franchises, sizes),
+        'pos': rng.choice(['QB', 'RB', 'WR', 'TE', 'PK', 'DF'], nRows, p=[0.15, 0.25, 0.3, 0.15, 0.075, 0.075]),
+        'rosterStatus': rng.choice(['ROSTER', 'TAXI_SQUAD', 'INJURED_RESERVE'], nRows, p=[0.85, 0.1, 0.05]),
+        'scoreTotal': rng.gamma(2.0, 5.0, nRows).round(1),
+    })
+    return df
+
+# Total predicted score of every franchise's starters
+def starter_totals(df, how):
+    return df.loc[df['startSelector'] == 'Starter'].groupby('franchiseID')[how].sum()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--roster', type=int, default=28)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    posMax = league.defaultPosMax
+    posMin = league.defaultPosMin
+    startersMax = league.defaultStartersMax
+    print(f'{"teams":>5} {"rows":>7} {"starterSelector ms":>19} {"optimalStarters ms":>19} {"speedup":>8} {"lineups improved":>17}')
+    for nTeams in [12, 16, 32]:
+        df = league_frame(nTeams, args.roster)
+        optimal = analysis.optimalStarters(df.copy(), 'scoreTotal', startersMax, posMax, posMin)
+        greedy = analysis.starterSelector(df.copy(), 'scoreTotal', startersMax, posMax, posMin)
+        # The solver never does worse than the greedy selector, and never starts more than startersMax
+        (optimalTotals, greedyTotals) = starter_totals(optimal, 'scoreTotal').align(starter_totals(greedy, 'scoreTotal'), fill_value=0)
+        assert (optimalTotals >= greedyTotals - 1e-9).all()
+        assert (optimal.loc[optimal['startSelector'] == 'Starter'].groupby('franchiseID').size() <= startersMax).all()
+        improved = int((optimalTotals > greedyTotals + 1e-9).sum())
+        # Without tied scores, rosterRank is the rank starterSelector reports
+        untied = df.assign(scoreTotal=df['scoreTotal'] + np.arange(len(df)) * 1e-7)
+        pd.testing.assert_series_equal(
+            analysis.optimalStarters(untied.copy(), 'scoreTotal', startersMax, posMax, posMin)['rosterRank'],
+            analysis.starterSelector(untied.copy(), 'scoreTotal', startersMax, posMax, posMin)['rosterRank']
+        )
+
+        greedyTime = min(timeit.repeat(lambda: analysis.starterSelector(df.copy(), 'scoreTotal', startersMax, posMax, posMin), number=1, repeat=args.repeat))
+        optimalTime = min(timeit.repeat(lambda: analysis.optimalStarters(df.copy(), 'scoreTotal', startersMax, posMax, posMin), number=1, repeat=args.repeat))
+        print(f'{nTeams:>5} {len(df):>7,} {greedyTime * 1000:>19.1f} {optimalTime * 1000:>19.2f} {greedyTime / optimalTime:>7.1f}x {improved:>17}')
@@ -0,0 +1,47 @@
+# Benchmark the vectorized live projections and chart colors against the row-wise expectedLiveScore/colorPicker
+# Usage:
+#   python benchmarks/bench_live.py [--players 2000] [--repeat 5]
+import os
+import sys
+import argparse
+import timeit
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ffpackage import analysis
+
+# Build a /live style frame of starters at different points in their games
+def live_frame(nPlayers, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'pos': rng.choice(['QB', 'RB', 'WR', 'TE', 'PK', 'DF'], nPlayers),
+        'scoreTotal': rng.normal(10, 6, nPlayers).round(2),
+        'liveScore': rng.normal(8, 10, nPlayers).round(2),
+        'secondsRemaining': rng.integers(0, 3601, nPlayers).astype('float64'),
+    })
+    return df
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    df = live_frame(args.players)
+    # Projections must be identical
+    pd.testing.assert_series_equal(analysis.expectedLiveScores(df), df.apply(analysis.expectedLiveScore, axis=1), check_exact=True)
+    df['expectedLiveScore'] = analysis.expectedLiveScores(df)
+    # Put some differences exactly halfway between two color steps to check the rounding
+    halves = min(len(df), 50)
+    df.loc[df.index[:halves], 'expectedLiveScore'] = df['scoreTotal'].iloc[:halves] + np.arange(halves) * 20 / 255 / 2
+    # Colors must be identical
+    pd.testing.assert_series_equal(analysis.liveColors(df), df.apply(analysis.colorPicker, axis=1), check_exact=True)
+
+    projectionRowwise = min(timeit.repeat(lambda: df.apply(analysis.expectedLiveScore, axis=1), number=1, repeat=args.repeat))
+    projectionVector = min(timeit.repeat(lambda: analysis.expectedLiveScores(df), number=1, repeat=args.repeat))
+    colorRowwise = min(timeit.repeat(lambda: df.apply(analysis.colorPicker, axis=1), number=1, repeat=args.repeat))
+    colorVector = min(timeit.repeat(lambda: analysis.liveColors(df), number=1, repeat=args.repeat))
+    print(f'{len(df):,} rows, outputs identical')
+    print(f'expectedLiveScore  row-wise {projectionRowwise * 1000:>8.1f} ms   vectorized {projectionVector * 1000:>6.2f} ms  ({projectionRowwise / projectionVector:.0f}x)')
+    print(f'colorPicker        row-wise {colorRowwise * 1000:>8.1f} ms   vectorized {colorVector * 1000:>6.2f} ms  ({colorRowwise / colorVector:.0f}x)')
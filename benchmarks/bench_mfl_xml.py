@@ -0,0 +1,105 @@
+# Benchmark the streaming xml parser against the original BeautifulSoup parsing of MFL exports
+# Usage:
+#   python benchmarks/bench_mfl_xml.py --record     # save live MFL payloads to benchmarks/payloads/
+#   python benchmarks/bench_mfl_xml.py              # time both parsers on the saved (or synthetic) payloads
+import os
+import sys
+import argparse
+import random
+import timeit
+import tracemalloc
+from bs4 import BeautifulSoup
+import requests
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ffpackage import xmlparse
+
+payloadDir = os.path.join(os.path.dirname(__file__), 'payloads')
+payloadUrls = {
+    'players': "https://api.myfantasyleague.com/2022/export?TYPE=players",
+    'playerRanks': "https://api.myfantasyleague.com/2022/export?TYPE=playerRanks",
+    'adp': "https://api.myfantasyleague.com/2022/export?TYPE=adp",
+}
+
+# Save live MFL responses so benchmarks run on real payloads
+def record():
+    os.makedirs(payloadDir, exist_ok=True)
+    for (name, urlString) in payloadUrls.items():
+        response = requests.get(urlString)
+        with open(os.path.join(payloadDir, f'{name}.xml'), 'wb') as f:
+            f.write(response.content)
+        print(f'recorded {name}: {len(response.content):,} bytes')
+
+# Build payloads with the same shape as MFL's when nothing has been recorded
+def synthetic(nPlayers=2500):
+    rng = random.Random(0)
+    positions = ['QB', 'RB', 'WR', 'TE', 'PK', 'Def', 'DE', 'LB', 'CB', 'S']
+    teams = ['ARI', 'ATL', 'BAL', 'BUF', 'CAR', 'CHI', 'CIN', 'CLE', 'DAL', 'DEN', 'DET', 'GBP', 'FA*']
+    ids = [str(10000 + i) for i in range(nPlayers)]
+    players = ''.join(
+        f'<player id="{i}" name="Last{i}, First{i}" position="{rng.choice(positions)}" team="{rng.choice(teams)}"/>'
+        for i in ids)
+    ranks = ''.join(f'<player id="{i}" rank="{n + 1}"/>' for (n, i) in enumerate(ids))
+    adp = ''.join(f'<player id="{i}" averagePick="{rng.uniform(1, 300):.2f}" minPick="1" maxPick="300"/>' for i in ids)
+    return {
+        'players': f'<players timestamp="0">{players}</players>'.encode(),
+        'playerRanks': f'<playerRanks>{ranks}</playerRanks>'.encode(),
+        'adp': f'<adp>{adp}</adp>'.encode(),
+    }
+
+# Load recorded payloads, falling back to synthetic ones
+def load_payloads():
+    payloads = synthetic()
+    for name in payloadUrls:
+        path = os.path.join(payloadDir, f'{name}.xml')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                payloads[name] = f.read()
+    return payloads
+
+# Original BeautifulSoup implementation, kept here as the baseline
+def soup_records(content, tag, attributes):
+    soup = BeautifulSoup(content, 'xml')
+    data = []
+    elems = soup.find_all(tag)
+    for i in range(len(elems)):
+        data.append([elems[i].get(a) for a in attributes])
+    return pd.DataFrame(data, columns=attributes)
+
+# Parsers under test: (tag, {column: attribute}, dtypes)
+cases = {
+    'players': ('player', {'id_mfl':'id', 'playerName':'name', 'pos':'position', 'team':'team'}, {'pos':'category', 'team':'category'}),
+    'playerRanks': ('player', {'id_mfl':'id', 'sharkRank':'rank'}, {'sharkRank':'int32'}),
+    'adp': ('player', {'id_mfl':'id', 'adp':'averagePick'}, {'adp':'float32'}),
+}
+
+def run(repeat):
+    payloads = load_payloads()
+    print(f"{'payload':<12}{'bytes':>10}{'soup ms':>10}{'stream ms':>11}{'speedup':>9}{'soup peak MB':>14}{'stream peak MB':>16}")
+    for (name, (tag, columns, dtypes)) in cases.items():
+        content = payloads[name]
+        soupCall = lambda: soup_records(content, tag, list(columns.values())).astype({columns[c]:t for (c, t) in dtypes.items()})
+        streamCall = lambda: xmlparse.parse_records(content, tag, columns, dtypes=dtypes)
+        # Both parsers must agree
+        expected = soupCall()
+        expected.columns = list(columns)
+        pd.testing.assert_frame_equal(streamCall(), expected)
+        soupTime = min(timeit.repeat(soupCall, number=1, repeat=repeat))
+        streamTime = min(timeit.repeat(streamCall, number=1, repeat=repeat))
+        peaks = []
+        for call in (soupCall, streamCall):
+            tracemalloc.start()
+            call()
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1e6)
+            tracemalloc.stop()
+        print(f"{name:<12}{len(content):>10,}{soupTime * 1000:>10.1f}{streamTime * 1000:>11.1f}{soupTime / streamTime:>8.1f}x{peaks[0]:>14.1f}{peaks[1]:>16.1f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--record', action='store_true', help='save live MFL payloads before benchmarking')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    if args.record:
+        record()
+    run(args.repeat)
@@ -0,0 +1,125 @@
+# Benchmark the compiled scoring engine against the original pd.cut implementation of calculate_scoresFF
+# Usage:
+#   python benchmarks/bench_scoring.py [--players 2500] [--weeks 18] [--repeat 5]
+import os
+import sys
+import argparse
+import timeit
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ffpackage import analysis, league
+
+# League scoring rules used by the app
+scoringDict = {
+    'passA': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
+    'passC': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
+    'passY': {"multiplier":0.04, "bins":[-np.inf, np.inf], "labels":[0]},
+    'passT': {"multiplier":4, "bins":[-np.inf, np.inf], "labels":[0]},
+    'passI': {"multiplier":-2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'pass2': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'rushA': {"multiplier":0.1, "bins":[-np.inf, np.inf], "labels":[0]},
+    'rushY': {"multiplier":0.1, "bins":[-np.inf, np.inf], "labels":[0]},
+    'rushT': {"multiplier":6, "bins":[-np.inf, np.inf], "labels":[0]},
+    'rush2': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'recC': {"multiplier":0.25, "bins":[-np.inf, np.inf], "labels":[0]},
+    'recY': {"multiplier":0.1, "bins":[-np.inf, np.inf], "labels":[0]},
+    'recT': {"multiplier":6, "bins":[-np.inf, np.inf], "labels":[0]},
+    'rec2': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'fum': {"multiplier":-2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'XPA': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
+    'XPM': {"multiplier":3, "bins":[-np.inf, np.inf], "labels":[0]},
+    'FGA': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
+    'FGM': {"multiplier":3, "bins":[-np.inf, np.inf], "labels":[0]},
+    'FG50': {"multiplier":5, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defSack': {"multiplier":1, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defI': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defSaf': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defFum': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defBlk': {"multiplier":1.5, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defT': {"multiplier":6, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defPtsAgainst': {"multiplier":0, "bins":[-5,0,6,13,17,21,27,34,45,59,99], "labels":[10,8,7,5,3,2,0,-1,-3,-5]},
+    'defPassYAgainst': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defRushYAgainst': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defYdsAgainst': {"multiplier":0, "bins":[0,274,324,375,425,999], "labels":[5,2,0,-2,-5]}
+}
+
+# Original implementation, kept here as the reference
+def calculate_scoresFF_reference(df, scoringDict):
+    multiplier = {key:value["multiplier"] for (key, value) in scoringDict.items()}
+    scoresBase = df.copy()
+    scoresBase.loc[:, scoringDict.keys()] = scoresBase.loc[:, scoringDict.keys()].mul(multiplier)
+    scoresBonus = df.copy()
+    for colName in scoringDict.keys():
+        scoresBonus[colName] = pd.cut(
+            scoresBonus[colName],
+            bins=scoringDict[colName]["bins"],
+            include_lowest=True,
+            labels=scoringDict[colName]["labels"]
+        )
+    defensiveCategories = ['defBlk', 'defT', 'defPtsAgainst', 'defPassYAgainst', 'defRushYAgainst', 'defYdsAgainst']
+    scoresBonus.loc[scoresBonus['pos']!='DF', defensiveCategories] = 0
+    # (column assignment rather than .loc, which keeps the categorical dtype on pandas >= 2.1)
+    scoresBonus[list(scoringDict.keys())] = scoresBonus.loc[:, scoringDict.keys()].astype('float64')
+    scoresTotal = scoresBase.loc[:, scoringDict.keys()].add(scoresBonus.loc[:, scoringDict.keys()])
+    analyzed = df.drop(columns=scoringDict.keys())
+    analyzed['scoreTotal'] = scoresTotal.sum(axis=1)
+    return analyzed
+
+# Build a full-season predictions frame, including bin edges, out-of-range values and missing values
+def season_frame(nPlayers, nWeeks, seed=0):
+    rng = np.random.default_rng(seed)
+    nRows = nPlayers * nWeeks
+    df = pd.DataFrame({
+        'id_mfl': np.repeat([str(10000 + i) for i in range(nPlayers)], nWeeks),
+        'week': np.tile(np.arange(1, nWeeks + 1), nPlayers),
+        'pos': np.repeat(rng.choice(['QB', 'RB', 'WR', 'TE', 'PK', 'DF'], nPlayers), nWeeks),
+    })
+    for colName in scoringDict:
+        df[colName] = rng.gamma(2.0, 10.0, nRows)
+    df['defPtsAgainst'] = rng.uniform(-10, 110, nRows)
+    df['defYdsAgainst'] = rng.choice([0, 274, 300, 999, 1200, -3], nRows).astype('float64')
+    df.loc[rng.random(nRows) < 0.01, 'passY'] = np.nan
+    return df
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=2500)
+    parser.add_argument('--weeks', type=int, default=18)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    df = season_frame(args.players, args.weeks)
+    compiled = analysis.compile_scoring(scoringDict)
+    # Outputs must be identical
+    pd.testing.assert_frame_equal(analysis.calculate_scoresFF(df, compiled), calculate_scoresFF_reference(df, scoringDict), check_exact=True)
+
+    referenceTime = min(timeit.repeat(lambda: calculate_scoresFF_reference(df, scoringDict), number=1, repeat=args.repeat))
+    compileTime = min(timeit.repeat(lambda: analysis.compile_scoring(scoringDict), number=1, repeat=args.repeat))
+    compiledTime = min(timeit.repeat(lambda: analysis.calculate_scoresFF(df, compiled), number=1, repeat=args.repeat))
+    # Rules of their own at some positions must score each position as the reference does with that position's rules
+    positionDict = {colName: dict(rule) for (colName, rule) in scoringDict.items()}
+    positionDict['recC']['positions'] = {'TE': {"multiplier":0.75, "bins":[-np.inf, np.inf], "labels":[0]}}
+    positionDict['passT']['positions'] = {'QB': {"multiplier":6, "bins":[-np.inf, np.inf], "labels":[0]}}
+    positionDict['rushY']['positions'] = {'RB': {"multiplier":0.1, "bins":[-np.inf, 99, 149, np.inf], "labels":[0, 3, 5]}}
+    byPosition = []
+    for (pos, rows) in df.groupby('pos').groups.items():
+        posDict = {colName: {key: value for (key, value) in rule.get('positions', {}).get(pos, rule).items() if key != 'positions'} for (colName, rule) in positionDict.items()}
+        byPosition.append(calculate_scoresFF_reference(df.loc[rows], posDict))
+    pd.testing.assert_frame_equal(analysis.calculate_scoresFF(df, positionDict), pd.concat(byPosition).loc[df.index], check_exact=True)
+
+    # Field goals scored by distance: 50+ yards go through FG50, the 40-49 tier has no stat of its own and is reported
+    rules = pd.DataFrame({
+        'positions': ['PK', 'PK', 'PK'], 'event': ['FG', 'FG', 'FG'], 'range': ['0-39', '40-49', '50-99'], 'points': ['3', '4', '5'],
+    })
+    (tieredDict, unsupported) = league.build_scoringDict(rules)
+    assert (tieredDict['FGM']['multiplier'], tieredDict['FG50']['multiplier']) == (3, 2)
+    assert len(unsupported) == 1 and unsupported[0].startswith('FG 40-49')
+    kicker = pd.DataFrame({colName: [0.0] for colName in tieredDict}).assign(pos='PK', FGM=3.0, FG50=1.0)
+    assert analysis.calculate_scoresFF(kicker, tieredDict)['scoreTotal'].iloc[0] == 3 * 3 + 2
+
+    print(f'{len(df):,} rows, outputs identical')
+    print(f'reference (pd.cut)   {referenceTime * 1000:>8.1f} ms')
+    print(f'compile once         {compileTime * 1000:>8.3f} ms')
+    print(f'compiled engine      {compiledTime * 1000:>8.1f} ms  ({referenceTime / compiledTime:.1f}x)')
@@ -0,0 +1,66 @@
+# Benchmark the matchup and playoff simulations for a 12 team league, and check that seeded runs repeat exactly
+# Usage:
+#   python benchmarks/bench_simulation.py [--sims 10000] [--from-week 5] [--repeat 3]
+import os
+import sys
+import argparse
+import timeit
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ffpackage import league, simulation
+from bench_lineups import league_frame
+
+# Build a 12 team league: rosters, weekly predictions with NFL teams, a random schedule, standings and a live week
+def league_data(fromWeek, nWeeks=17, seed=0):
+    rng = np.random.default_rng(seed)
+    rosters = league_frame(12, 28, seed=seed)
+    rosters = rosters.loc[rosters['franchiseID'] != 'FA']
+    nflTeams = dict(zip(rosters['id_mfl'], rng.choice([f'T{i:02d}' for i in range(32)], len(rosters))))
+    predictions = pd.concat([
+        rosters[['id_mfl', 'pos']].assign(week=week, team=rosters['id_mfl'].map(nflTeams), scoreTotal=rng.gamma(2.0, 5.0, len(rosters)).round(1))
+        for week in range(1, nWeeks + 1)
+    ], ignore_index=True)
+    franchises = sorted(rosters['franchiseID'].unique())
+    schedule = []
+    for week in range(1, nWeeks + 1):
+        order = rng.permutation(franchises)
+        schedule += [(week, matchup, order[2 * matchup + side]) for matchup in range(len(franchises) // 2) for side in range(2)]
+    schedule = pd.DataFrame(schedule, columns=['week', 'matchup', 'franchiseID'])
+    standings = pd.DataFrame({
+        'franchiseID': franchises,
+        'wins': rng.integers(0, fromWeek, len(franchises)), 'losses': 0, 'ties': 0,
+        'pointsFor': rng.uniform(80, 130, len(franchises)) * (fromWeek - 1),
+    })
+    # Starters mid-game in the first remaining week
+    live = rosters.loc[rosters['rosterStatus'] == 'ROSTER', ['franchiseID', 'id_mfl']].assign(week=fromWeek, status='starter')
+    thisWeek = schedule.loc[schedule['week'] == fromWeek]
+    live['matchup'] = live['franchiseID'].map(dict(zip(thisWeek['franchiseID'], thisWeek['matchup'])))
+    live['liveScore'] = rng.uniform(0, 10, len(live)).round(1).astype(str)
+    live['secondsRemaining'] = rng.integers(0, 3601, len(live)).astype(str)
+    return (rosters, predictions, schedule, standings, live)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sims', type=int, default=simulation.defaultSims)
+    parser.add_argument('--from-week', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    (rosters, predictions, schedule, standings, live) = league_data(args.from_week)
+    limits = (league.defaultStartersMax, league.defaultPosMax, league.defaultPosMin)
+    runMatchups = lambda seed: simulation.matchup_odds(live, predictions.loc[predictions['week'] == args.from_week], nSims=args.sims, seed=seed)
+    runPlayoffs = lambda seed: simulation.playoff_odds(predictions, rosters, schedule, standings, args.from_week, *limits, nSims=args.sims, seed=seed)
+    # Seeded runs must repeat exactly, and every simulated season must seed exactly playoffTeams franchises
+    pd.testing.assert_frame_equal(runMatchups(1), runMatchups(1), check_exact=True)
+    playoffs = runPlayoffs(1)
+    pd.testing.assert_frame_equal(playoffs, runPlayoffs(1), check_exact=True)
+    assert np.isclose(playoffs['playoffOdds'].sum(), 6)
+
+    matchupTime = min(timeit.repeat(lambda: runMatchups(None), number=1, repeat=args.repeat))
+    playoffTime = min(timeit.repeat(lambda: runPlayoffs(None), number=1, repeat=args.repeat))
+    weeks = schedule.loc[schedule['week'] >= args.from_week, 'week'].nunique()
+    print(f'{args.sims:,} simulations, seeded runs identical')
+    print(f'this week\'s matchups          {matchupTime * 1000:>7.0f} ms')
+    print(f'playoff odds ({weeks} weeks left)  {playoffTime * 1000:>7.0f} ms')
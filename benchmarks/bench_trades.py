@@ -0,0 +1,74 @@
+# Benchmark trade suggestions for 12, 16 and 32 team leagues, and check the suggested gains against optimalStarters
+# Also checks that pruning keeps every 1x1 trade a brute-force search finds, with and without negative projections
+# Usage:
+#   python benchmarks/bench_trades.py [--roster 28] [--budget 2.0] [--workers 4]
+import os
+import sys
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ffpackage import analysis, league, trades
+from bench_lineups import league_frame
+
+# Starting lineup total of one franchise, recomputed from scratch
+def lineup_total(df, franchiseID):
+    df = analysis.optimalStarters(df.copy(), 'scoreTotal', league.defaultStartersMax, league.defaultPosMax, league.defaultPosMin)
+    return df.loc[(df['franchiseID'] == franchiseID) & (df['startSelector'] == 'Starter'), 'scoreTotal'].sum()
+
+# Every 1x1 trade that improves both lineups, found by recomputing both lineups for every pair of players
+def brute_force_1x1(df, franchiseID):
+    rostered = df.loc[df['rosterStatus'] == 'ROSTER']
+    found = set()
+    for partnerID in sorted(set(rostered['franchiseID']) - {franchiseID, 'FA'}):
+        (userBase, partnerBase) = (lineup_total(df, franchiseID), lineup_total(df, partnerID))
+        for give in rostered.loc[rostered['franchiseID'] == franchiseID, 'id_mfl']:
+            for get in rostered.loc[rostered['franchiseID'] == partnerID, 'id_mfl']:
+                traded = df.copy()
+                traded.loc[traded['id_mfl'] == give, 'franchiseID'] = partnerID
+                traded.loc[traded['id_mfl'] == get, 'franchiseID'] = franchiseID
+                if lineup_total(traded, franchiseID) - userBase > 1e-9 and lineup_total(traded, partnerID) - partnerBase > 1e-9:
+                    found.add((partnerID, (give,), (get,)))
+    return found
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--roster', type=int, default=28)
+    parser.add_argument('--budget', type=float, default=2.0)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    limits = (league.defaultStartersMax, league.defaultPosMax, league.defaultPosMin)
+    # Start the worker pool before timing
+    trades.suggest_trades(league_frame(2, args.roster), '0001', 'scoreTotal', *limits, maxWorkers=args.workers)
+    # Pruning must not drop trades, including when both sides start two kickers with negative projections and giving
+    # one away helps on its own
+    for negative in [False, True]:
+        df = league_frame(2, 24, seed=1)
+        if negative:
+            df.loc[df['pos'] == 'PK', 'pos'] = 'WR'
+            df.loc[df.index[[0, 1, 24, 25]], 'pos'] = 'PK'
+            df.loc[df.index[[0, 1, 24, 25]], 'scoreTotal'] = [-8.0, -9.0, -10.0, -12.0]
+        suggested = trades.suggest_trades(df, '0001', 'scoreTotal', *limits, topK=100000, budgetSeconds=60)
+        suggested1x1 = {(trade.partnerID, trade.give, trade[2]) for trade in suggested.itertuples(index=False) if len(trade.give) == len(trade[2]) == 1}
+        assert suggested1x1 == brute_force_1x1(df, '0001')
+    print(f'{"teams":>5} {"in-process ms":>14} {"pool ms":>8} {"complete":>9} {"best gain":>10}')
+    for nTeams in [12, 16, 32]:
+        df = league_frame(nTeams, args.roster)
+        start = time.perf_counter()
+        inProcess = trades.suggest_trades(df, '0001', 'scoreTotal', *limits, budgetSeconds=args.budget, maxWorkers=0)
+        inProcessTime = time.perf_counter() - start
+        start = time.perf_counter()
+        pooled = trades.suggest_trades(df, '0001', 'scoreTotal', *limits, budgetSeconds=args.budget, maxWorkers=args.workers)
+        pooledTime = time.perf_counter() - start
+        # Every suggested gain must match a full lineup recomputation after the trade
+        for trade in pooled.itertuples(index=False):
+            traded = df.copy()
+            traded.loc[traded['id_mfl'].isin(trade.give), 'franchiseID'] = trade.partnerID
+            traded.loc[traded['id_mfl'].isin(trade[2]), 'franchiseID'] = '0001'
+            assert np.isclose(lineup_total(traded, '0001') - lineup_total(df, '0001'), trade.userGain)
+            assert np.isclose(lineup_total(traded, trade.partnerID) - lineup_total(df, trade.partnerID), trade.partnerGain)
+        best = pooled['userGain'].max() if len(pooled) else 0
+        print(f'{nTeams:>5} {inProcessTime * 1000:>14.0f} {pooledTime * 1000:>8.0f} {str(pooled.attrs["complete"]):>9} {best:>10.1f}')
@@ -0,0 +1,50 @@
+# Benchmark free agent ranking against re-running optimalStarters once per (free agent, drop) pair
+# Usage:
+#   python benchmarks/bench_waivers.py [--teams 12] [--roster 28] [--free-agents 200 400 800]
+import os
+import sys
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ffpackage import analysis, league, waivers
+from bench_lineups import league_frame
+
+limits = (league.defaultStartersMax, league.defaultPosMax, league.defaultPosMin)
+
+# Starting lineup total of one franchise, recomputed from scratch
+def lineup_total(df, franchiseID):
+    df = analysis.optimalStarters(df.copy(), 'scoreTotal', *limits)
+    return df.loc[(df['franchiseID'] == franchiseID) & (df['startSelector'] == 'Starter'), 'scoreTotal'].sum()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--teams', type=int, default=12)
+    parser.add_argument('--roster', type=int, default=28)
+    parser.add_argument('--free-agents', type=int, nargs='+', default=[200, 400, 800])
+    args = parser.parse_args()
+
+    print(f'{"free agents":>11} {"batch ms":>9} {"naive ms (est.)":>16}')
+    for nFree in args.free_agents:
+        # Swap league_frame's free agent pool for one of nFree players
+        df = league_frame(args.teams, args.roster)
+        freeAgents = league_frame(0, nFree, seed=nFree).assign(id_mfl=lambda d: 'FA' + d['id_mfl'])
+        df = pd.concat([df.loc[df['franchiseID'] != 'FA'], freeAgents.head(nFree)], ignore_index=True)
+        start = time.perf_counter()
+        ranked = waivers.rank_freeAgents(df, '0001', 'scoreTotal', *limits, topK=10)
+        batchTime = time.perf_counter() - start
+        # Check the top suggestions against full recomputations
+        base = lineup_total(df, '0001')
+        for row in ranked.itertuples(index=False):
+            signed = df.copy()
+            signed.loc[signed['id_mfl'] == row.id_mfl, ['franchiseID', 'rosterStatus']] = ['0001', 'ROSTER']
+            assert np.isclose(lineup_total(signed, '0001') - base, row.addGain)
+            signed.loc[signed['id_mfl'] == row.dropID, 'franchiseID'] = 'FA'
+            assert np.isclose(lineup_total(signed, '0001') - base, row.dropGain)
+        # The naive approach re-selects the lineup once per (free agent, drop) pair; time one and scale up
+        start = time.perf_counter()
+        lineup_total(df, '0001')
+        naiveTime = (time.perf_counter() - start) * nFree * (args.roster + 1)
+        print(f'{nFree:>11} {batchTime * 1000:>9.1f} {naiveTime * 1000:>16.0f}')
@@ -24,6 +24,158 @@ def starterSelector(df, how, startersMax, posMax, posMin):
 
     return df
 
+# Best possible starting lineup for every franchise at once; a drop-in replacement for starterSelector
+# Each position's top posMin players start, then the best remaining players fill the flex spots without passing posMax.
+# Filling the required spots first and the flex spots best-first is optimal for these limits, so the lineup has the highest total `how`.
+# Ties are broken by id_mfl so the same inputs always give the same lineup
+#   groups: columns that identify one lineup (a franchise, or a franchise and week)
+def optimalStarters(df, how, startersMax, posMax, posMin, groups=("franchiseID",)):
+    # Calculate the number of available flex spots
+    flexspots = startersMax - sum(posMin.values())
+    n = len(df)
+    # Only players on the ROSTER (not TAXI_SQUAD or INJURED_RESERVE) with a prediction can start
+    score = df[how].to_numpy(dtype='float64', na_value=np.nan)
+    eligible = (df['rosterStatus'] == 'ROSTER').to_numpy(dtype=bool, na_value=False) & ~np.isnan(score)
+    # Integer codes for the lineup groups, positions and ids, so everything below is plain array work
+    groupCodes = pd.MultiIndex.from_frame(df[list(groups)].astype(object)).factorize()[0] if len(groups) > 1 else pd.factorize(df[groups[0]])[0]
+    (posCodes, positions) = pd.factorize(df['pos'])
+    idCodes = np.unique(df['id_mfl'].astype(str).to_numpy(), return_inverse=True)[1]
+    # Per-row limits for each player's position; positions without limits can only start as flex players
+    posMinRow = np.array([posMin.get(pos, 0) for pos in positions], dtype='int64')[posCodes]
+    posMaxRow = np.array([posMax.get(pos, n) for pos in positions], dtype='float64')[posCodes]
+    # Sort eligible players by lineup group, position, score (best first) and id
+    rows = np.flatnonzero(eligible)
+    order = rows[np.lexsort((idCodes[rows], -score[rows], posCodes[rows], groupCodes[rows]))]
+    # Rank within each group and position from the sorted layout: position in the array minus the start of its run
+    newRun = np.ones(len(order), dtype=bool)
+    newRun[1:] = (groupCodes[order][1:] != groupCodes[order][:-1]) | (posCodes[order][1:] != posCodes[order][:-1])
+    runStart = np.maximum.accumulate(np.where(newRun, np.arange(len(order)), 0))
+    posRank = np.arange(len(order)) - runStart
+    # Required starters, and the players still allowed to take a flex spot
+    required = posRank < posMinRow[order]
+    flexible = ~required & (posRank < posMaxRow[order])
+    # Rank the flex candidates within their lineup group by score (best first) and id
+    candidates = order[flexible]
+    candidates = candidates[np.lexsort((idCodes[candidates], -score[candidates], groupCodes[candidates]))]
+    newGroup = np.ones(len(candidates), dtype=bool)
+    newGroup[1:] = groupCodes[candidates][1:] != groupCodes[candidates][:-1]
+    groupStart = np.maximum.accumulate(np.where(newGroup, np.arange(len(candidates)), 0))
+    flexRank = np.arange(len(candidates)) - groupStart
+    # Assign "Starter" to the required and top flex players and "Bench" to everyone else
+    starter = np.zeros(n, dtype=bool)
+    starter[order[required]] = True
+    starter[candidates[flexRank < flexspots]] = True
+    df['startSelector'] = np.where(starter, 'Starter', 'Bench')
+    # Rank within the position, or among the flex candidates for players who can take a flex spot, as starterSelector reports it
+    rosterRank = np.full(n, np.nan)
+    rosterRank[order] = posRank + 1
+    rosterRank[candidates] = flexRank + 1
+    df['rosterRank'] = rosterRank
+    return df
+
+# Each player's value over the replacement level at his position, with every position's replacement level found in one pass
+# The input frame is left unchanged; the values come back as a Series aligned with it
+#   method "lastStarter": the lowest scoring Starter at the position (needs startSelector)
+#   method "nthBest": the nth best player at the position league-wide; nth is {pos: n}, by default the number of Starters there
+#   method "waiver": the best player at the position still available (franchiseID "FA")
+def relativeValues(df, how, method="lastStarter", nth=None):
+    score = df[how]
+    if method == "lastStarter":
+        replacement = score.where(df['startSelector'] == 'Starter').groupby(df['pos'], observed=True).min()
+    elif method == "waiver":
+        replacement = score.where(df['franchiseID'] == 'FA').groupby(df['pos'], observed=True).max()
+    elif method == "nthBest":
+        if nth is None:
+            nth = (df['startSelector'] == 'Starter').groupby(df['pos'], observed=True).sum().to_dict()
+        # Sort by position, best first, and pick the nth entry of each position's run
+        (posCodes, positions) = pd.factorize(df['pos'])
+        values = score.to_numpy(dtype='float64', na_value=np.nan)
+        rows = np.flatnonzero((posCodes >= 0) & ~np.isnan(values))
+        order = rows[np.lexsort((-values[rows], posCodes[rows]))]
+        runStart = np.searchsorted(posCodes[order], np.arange(len(positions)), side='left')
+        runEnd = np.searchsorted(posCodes[order], np.arange(len(positions)), side='right')
+        pick = runStart + np.array([nth.get(pos, 0) for pos in positions], dtype='int64') - 1
+        found = (pick >= runStart) & (pick < runEnd)
+        levels = np.full(len(positions), np.nan)
+        levels[found] = values[order[pick[found]]]
+        replacement = pd.Series(levels, index=positions)
+    else:
+        raise ValueError(f"Unknown replacement method: {method}")
+    # Subtract each position's replacement level
+    return score - df['pos'].map(replacement).astype('float64')
+
+# Per-position score table for one roster: row p holds position p's scores, best first, padded with -inf out to `width`
+# Also returns each player's column in its row, so moves can empty that cell later
+def positionTable(scores, posCodes, nPositions, width):
+    table = np.full((nPositions, width), -np.inf)
+    order = np.lexsort((-scores, posCodes))
+    sortedPos = posCodes[order]
+    rank = np.arange(len(order)) - np.searchsorted(sortedPos, sortedPos, side='left')
+    table[sortedPos, rank] = scores[order]
+    playerRank = np.empty(len(order), dtype='int64')
+    playerRank[order] = rank
+    return (table, playerRank)
+
+# Position tables after a batch of moves, one (positions, width) table per move
+#   removePos/removeRank: (batch, nRemove) cells of players leaving the roster
+#   insertPos/insertScore: (batch, nInsert) players joining it; the table needs nInsert spare -inf columns
+def movedTables(table, removePos, removeRank, insertPos, insertScore):
+    batch = max(len(removePos), len(insertPos))
+    tables = np.broadcast_to(table, (batch,) + table.shape).copy()
+    rows = np.arange(batch)
+    for j in range(removePos.shape[1]):
+        tables[rows, removePos[:, j], removeRank[:, j]] = -np.inf
+    # Joining players go into the spare columns at the end, one column each so two players at one position both fit
+    for j in range(insertPos.shape[1]):
+        tables[rows, insertPos[:, j], table.shape[1] - 1 - j] = insertScore[:, j]
+    # Re-sort every row best first
+    tables.sort(axis=2)
+    return tables[:, :, ::-1]
+
+# Value of the best starting lineup for a batch of position tables (batch, positions, width), as optimalStarters picks it
+# Each position's top posMin players count, then the best flexspots of the players ranked posMin..posMax-1; empty slots count 0
+def lineupValues(tables, posMinArr, posMaxArr, flexspots):
+    (batch, nPositions, width) = tables.shape
+    rank = np.arange(width)
+    requiredMask = rank[None, :] < np.asarray(posMinArr)[:, None]
+    flexMask = ~requiredMask & (rank[None, :] < np.asarray(posMaxArr)[:, None])
+    filled = np.isfinite(tables)
+    required = np.where(requiredMask & filled, tables, 0).sum(axis=(1, 2))
+    # Best flexspots among the flex-eligible cells, found with a partial sort
+    flexPool = np.where(flexMask, tables, -np.inf).reshape(batch, -1)
+    take = min(flexspots, flexPool.shape[1])
+    if take <= 0:
+        return required
+    flexTop = -np.partition(-flexPool, take - 1, axis=1)[:, :take]
+    flex = np.where(np.isfinite(flexTop), flexTop, 0).sum(axis=1)
+    return required + flex
+
+# One roster's players as arrays: ids, scores, position codes and their cells in the position table
+class RosterTable:
+    def __init__(self, ids, scores, posCodes, nPositions):
+        self.ids = ids
+        self.scores = scores
+        self.posCodes = posCodes
+        # Two spare columns so up to two incoming players at one position still fit
+        width = (np.bincount(posCodes, minlength=nPositions).max() if len(posCodes) else 0) + 2
+        (self.table, self.ranks) = positionTable(scores, posCodes, nPositions, width)
+
+    # Lineup value after each move in a batch; leaving (this roster's players) and joining (other's players) are index arrays of shape (batch, n)
+    def values_after(self, leaving, joining, other, limits):
+        tables = movedTables(self.table, self.posCodes[leaving], self.ranks[leaving], other.posCodes[joining], other.scores[joining])
+        return limits.values(tables)
+
+# Lineup limits as arrays in position-code order
+class LineupLimits:
+    def __init__(self, positions, startersMax, posMax, posMin):
+        self.posMinArr = np.array([posMin.get(pos, 0) for pos in positions], dtype='int64')
+        self.posMaxArr = np.array([posMax.get(pos, np.iinfo('int64').max) for pos in positions], dtype='int64')
+        self.flexspots = startersMax - sum(posMin.values())
+
+    # Lineup values for a batch of position tables
+    def values(self, tables):
+        return lineupValues(tables, self.posMinArr, self.posMaxArr, self.flexspots)
+
 # Calculate each player's liveScoring Projections based on amount of time remaining
 def expectedLiveScore(row):
     # Use a different calculation method for defenses since defenses do not accrue points; they lose points
@@ -61,35 +213,121 @@ def colorPicker(row):
     color = f'rgb({red},{green},{blue})'
     return color
 
+# Chart colors for every scaled difference from -255 (darkest red) to 255 (darkest green), built once with colorPicker's rules
+_scalars = np.arange(-255, 256)
+liveColorTable = np.array([
+    f'rgb({255 - max(scalar, 0)},{255 + min(scalar, 0)},{255 - abs(scalar)})' for scalar in _scalars
+], dtype=object)
+
+# Calculate every player's liveScoring Projection at once; matches expectedLiveScore row by row
+def expectedLiveScores(df):
+    scoreTotal = df['scoreTotal'].to_numpy(dtype='float64', na_value=np.nan)
+    liveScore = df['liveScore'].to_numpy(dtype='float64', na_value=np.nan)
+    secondsRemaining = df['secondsRemaining'].to_numpy(dtype='float64', na_value=np.nan)
+    # Defenses move from their prediction to their liveScore as the game goes on; everyone else adds the prediction for the time left
+    isDefense = (df['pos'] == 'DF').to_numpy(dtype=bool, na_value=False)
+    result = np.where(
+        isDefense,
+        (scoreTotal * secondsRemaining + liveScore * (3600 - secondsRemaining)) / 3600,
+        liveScore + (scoreTotal * secondsRemaining / 3600)
+    )
+    return pd.Series(result, index=df.index)
+
+# Set colors for chart for every player at once; matches colorPicker row by row
+# Players without a projection (missing scoreTotal) are drawn in the neutral color
+def liveColors(df):
+    diff = df['expectedLiveScore'].to_numpy(dtype='float64', na_value=np.nan) - df['scoreTotal'].to_numpy(dtype='float64', na_value=np.nan)
+    diff = np.nan_to_num(diff, nan=0.0)
+    # Cap outliers at 20 points over/under and scale to -255..255; np.rint rounds halves to even like round() does
+    scalar = np.rint(np.clip(diff, -20, 20) * 255 / 20).astype('int64')
+    # Look up the color for each scaled difference
+    return pd.Series(liveColorTable[scalar + 255], index=df.index)
+
 # Calculate player ages using datetime's relativedelta
 def calculate_age(dob):
     today = date.today()
     age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
     return age
 
+# Scoring categories that only count for defenses
+defensiveCategories = ['defBlk', 'defT', 'defPtsAgainst', 'defPassYAgainst', 'defRushYAgainst', 'defYdsAgainst']
+
+# Bin points earned by each value, NaN for values outside every bin
+# Matches pd.cut(include_lowest=True): a value in (bins[i], bins[i+1]] (or equal to bins[0]) earns labels[i]
+def _bin_points(values, bins, labels):
+    # Find each value's bin with a binary search over the edges
+    binIndex = np.searchsorted(bins, values, side='left') - 1
+    binIndex[values == bins[0]] = 0
+    inRange = (binIndex >= 0) & (binIndex < len(labels))
+    return np.where(inRange, labels[np.clip(binIndex, 0, len(labels) - 1)], np.nan)
+
+# League scoring rules compiled into arrays once, so scoring a frame is a single NumPy pass
+#   multipliers: points per unit of each stat, in column order
+#   binTables:   (column position, bin edges, bin points, defensive only) for the categories whose bins can change the score
+#   positionRules: (column position, pos, multiplier, bin edges, bin points, defensive only) for categories a league scores
+#                  differently at some positions; a rule's optional "positions" maps a pos to its own multiplier, bins and labels
+# Bins of [-inf, inf] with 0 points are dropped; they can never add anything
+class CompiledScoring:
+    def __init__(self, scoringDict):
+        self.columns = list(scoringDict.keys())
+        self.multipliers = np.array([rule["multiplier"] for rule in scoringDict.values()], dtype='float64')
+        self.binTables = []
+        self.positionRules = []
+        for (j, (colName, rule)) in enumerate(scoringDict.items()):
+            for (pos, positionRule) in rule.get("positions", {}).items():
+                self.positionRules.append((
+                    j, pos, float(positionRule["multiplier"]), np.asarray(positionRule["bins"], dtype='float64'),
+                    np.asarray(positionRule["labels"], dtype='float64'), colName in defensiveCategories
+                ))
+            bins = np.asarray(rule["bins"], dtype='float64')
+            labels = np.asarray(rule["labels"], dtype='float64')
+            if bins[0] == -np.inf and bins[-1] == np.inf and not labels.any():
+                continue
+            self.binTables.append((j, bins, labels, colName in defensiveCategories))
+
+    # Score every row: stat x multiplier plus the bin bonus for each category, summed across categories
+    # Matches pd.cut(include_lowest=True): a value in (bins[i], bins[i+1]] (or equal to bins[0]) earns labels[i];
+    # a value outside every bin makes its whole category count as 0, as the categorical NaN did
+    def score(self, df):
+        n = len(df)
+        # One row per player, one column per category; row-major so the row sum adds categories in the same order pandas does
+        scores = np.empty((n, len(self.columns)), dtype='float64')
+        for (j, colName) in enumerate(self.columns):
+            np.multiply(df[colName].to_numpy(dtype='float64', na_value=np.nan), self.multipliers[j], out=scores[:, j])
+        if self.binTables:
+            isDefense = (df['pos'] == 'DF').to_numpy(dtype=bool, na_value=False)
+        for (j, bins, labels, defensiveOnly) in self.binTables:
+            bonus = _bin_points(df[self.columns[j]].to_numpy(dtype='float64', na_value=np.nan), bins, labels)
+            # Remove defensive scoring bonuses from offensive players
+            if defensiveOnly:
+                bonus[~isDefense] = 0
+            scores[:, j] += bonus
+        # Rescore the categories a position has its own rules for at that position's rows
+        if self.positionRules:
+            pos = df['pos'].to_numpy(dtype=object, na_value=None)
+        for (j, p, multiplier, bins, labels, defensiveOnly) in self.positionRules:
+            rows = np.flatnonzero(pos == p)
+            values = df[self.columns[j]].to_numpy(dtype='float64', na_value=np.nan)[rows]
+            bonus = _bin_points(values, bins, labels)
+            if defensiveOnly and p != 'DF':
+                bonus[:] = 0
+            scores[rows, j] = values * multiplier + bonus
+        # Categories that came out missing count as 0
+        scores[np.isnan(scores)] = 0
+        return scores.sum(axis=1)
+
+# Compile a scoringDict; already compiled rules are passed through
+def compile_scoring(scoringDict):
+    if isinstance(scoringDict, CompiledScoring):
+        return scoringDict
+    return CompiledScoring(scoringDict)
+
 # Calculate FANTASY points customized based on league-specific scoring rules
+# scoringDict can be a scoringDict or the CompiledScoring built from one; compile once and reuse it when scoring repeatedly
 def calculate_scoresFF(df, scoringDict):
-    # Multiply the nflStats by the mulitplier row to get base scores
-    multiplier = {key:value["multiplier"] for (key, value) in scoringDict.items()}
-    scoresBase = df.copy()
-    scoresBase.loc[:, scoringDict.keys()] = scoresBase.loc[:, scoringDict.keys()].mul(multiplier)
-    # Bin and cut the nflStats into a bonus score df
-    scoresBonus = df.copy()
-    for colName in scoringDict.keys():
-        scoresBonus[colName] = pd.cut(
-            scoresBonus[colName], 
-            bins=scoringDict[colName]["bins"], 
-            include_lowest=True, 
-            labels=scoringDict[colName]["labels"]
-        )
-    # Remove defensive scoring bonuses from offensive players
-    defensiveCategories = ['defBlk', 'defT', 'defPtsAgainst', 'defPassYAgainst', 'defRushYAgainst', 'defYdsAgainst']
-    scoresBonus.loc[scoresBonus['pos']!='DF', defensiveCategories] = 0
-    scoresBonus.loc[:, scoringDict.keys()] = scoresBonus.loc[:, scoringDict.keys()].astype('float64')
-    # Add base scores and bonus scores 
-    scoresTotal = scoresBase.loc[:, scoringDict.keys()].add(scoresBonus.loc[:, scoringDict.keys()])
-    # Create summary table 
-    analyzed = df.drop(columns=scoringDict.keys())
+    scoring = compile_scoring(scoringDict)
+    # Create summary table
+    analyzed = df.drop(columns=scoring.columns)
     # Add together scores from each scoring category (sum across the row)
-    analyzed['scoreTotal'] = scoresTotal.sum(axis=1)
-    return analyzed
\ No newline at end of file
+    analyzed['scoreTotal'] = scoring.score(df)
+    return analyzed
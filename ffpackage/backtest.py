@@ -0,0 +1,162 @@
+# Backtest the position models against past seasons
+# Usage:
+#   python -m ffpackage.backtest onetimeData/modelSource.csv --seasons 2022 [--model-dir models] [--workers 2] [--out backtest]
+# Every week is replayed as of its kickoff: features from the stats before that week, predicted stats scored with the
+# league scoring through calculate_scoresFF, and compared with the points the players actually scored. Each week's
+# feature matrix is cached on disk, so backtesting several model directories over the same history builds them once.
+# Backtest seasons the models were not trained on; otherwise the errors are optimistic.
+# Import dependencies
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+# Internal imports
+from ffpackage import analysis, features, league, predictions, training
+
+
+# Key columns saved with each week's features
+keyColumns = ['player', 'team', 'pos', 'posRank']
+defaultCacheDir = os.path.join(predictions.defaultModelDir, 'cache', 'backtest')
+
+
+# Paths of one week's cached features (float32, featureColumns), actual stats (float64, labelColumns) and keys
+def week_paths(seasonDir, week):
+    prefix = os.path.join(seasonDir, f'week{week:02d}')
+    return (prefix + '_X.npy', prefix + '_y.npy', prefix + '_keys.npy')
+
+# Build and cache the features of every week of one season, as of each week, or reuse the cached ones
+# `history` holds the season and the two before it; the cache is keyed by a hash of exactly that data
+def cache_season(history, season, cacheDir):
+    start = time.perf_counter()
+    seasonDir = os.path.join(cacheDir, f'{season}-{training.data_hash(history, [season])}')
+    weeks = sorted(history.loc[history['season'] == season, 'week'].unique())
+    if all(os.path.exists(path) for week in weeks for path in week_paths(seasonDir, week)):
+        return (season, seasonDir, weeks, True, time.perf_counter() - start)
+    frame = training.training_frame(history, season)
+    numeric = frame[predictions.featureColumns].to_numpy(dtype='float32', na_value=np.nan)
+    stats = frame[predictions.labelColumns].to_numpy(dtype='float64', na_value=np.nan)
+    keys = frame[keyColumns].astype(str).to_numpy().astype('U')
+    os.makedirs(seasonDir, exist_ok=True)
+    for (week, rows) in frame.groupby('week').indices.items():
+        for (path, values) in zip(week_paths(seasonDir, week), [numeric[rows], stats[rows], keys[rows]]):
+            # Written under a temporary name first, so an interrupted build is never mistaken for a cached one
+            np.save(path + '.tmp.npy', values)
+            os.replace(path + '.tmp.npy', path)
+    return (season, seasonDir, weeks, False, time.perf_counter() - start)
+
+# Predict and score one cached week; returns one row per player with predicted and actual points, and the step timings
+def backtest_week(seasonDir, season, week, modelDir, scoring):
+    start = time.perf_counter()
+    (xPath, yPath, keysPath) = week_paths(seasonDir, week)
+    X = np.load(xPath)
+    actual = np.load(yPath)
+    keys = pd.DataFrame(np.load(keysPath), columns=keyColumns)
+    frame = pd.concat([pd.DataFrame(X, columns=predictions.featureColumns), keys], axis=1)
+    source = features.FeatureSource(frame, predictions.featureColumns, ['pos', 'posRank'])
+    loadSeconds = time.perf_counter() - start
+    # Rows a model can use, as in predictAll; every position's stats predicted with the model for its batch size
+    start = time.perf_counter()
+    usable = np.isfinite(X).all(axis=1) & np.isfinite(actual).all(axis=1)
+    pos = keys['pos'].to_numpy()
+    posRank = keys['posRank'].to_numpy()
+    registry = predictions.get_registry(modelDir)
+    predicted = np.full(actual.shape, np.nan)
+    for p in predictions.positions:
+        rows = np.flatnonzero(usable & (pos == p) & np.isin(posRank, [f'{p}1', f'{p}2', f'{p}3']))
+        if len(rows) == 0:
+            continue
+        model = predictions.batch_model(registry, p, len(rows))
+        predicted[rows] = model.predict(registry.get_schema(p, model).build(source, rows))
+    predictSeconds = time.perf_counter() - start
+    # Score predicted and actual stats with the league's scoring
+    start = time.perf_counter()
+    rows = np.flatnonzero(~np.isnan(predicted[:, 0]))
+    scored = keys.iloc[rows].reset_index(drop=True)
+    scored.insert(0, 'week', week)
+    scored.insert(0, 'season', season)
+    scored['predicted'] = analysis.calculate_scoresFF(pd.DataFrame(predicted[rows], columns=predictions.labelColumns).assign(pos=scored['pos']), scoring)['scoreTotal']
+    scored['actual'] = analysis.calculate_scoresFF(pd.DataFrame(actual[rows], columns=predictions.labelColumns).assign(pos=scored['pos']), scoring)['scoreTotal']
+    scoreSeconds = time.perf_counter() - start
+    timing = {'season': season, 'week': week, 'rows': len(rows), 'loadSeconds': loadSeconds, 'predictSeconds': predictSeconds, 'scoreSeconds': scoreSeconds}
+    return (scored, timing)
+
+# Error of predicted against actual points for each group: count, mean absolute and root mean squared error, and bias
+def error_metrics(results, groups):
+    error = results['predicted'] - results['actual']
+    grouped = results.assign(error=error, absError=error.abs(), squaredError=error ** 2).groupby(groups, observed=True)
+    metrics = grouped.agg(
+        players=('error', 'size'),
+        predicted=('predicted', 'mean'),
+        actual=('actual', 'mean'),
+        mae=('absError', 'mean'),
+        rmse=('squaredError', 'mean'),
+        bias=('error', 'mean'),
+    )
+    metrics['rmse'] = np.sqrt(metrics['rmse'])
+    return metrics.reset_index()
+
+# Backtest a model directory over past seasons
+# Seasons' features are built (or read from the cache) in a process pool, then every week is predicted and scored in it
+# Returns (results, byWeek, byPosition, timing): per-player points, errors by season/week/position and by position, and
+# per-week step timings with the phases' wall times in timing.attrs
+def run_backtest(history, seasons, modelDir=predictions.defaultModelDir, scoringDict=league.defaultScoringDict,
+                 weeks=None, cacheDir=defaultCacheDir, workers=None):
+    missing = [colName for colName in ['season', 'week', 'team', 'opponent', 'player', 'age', 'pos', 'posRank'] + predictions.labelColumns if colName not in history.columns]
+    if missing:
+        raise KeyError(f'History is missing columns: {missing}')
+    # Check the models and compile the scoring once, before any work is handed out
+    predictions.get_registry(modelDir).require()
+    scoring = analysis.compile_scoring(scoringDict)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        start = time.perf_counter()
+        seasonJobs = [
+            executor.submit(cache_season, history.loc[history['season'].between(season - 2, season)], season, cacheDir)
+            for season in seasons
+        ]
+        cached = [job.result() for job in seasonJobs]
+        featureSeconds = time.perf_counter() - start
+        start = time.perf_counter()
+        weekJobs = [
+            executor.submit(backtest_week, seasonDir, season, week, modelDir, scoring)
+            for (season, seasonDir, seasonWeeks, _, _) in cached
+            for week in seasonWeeks if weeks is None or week in weeks
+        ]
+        weekResults = [job.result() for job in weekJobs]
+        predictSeconds = time.perf_counter() - start
+    # Summary tables
+    results = pd.concat([scored for (scored, _) in weekResults], ignore_index=True)
+    timing = pd.DataFrame([weekTiming for (_, weekTiming) in weekResults])
+    timing.attrs = {
+        'featureSeconds': featureSeconds,
+        'predictSeconds': predictSeconds,
+        'seasonsCached': sum(wasCached for (_, _, _, wasCached, _) in cached),
+        'seasonBuildSeconds': {season: seconds for (season, _, _, _, seconds) in cached},
+    }
+    byWeek = error_metrics(results, ['season', 'week', 'pos'])
+    byPosition = error_metrics(results, ['pos'])
+    return (results, byWeek, byPosition, timing)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backtest the position models against past seasons')
+    parser.add_argument('history', help='CSV with one row per player-week, as for ffpackage.training')
+    parser.add_argument('--seasons', type=int, nargs='+', required=True)
+    parser.add_argument('--weeks', type=int, nargs='+', default=None)
+    parser.add_argument('--model-dir', default=predictions.defaultModelDir)
+    parser.add_argument('--cache-dir', default=defaultCacheDir)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default=None, help='Directory to write results.csv, byWeek.csv, byPosition.csv and timing.csv to')
+    args = parser.parse_args()
+
+    history = pd.read_csv(args.history, index_col=0)
+    (results, byWeek, byPosition, timing) = run_backtest(history, args.seasons, args.model_dir, weeks=args.weeks, cacheDir=args.cache_dir, workers=args.workers)
+    print(byPosition.round(2).to_string(index=False))
+    print(f"\n{len(timing)} weeks, {len(results):,} player-weeks")
+    print(f"features {timing.attrs['featureSeconds']:.1f}s ({timing.attrs['seasonsCached']} of {len(args.seasons)} seasons cached), predict and score {timing.attrs['predictSeconds']:.1f}s")
+    print(f"per week: load {timing['loadSeconds'].mean() * 1000:.0f} ms, predict {timing['predictSeconds'].mean() * 1000:.0f} ms, score {timing['scoreSeconds'].mean() * 1000:.0f} ms")
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        for (name, table) in [('results', results), ('byWeek', byWeek), ('byPosition', byPosition), ('timing', timing)]:
+            table.to_csv(os.path.join(args.out, f'{name}.csv'), index=False)
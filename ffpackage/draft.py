@@ -0,0 +1,163 @@
+# Import dependencies
+import threading
+import numpy as np
+import pandas as pd
+
+
+# Binary indexed tree over 0/1 availability flags: flip a flag, count, or find the k-th available slot in O(log n)
+class FenwickTree:
+    def __init__(self, n):
+        self.n = n
+        # Every slot starts available; a node covers (i - lowbit(i), i], so its count is its lowbit
+        index = np.arange(n + 1)
+        self.tree = (index & -index).tolist()
+        # Highest power of two not above n, where the k-th search starts
+        self.top = 1 << (n.bit_length() - 1) if n else 0
+
+    # Add delta (+1 available again, -1 taken) at 0-based slot i
+    def add(self, i, delta):
+        i += 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    # Number of available slots among the first i
+    def prefix(self, i):
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    # 0-based slot of the k-th available slot (k starts at 1), or -1 if fewer than k are available
+    def kth(self, k):
+        position = 0
+        step = self.top
+        while step:
+            if position + step <= self.n and self.tree[position + step] < k:
+                position += step
+                k -= self.tree[position]
+            step >>= 1
+        return position if position < self.n else -1
+
+
+# Draft board: the available players of each position, best first, with their replacement level kept up to date
+# Each position's players are sorted once; a pick only flips the player's flag in that position's FenwickTree,
+# so picks, replacement levels and the best available players are all O(log n) instead of re-ranking the board
+#   players: one row per player with id_mfl, pos and the `how` value (e.g. season_values)
+#   replacementRanks: {pos: n}, the n-th best player in the full pool at a position is its replacement level; every pick at
+#   the position takes one player off the board above it, so it sits that many places higher among the available players
+#   posMax: {pos: n}, positions a franchise has filled are left out of its recommendations
+class DraftBoard:
+    def __init__(self, players, how, replacementRanks, posMax=None):
+        self.replacementRanks = replacementRanks
+        self.posMax = posMax or {}
+        self.values = {}
+        self.ids = {}
+        self.trees = {}
+        # Where each player sits: (position, slot in that position's sorted order)
+        self.slots = {}
+        players = players.loc[players[how].notna()]
+        for (pos, group) in players.groupby('pos', observed=True):
+            group = group.sort_values([how, 'id_mfl'], ascending=[False, True], kind='stable')
+            self.values[pos] = group[how].to_numpy(dtype='float64')
+            self.ids[pos] = group['id_mfl'].to_numpy()
+            self.trees[pos] = FenwickTree(len(group))
+            for (slot, id_mfl) in enumerate(self.ids[pos]):
+                self.slots[id_mfl] = (pos, slot)
+        # Picks so far as {id_mfl: franchiseID}, each franchise's count per position, and the count drafted per position
+        self.picks = {}
+        self.counts = {}
+        self.drafted = {pos: 0 for pos in self.trees}
+        # Reentrant, so sync can undo and re-pick under one hold of the lock
+        self.lock = threading.RLock()
+
+    # Mark a player as drafted; players not on the board (no prediction) are only recorded
+    def pick(self, id_mfl, franchiseID=None):
+        with self.lock:
+            if id_mfl in self.picks:
+                return
+            self.picks[id_mfl] = franchiseID
+            if id_mfl not in self.slots:
+                return
+            (pos, slot) = self.slots[id_mfl]
+            self.trees[pos].add(slot, -1)
+            self.drafted[pos] += 1
+            counts = self.counts.setdefault(franchiseID, {})
+            counts[pos] = counts.get(pos, 0) + 1
+
+    # Put a drafted player back on the board, e.g. after a manual entry mistake
+    def undo(self, id_mfl):
+        with self.lock:
+            if id_mfl not in self.picks:
+                return
+            franchiseID = self.picks.pop(id_mfl)
+            if id_mfl not in self.slots:
+                return
+            (pos, slot) = self.slots[id_mfl]
+            self.trees[pos].add(slot, 1)
+            self.drafted[pos] -= 1
+            self.counts[franchiseID][pos] -= 1
+
+    # Apply every pick made since the last sync from MFL's draftResults (mfl.get_draftResults) or merge_picks
+    # A player already picked for another franchise is moved to the one listed, so each franchise's counts stay right
+    def sync(self, draftResults):
+        made = draftResults.loc[draftResults['id_mfl'].fillna('') != '']
+        with self.lock:
+            for row in made.itertuples(index=False):
+                if row.id_mfl in self.picks and self.picks[row.id_mfl] != row.franchiseID:
+                    self.undo(row.id_mfl)
+                if row.id_mfl not in self.picks:
+                    self.pick(row.id_mfl, row.franchiseID)
+
+    # Value of the replacement-level player still available at a position
+    def replacement(self, pos):
+        tree = self.trees[pos]
+        # The replacement rank among the available players moves up with every pick at the position;
+        # with fewer players left than that, the last one available sets the level
+        rank = max(1, self.replacementRanks.get(pos, 1) - self.drafted[pos])
+        rank = min(rank, tree.prefix(tree.n))
+        if rank == 0:
+            return np.nan
+        return self.values[pos][tree.kth(rank)]
+
+    # Best available players by value over replacement, optionally for the franchise on the clock
+    # Only each position's top `topK` available players can make the list, so each position costs topK O(log n) lookups
+    def recommend(self, franchiseID=None, topK=10):
+        rows = []
+        with self.lock:
+            counts = dict(self.counts.get(franchiseID, {}))
+            for (pos, tree) in self.trees.items():
+                # Skip positions the franchise has already filled
+                if franchiseID is not None and counts.get(pos, 0) >= self.posMax.get(pos, np.inf):
+                    continue
+                replacement = self.replacement(pos)
+                for k in range(1, topK + 1):
+                    slot = tree.kth(k)
+                    if slot == -1:
+                        break
+                    rows.append((self.ids[pos][slot], pos, self.values[pos][slot], self.values[pos][slot] - replacement))
+        board = pd.DataFrame(rows, columns=['id_mfl', 'pos', 'value', 'vorp'])
+        board = board.sort_values(['vorp', 'value', 'id_mfl'], ascending=[False, False, True], kind='stable').head(topK)
+        return board.reset_index(drop=True)
+
+# Picks to sync a board with: MFL's draftResults, then the manually entered picks of players MFL does not list as drafted yet
+# Once MFL reports a player, its pick replaces the manual one
+def merge_picks(draftResults, manualPicks):
+    made = draftResults.loc[draftResults['id_mfl'].fillna('') != '', ['id_mfl', 'franchiseID']]
+    manual = manualPicks.loc[~manualPicks['id_mfl'].isin(made['id_mfl']), ['id_mfl', 'franchiseID']]
+    return pd.concat([made, manual], ignore_index=True)
+
+# Season value of each player: the sum of his weekly `how` predictions
+def season_values(predictions, how):
+    values = predictions.groupby(['id_mfl', 'pos'], observed=True, as_index=False)[how].sum()
+    return values
+
+# Replacement rank at each position: every franchise's required starters there, so the first player left over sets the level
+def replacement_ranks(nFranchises, posMin):
+    return {pos: nFranchises * count + 1 for (pos, count) in posMin.items()}
+
+# The franchise on the clock: the owner of the first pick without a player, or None once the draft is over
+def on_the_clock(draftResults):
+    openPicks = draftResults.loc[draftResults['id_mfl'].fillna('') == '', 'franchiseID']
+    return openPicks.iloc[0] if len(openPicks) else None
@@ -0,0 +1,66 @@
+# Import dependencies
+import json
+import numpy as np
+import pandas as pd
+
+
+# The columns every model input is built from, converted once per frame and shared by every model's schema
+# Numeric columns go into one float32 matrix; categorical columns are factorized into integer codes
+class FeatureSource:
+    def __init__(self, df, numericColumns, categoricalColumns):
+        missing = [colName for colName in list(numericColumns) + list(categoricalColumns) if colName not in df.columns]
+        if missing:
+            raise KeyError(f'Frame is missing feature columns: {missing}')
+        self.numeric = df[list(numericColumns)].to_numpy(dtype='float32', na_value=np.nan)
+        self.numericIndex = {colName: j for (j, colName) in enumerate(numericColumns)}
+        # {column: (codes, levels)}, a code of -1 for missing values
+        self.categories = {colName: pd.factorize(df[colName]) for colName in categoricalColumns}
+
+
+# A model's input layout: every column at a fixed position, numeric features and one-hot dummies alike
+# Dummies are named {column}_{level}; levels the data has but the schema does not are left at 0, so the layout never
+# depends on which levels a frame happens to contain
+#   columns: the model's input columns in order; categories: {column: [levels]} for the one-hot columns
+class FeatureSchema:
+    def __init__(self, columns, categories):
+        self.columns = list(columns)
+        self.categories = {colName: list(levels) for (colName, levels) in categories.items()}
+        dummies = {f'{colName}_{level}': (colName, level) for (colName, levels) in self.categories.items() for level in levels}
+        missing = [dummy for dummy in dummies if dummy not in self.columns]
+        if missing:
+            raise ValueError(f'Schema dummies are not among its columns: {missing}')
+        # Matrix position of each dummy, and of each numeric column
+        self.dummySlots = {dummies[colName]: j for (j, colName) in enumerate(self.columns) if colName in dummies}
+        self.numeric = [colName for colName in self.columns if colName not in dummies]
+        self.numericSlots = np.array([j for (j, colName) in enumerate(self.columns) if colName not in dummies], dtype='intp')
+
+    # Build the C-ordered float32 model input for some rows of a FeatureSource (all rows by default)
+    # Numeric columns are copied in one gather; each categorical column's dummies are set straight from its codes
+    def build(self, source, rows=None):
+        if rows is None:
+            rows = np.arange(len(source.numeric))
+        missing = [colName for colName in self.numeric if colName not in source.numericIndex]
+        missing += [colName for colName in self.categories if colName not in source.categories]
+        if missing:
+            raise KeyError(f'Feature source is missing schema columns: {missing}')
+        X = np.zeros((len(rows), len(self.columns)), dtype='float32')
+        X[:, self.numericSlots] = source.numeric[np.ix_(rows, [source.numericIndex[colName] for colName in self.numeric])]
+        for (colName, levels) in self.categories.items():
+            (codes, sourceLevels) = source.categories[colName]
+            # Matrix position for each of the source's levels, -1 for levels the schema does not have
+            slotByCode = np.array([self.dummySlots.get((colName, level), -1) for level in sourceLevels] + [-1], dtype='intp')
+            slots = slotByCode[codes[rows]]
+            hasSlot = np.flatnonzero(slots >= 0)
+            X[hasSlot, slots[hasSlot]] = 1
+        return X
+
+    # Persist as JSON next to the model it describes
+    def save(self, path):
+        with open(path, 'w') as schemaFile:
+            json.dump({'columns': self.columns, 'categories': self.categories}, schemaFile, indent=1)
+
+# Load a schema saved with FeatureSchema.save
+def load_schema(path):
+    with open(path) as schemaFile:
+        schema = json.load(schemaFile)
+    return FeatureSchema(schema['columns'], schema['categories'])
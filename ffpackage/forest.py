@@ -0,0 +1,103 @@
+# Import dependencies
+import numpy as np
+from joblib import dump, load
+
+
+# Rows evaluated per block, to bound the (rows x trees x outputs) leaf value gather
+blockRows = 2048
+# Levels descended between dropping the (row, tree) pairs that have reached a leaf
+compactEvery = 3
+
+
+# A fitted random forest regressor flattened into contiguous arrays, evaluated for a whole batch at once
+# Every tree's nodes are stacked into one set of arrays. All (row, tree) pairs descend together one level per vectorized
+# step, and pairs that have reached a leaf are dropped every few levels, so the work follows the total path length
+# rather than rows x trees x the deepest tree
+#   feature, threshold: one entry per split node; children: (nodes, 2) left and right child, leaves point to themselves
+#   values: (nodes, outputs) leaf predictions; roots: each tree's root node
+class FlatForest:
+    def __init__(self, feature, threshold, children, values, roots, nFeatures, featureNames=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.values = values
+        self.roots = roots
+        self.isLeaf = children[:, 0] == np.arange(len(children))
+        # The attributes the model checks and column layout read from a fitted sklearn model
+        self.n_features_in_ = int(nFeatures)
+        self.n_outputs_ = values.shape[1]
+        if featureNames is not None:
+            self.feature_names_in_ = np.asarray(featureNames, dtype=object)
+
+    # Leaf node reached in every tree by every row of a float32 block, as a (rows, trees) array
+    def leaves(self, block):
+        nTrees = len(self.roots)
+        leaves = np.empty(len(block) * nTrees, dtype='intp')
+        # The pairs still descending: their position in the (rows, trees) output, current node, and row's offset in the block
+        slots = np.arange(len(block) * nTrees)
+        nodes = np.tile(self.roots, len(block))
+        offsets = np.repeat(np.arange(len(block)) * block.shape[1], nTrees)
+        flatBlock = block.ravel()
+        children = self.children.ravel()
+        level = 0
+        while len(nodes):
+            # Right child where the row's feature value is above the split, left otherwise
+            goRight = flatBlock[offsets + self.feature[nodes]] > self.threshold[nodes]
+            nodes = children[2 * nodes + goRight]
+            level += 1
+            if level % compactEvery == 0 or len(nodes) < 64:
+                done = self.isLeaf[nodes]
+                leaves[slots[done]] = nodes[done]
+                (slots, nodes, offsets) = (slots[~done], nodes[~done], offsets[~done])
+        return leaves.reshape(len(block), nTrees)
+
+    # Predict every row of X, shape (rows, n_features_in_), as a (rows, n_outputs_) array
+    # Inputs are compared as float32, as sklearn's trees do; rows must not have missing values
+    def predict(self, X):
+        X = np.ascontiguousarray(X, dtype='float32')
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f'Expected {self.n_features_in_} features, got {X.shape[-1]}')
+        y_pred = np.empty((len(X), self.n_outputs_), dtype='float64')
+        for start in range(0, len(X), blockRows):
+            leaves = self.leaves(X[start:start + blockRows])
+            # Average the leaves' values over the trees, accumulating in float64 as sklearn does
+            y_pred[start:start + blockRows] = self.values[leaves].sum(axis=1, dtype='float64') / len(self.roots)
+        return y_pred
+
+# Flatten a fitted RandomForestRegressor (or any forest of sklearn regression trees)
+def flatten_forest(model):
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    sizes = np.array([tree.node_count for tree in trees])
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    feature = np.concatenate([tree.feature for tree in trees])
+    threshold = np.concatenate([tree.threshold for tree in trees])
+    children = np.concatenate([
+        np.stack([tree.children_left, tree.children_right], axis=1) + root for (tree, root) in zip(trees, roots)
+    ])
+    values = np.concatenate([tree.value[:, :, 0] for tree in trees])
+    # Leaves loop back to themselves and test feature 0, so a row that reaches one stays there
+    leaf = np.concatenate([tree.children_left == -1 for tree in trees])
+    children[leaf] = np.flatnonzero(leaf)[:, None]
+    feature[leaf] = 0
+    # sklearn compares float32 inputs against float64 thresholds; the largest float32 at or below each threshold
+    # sends every float32 input the same way
+    threshold32 = threshold.astype('float32')
+    above = threshold32.astype('float64') > threshold
+    threshold32[above] = np.nextafter(threshold32[above], np.float32(-np.inf))
+    return FlatForest(
+        feature.astype('intp'), threshold32, children.astype('intp'), values.astype('float32'), roots.astype('intp'),
+        model.n_features_in_, getattr(model, 'feature_names_in_', None)
+    )
+
+# Save a flattened forest uncompressed, so load_forest can memory-map its arrays
+def save_forest(forest, path):
+    dump({
+        'feature': forest.feature, 'threshold': forest.threshold, 'children': forest.children,
+        'values': forest.values, 'roots': forest.roots, 'nFeatures': forest.n_features_in_,
+        'featureNames': getattr(forest, 'feature_names_in_', None),
+    }, path)
+
+# Load a flattened forest; with mmap_mode='r' its arrays are shared between the processes that load it
+def load_forest(path, mmap_mode='r'):
+    arrays = load(path, mmap_mode=mmap_mode)
+    return FlatForest(**arrays)
@@ -0,0 +1,242 @@
+# Import dependencies
+import time
+import threading
+import numpy as np
+# Internal imports
+from ffpackage import mfl, analysis
+
+
+# Scoring rules used when a league's rules cannot be read from MFL
+defaultScoringDict = {
+    'passA': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
+    'passC': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
+    'passY': {"multiplier":0.04, "bins":[-np.inf, np.inf], "labels":[0]},
+    'passT': {"multiplier":4, "bins":[-np.inf, np.inf], "labels":[0]},
+    'passI': {"multiplier":-2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'pass2': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'rushA': {"multiplier":0.1, "bins":[-np.inf, np.inf], "labels":[0]},
+    'rushY': {"multiplier":0.1, "bins":[-np.inf, np.inf], "labels":[0]},
+    'rushT': {"multiplier":6, "bins":[-np.inf, np.inf], "labels":[0]},
+    'rush2': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'recC': {"multiplier":0.25, "bins":[-np.inf, np.inf], "labels":[0]},
+    'recY': {"multiplier":0.1, "bins":[-np.inf, np.inf], "labels":[0]},
+    'recT': {"multiplier":6, "bins":[-np.inf, np.inf], "labels":[0]},
+    'rec2': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'fum': {"multiplier":-2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'XPA': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
+    'XPM': {"multiplier":3, "bins":[-np.inf, np.inf], "labels":[0]},
+    'FGA': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
+    'FGM': {"multiplier":3, "bins":[-np.inf, np.inf], "labels":[0]},
+    'FG50': {"multiplier":5, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defSack': {"multiplier":1, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defI': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defSaf': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defFum': {"multiplier":2, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defBlk': {"multiplier":1.5, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defT': {"multiplier":6, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defPtsAgainst': {"multiplier":0, "bins":[-5,0,6,13,17,21,27,34,45,59,99], "labels":[10,8,7,5,3,2,0,-1,-3,-5]},
+    'defPassYAgainst': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defRushYAgainst': {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]},
+    'defYdsAgainst': {"multiplier":0, "bins":[0,274,324,375,425,999], "labels":[5,2,0,-2,-5]}
+}
+# Lineup requirements used when a league's starters cannot be read from MFL
+defaultPosMax = {"QB":2, "RB":5, "WR":6, "TE":5, "PK":2, "DF":2}
+defaultPosMin = {"QB":1, "RB":2, "WR":2, "TE":2, "PK":2, "DF":2}
+defaultStartersMax = 15
+
+# MFL scoring event codes for the categories the predictions cover
+# Offensive events are read from positionRules groups without "Def", defensive events from the group with "Def"
+offenseEvents = {
+    'PA':'passA', 'PC':'passC', 'PY':'passY', '#P':'passT', 'IN':'passI', 'P2':'pass2',
+    'RA':'rushA', 'RY':'rushY', '#R':'rushT', 'R2':'rush2',
+    'CC':'recC', 'CY':'recY', '#C':'recT', 'C2':'rec2', 'FL':'fum',
+    'EA':'XPA', 'EP':'XPM', 'FA':'FGA', 'FG':'FGM',
+}
+defenseEvents = {
+    'SK':'defSack', 'IC':'defI', 'SF':'defSaf', 'FC':'defFum', 'BLF':'defBlk', '#D':'defT',
+    'PA':'defPtsAgainst', 'PYA':'defPassYAgainst', 'RYA':'defRushYAgainst', 'YA':'defYdsAgainst',
+}
+# Events whose flat points are awarded per occurrence (the range is e.g. a TD's length); other events' flat points are threshold bonuses
+perOccurrence = {'#P', 'P2', 'IN', '#R', 'R2', '#C', 'C2', 'FL', 'EA', 'EP', 'FA', 'FG', 'SK', 'IC', 'SF', 'FC', 'BLF', '#D'}
+# Lineup positions the app predicts, keyed by their MFL names
+lineupPositions = {'QB':'QB', 'RB':'RB', 'WR':'WR', 'TE':'TE', 'PK':'PK', 'Def':'DF'}
+
+# How long a league's profile is reused before its rules are read again
+PROFILE_TTL = 6 * 3600
+# How long a profile that fell back to the defaults is reused before MFL is tried again
+FALLBACK_TTL = 60
+
+
+# Starting lineup requirements for a league
+class LineupRules:
+    def __init__(self, posMin, posMax, startersMax):
+        self.posMin = posMin
+        self.posMax = posMax
+        self.startersMax = startersMax
+
+# A league's scoring rules, compiled once, and its lineup requirements
+# errors: {'scoring' or 'lineup': message} for the parts that fell back to the defaults
+# unsupported: the league's scoring rules that are scored at another tier's points (see build_scoringDict)
+class ScoringProfile:
+    def __init__(self, scoringDict, lineup, errors=None, unsupported=None):
+        self.scoringDict = scoringDict
+        self.scoring = analysis.compile_scoring(scoringDict)
+        self.lineup = lineup
+        self.errors = errors or {}
+        self.unsupported = unsupported or []
+
+# Parse an MFL points value into (per-unit multiplier, flat points); exactly one of them is set
+def _parse_points(points):
+    points = (points or "").strip()
+    if points.startswith("*"):
+        return (float(points[1:]), None)
+    if "/" in points:
+        (numerator, denominator) = points.split("/", 1)
+        return (float(numerator) / float(denominator), None)
+    return (None, float(points))
+
+# Parse an MFL range ("0-99", "-5-0", "7") into (low, high)
+def _parse_range(rangeText):
+    rangeText = (rangeText or "").strip()
+    if not rangeText:
+        return (-np.inf, np.inf)
+    # The separator is the first "-" that is not a leading minus sign
+    split = rangeText.find("-", 1)
+    if split == -1:
+        return (float(rangeText), float(rangeText))
+    return (float(rangeText[:split]), float(rangeText[split + 1:]))
+
+# Turn flat points for integer ranges into pd.cut style bins and labels; values outside every range score 0
+def _bins_from_ranges(ranges):
+    ranges = sorted(ranges)
+    bins = [-np.inf]
+    labels = []
+    for (low, high, points) in ranges:
+        if low - 1 > bins[-1]:
+            bins.append(low - 1)
+            labels.append(0)
+        bins.append(high)
+        labels.append(points)
+    bins.append(np.inf)
+    labels.append(0)
+    return (bins, labels)
+
+# Combine the parsed points of every positionRules group that scores a category at one position into a scoringDict rule
+# MFL awards the points of each group listing the position, so multipliers add up and so do the bin points of overlapping ranges
+def _position_rule(groups):
+    rule = {"multiplier": sum(group["multiplier"] or 0 for group in groups), "bins": [-np.inf, np.inf], "labels": [0]}
+    binned = [_bins_from_ranges(group["ranges"]) for group in groups if group["ranges"]]
+    if len(binned) == 1:
+        (rule["bins"], rule["labels"]) = binned[0]
+    elif binned:
+        # Every group's edges, each interval earning the sum of the points it gets from each group
+        edges = sorted(set(edge for (bins, _) in binned for edge in bins))
+        rule["bins"] = edges
+        rule["labels"] = [
+            sum(labels[min(max(np.searchsorted(bins, high, side='left') - 1, 0), len(labels) - 1)] for (bins, labels) in binned)
+            for high in edges[1:]
+        ]
+    return rule
+
+# Build a scoringDict from MFL's rules export
+# A category's rule is the one most positions share; positions scored differently get their own rule under its "positions"
+# Returns (scoringDict, unsupported). A stat has one multiplier per group, so when an event's tiers give different points
+# per unit or occurrence (e.g. FG 0-39 and 40-49 yards) only the first tier is used and the others are listed in unsupported;
+# field goals of 50+ yards are the exception, scored through FG50
+def build_scoringDict(rules):
+    scoringDict = {colName: {"multiplier":0, "bins":[-np.inf, np.inf], "labels":[0]} for colName in defaultScoringDict}
+    # {colName: {positionRules group: {"multiplier": points per unit or occurrence, "ranges": [(low, high, flat points)]}}}
+    groups = {}
+    unsupported = []
+    for row in rules.itertuples(index=False):
+        positions = (row.positions or "").split("|")
+        events = defenseEvents if "Def" in positions else offenseEvents
+        colName = events.get((row.event or "").strip())
+        if colName is None:
+            continue
+        (low, high) = _parse_range(row.range)
+        (multiplier, flat) = _parse_points(row.points)
+        # Field goals of 50+ yards earn their extra points through the FG50 category
+        if colName == 'FGM' and low >= 50:
+            colName = 'FG50'
+        group = groups.setdefault(colName, {}).setdefault(row.positions or "", {"multiplier": None, "ranges": []})
+        if multiplier is None and row.event.strip() in perOccurrence:
+            multiplier = flat
+        if multiplier is not None:
+            if group["multiplier"] is None:
+                group["multiplier"] = multiplier
+            elif multiplier != group["multiplier"]:
+                unsupported.append(f"{row.event.strip()} {row.range} ({row.positions}): {row.points} points, scored as {group['multiplier']:g}")
+        else:
+            group["ranges"].append((low, high, flat))
+    # Each category's rule at each position its groups list
+    positionRules = {}
+    for (colName, categoryGroups) in groups.items():
+        for pos in lineupPositions:
+            # A group without positions applies to all of them
+            listing = [group for (groupKey, group) in categoryGroups.items() if pos in groupKey.split("|") or not groupKey]
+            if listing:
+                positionRules.setdefault(colName, {})[lineupPositions[pos]] = _position_rule(listing)
+    # Field goals of 50+ yards count as made field goals too, so FG50 only carries the difference
+    for (pos, rule) in positionRules.get('FG50', {}).items():
+        rule["multiplier"] = rule["multiplier"] - positionRules.get('FGM', {}).get(pos, {"multiplier": 0})["multiplier"]
+    for (colName, byPosition) in positionRules.items():
+        rulesList = list(byPosition.values())
+        base = max(rulesList, key=rulesList.count)
+        overrides = {pos: rule for (pos, rule) in byPosition.items() if rule != base}
+        scoringDict[colName] = dict(base, positions=overrides) if overrides else base
+    return (scoringDict, unsupported)
+
+# Build LineupRules from MFL's starters list
+def build_lineupRules(starters):
+    posMin = {pos: 0 for pos in lineupPositions.values()}
+    posMax = {pos: 0 for pos in lineupPositions.values()}
+    for row in starters.itertuples(index=False):
+        pos = lineupPositions.get(row.pos)
+        if pos is None:
+            continue
+        (low, high) = _parse_range(row.limit)
+        posMin[pos] = int(low)
+        posMax[pos] = int(high)
+    startersMax = int(starters['startersMax'].iloc[0])
+    return LineupRules(posMin, posMax, startersMax)
+
+# Build a league's ScoringProfile from MFL, falling back to the defaults for anything that cannot be read
+# What could not be read is recorded in the profile's errors, so routes can say the defaults are in use
+def build_profile(user_league):
+    errors = {}
+    unsupported = []
+    try:
+        rules = mfl.get_leagueRules(user_league)
+        (scoringDict, unsupported) = build_scoringDict(rules)
+        # Rules we cannot map at all are treated as unreadable
+        if not any(rule["multiplier"] or any(rule["labels"]) or rule.get("positions") for rule in scoringDict.values()):
+            (scoringDict, unsupported) = (defaultScoringDict, [])
+    except Exception as error:
+        errors['scoring'] = str(error)
+        scoringDict = defaultScoringDict
+    try:
+        lineup = build_lineupRules(mfl.get_starters(user_league))
+    except Exception as error:
+        errors['lineup'] = str(error)
+        lineup = LineupRules(defaultPosMin, defaultPosMax, defaultStartersMax)
+    return ScoringProfile(scoringDict, lineup, errors, unsupported)
+
+# Compiled profiles by league, with the time each one expires
+_profiles = {}
+_profilesLock = threading.Lock()
+
+# Return a league's ScoringProfile, compiling it at most once per PROFILE_TTL
+# Profiles built from defaults after an MFL error are only kept for FALLBACK_TTL, so the league's rules are read again soon
+def get_profile(user_league):
+    now = time.monotonic()
+    cached = _profiles.get(user_league)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    profile = build_profile(user_league)
+    with _profilesLock:
+        # Drop expired profiles so leagues that stop visiting do not stay in memory
+        for expired in [key for (key, (expiry, _)) in _profiles.items() if expiry <= now]:
+            del _profiles[expired]
+        _profiles[user_league] = (now + (FALLBACK_TTL if profile.errors else PROFILE_TTL), profile)
+    return profile
@@ -1,27 +1,185 @@
 # Import dependencies
-from bs4 import BeautifulSoup
+import os
+import time
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
+# Internal imports
+from ffpackage import xmlparse
+
+
+# Seconds that a cached response stays fresh, by MFL export TYPE
+# League-static data changes a few times a season, rosters change with transactions, live scores change every play
+cacheTTL = {
+    "league": 6 * 3600,
+    "rules": 6 * 3600,
+    "schedule": 6 * 3600,
+    "players": 6 * 3600,
+    "playerProfile": 24 * 3600,
+    "playerRanks": 3600,
+    "adp": 3600,
+    "projectedScores": 900,
+    "rosters": 300,
+    "freeAgents": 300,
+    "liveScoring": 15,
+    # Picks come in every few seconds during a live draft
+    "draftResults": 5,
+}
+
+# Size-bounded LRU cache of MFL responses with per-endpoint time-to-live
+# Stale entries are kept so they can be revalidated with ETag/If-Modified-Since instead of downloaded again
+# Any object with the same lookup/store/revalidated methods can be plugged into MFLClient instead
+class ResponseCache:
+    def __init__(self, maxEntries=256, ttl=cacheTTL, defaultTTL=60):
+        self.maxEntries = maxEntries
+        self.ttl = ttl
+        self.defaultTTL = defaultTTL
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Find the time-to-live for a url from its TYPE parameter
+    def ttl_for(self, urlString):
+        exportType = parse_qs(urlparse(urlString).query).get("TYPE", [""])[0]
+        return self.ttl.get(exportType, self.defaultTTL)
+
+    # Return the cached entry for a url (fresh or stale), or None
+    def lookup(self, urlString):
+        with self._lock:
+            entry = self._entries.get(urlString)
+            if entry is not None:
+                # Mark as most recently used
+                self._entries.move_to_end(urlString)
+            return entry
+
+    # Save a response along with its validators
+    def store(self, urlString, response):
+        ttl = self.ttl_for(urlString)
+        if ttl <= 0:
+            return
+        entry = {
+            "response": response,
+            "expires": time.monotonic() + ttl,
+            "etag": response.headers.get("ETag"),
+            "lastModified": response.headers.get("Last-Modified"),
+        }
+        with self._lock:
+            self._entries[urlString] = entry
+            self._entries.move_to_end(urlString)
+            # Evict least recently used entries once over capacity
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+
+    # The server confirmed the cached copy is unchanged (HTTP 304); make it fresh again
+    def revalidated(self, urlString):
+        with self._lock:
+            entry = self._entries.get(urlString)
+            if entry is not None:
+                entry["expires"] = time.monotonic() + self.ttl_for(urlString)
+
+    # Remove every entry, or every entry whose url contains the given text (e.g. a league id)
+    def clear(self, match=None):
+        with self._lock:
+            if match is None:
+                self._entries.clear()
+            else:
+                for urlString in [key for key in self._entries if match in key]:
+                    del self._entries[urlString]
+
+    # Replace the lock in forked children, in case the parent held it while forking
+    def reset(self):
+        self._lock = threading.Lock()
+
+# Shared HTTP client for the My Fantasy League API
+# Keeps connections to the MFL servers alive between calls and runs independent calls side by side
+class MFLClient:
+    def __init__(self, poolSize=10, maxWorkers=4, timeout=20, cache=None):
+        self.poolSize = poolSize
+        self.maxWorkers = maxWorkers
+        self.timeout = timeout
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._session = None
+        self._executor = None
+
+    # Create the pooled session the first time it is needed
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                # Reuse up to poolSize keep-alive connections per MFL host
+                adapter = HTTPAdapter(pool_connections=self.poolSize, pool_maxsize=self.poolSize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    # Create the worker pool the first time it is needed
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.maxWorkers, thread_name_prefix="mfl")
+            return self._executor
+
+    # Send a GET request over the pooled session, answering from the cache when possible
+    def get(self, urlString):
+        if self.cache is None:
+            return self.session().get(urlString, timeout=self.timeout)
+        entry = self.cache.lookup(urlString)
+        # Fresh cached copy: no network round-trip at all
+        if entry is not None and entry["expires"] > time.monotonic():
+            return entry["response"]
+        # Stale cached copy: ask MFL whether it has changed
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["lastModified"]:
+                headers["If-Modified-Since"] = entry["lastModified"]
+        response = self.session().get(urlString, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and entry is not None:
+            self.cache.revalidated(urlString)
+            return entry["response"]
+        if response.status_code == 200:
+            self.cache.store(urlString, response)
+        return response
+
+    # Run several independent MFL calls at the same time
+    # calls maps a result name to a tuple of (function, arg1, arg2, ...); results come back under the same names
+    def gather(self, calls):
+        futures = {name: self.executor().submit(call[0], *call[1:]) for (name, call) in calls.items()}
+        return {name: future.result() for (name, future) in futures.items()}
+
+    # Drop the session and worker pool without closing them; used in forked children, which must not share sockets or threads with the parent
+    def reset(self):
+        self._lock = threading.Lock()
+        self._session = None
+        self._executor = None
+        if self.cache is not None:
+            self.cache.reset()
+
+# Module-level client used by all of the functions below
+_client = MFLClient(cache=ResponseCache())
+# gunicorn forks workers after import, so each worker builds its own connections and threads
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_client.reset)
+
+# Run several of the functions below concurrently with the shared client, e.g.
+# fetch_concurrently({"rosters": (get_rosters, user_league), "freeAgents": (get_freeAgents, user_league)})
+def fetch_concurrently(calls):
+    return _client.gather(calls)
 
 
 # Retrieve player information from My Fantasy League website
 def get_players():
     # Connect to MFL API, which responds with data in xml format
     urlString = "https://api.myfantasyleague.com/2022/export?TYPE=players"
-    response = requests.get(urlString)
-    # Parse xml response with BeautifulSoup
-    soup = BeautifulSoup(response.content,'xml')
-    # Create empty list to hold data during loop
-    data = []
-    # Tell BeautifulSoup to find each element in the xml structure
-    players = soup.find_all('player')
-    # Loop through the rows to get the data within, then append to the empty data list
-    for i in range(len(players)):
-        rows = [players[i].get("id"), players[i].get("name"), players[i].get("position"), players[i].get("team")]
-        data.append(rows)
-    # Convert data list to pandas DataFrame
-    df = pd.DataFrame(data)
-    df.columns=['id_mfl','playerName', 'pos', 'team']
+    response = _client.get(urlString)
+    # Stream the xml response straight into columns
+    df = xmlparse.parse_records(response.content, 'player', {'id_mfl':'id', 'playerName':'name', 'pos':'position', 'team':'team'})
     # Clean data
     ## Select only positions relevant to fantasy football
     df = df.loc[df['pos'].isin(['QB', 'WR', 'RB', 'TE', 'PK', 'Def'])]
@@ -40,49 +198,102 @@ def get_players():
     df.loc[:, 'pos'] = df.loc[:, 'pos'].replace('Def', 'DF')
     # Clean Team column
     df.loc[:, 'team'] = df.loc[:, 'team'].replace('FA*', 'FA')
+    # Set datatypes
+    df = df.astype({'pos':'category', 'team':'category'})
     return df
 
 # Retrieve franchise info from My Fantasy League website
 def get_franchises(user_league):
     # Connect to MFL API, which responds with data in xml format
     urlString = f"https://www54.myfantasyleague.com/2022/export?TYPE=league&L={user_league}"
-    response = requests.get(urlString)
-    # Parse xml response with BeautifulSoup
-    soup = BeautifulSoup(response.content,'xml')
-    # Create empty list to hold data during loop
-    data = []
-    # Tell BeautifulSoup to find each element in the xml structure
-    elems = soup.find_all('franchise')
-    # Loop through the rows to get the data within, then append to the empty data list
-    for i in range(len(elems)):
-        rows = [elems[i].get("id"), elems[i].get("name"), elems[i].get("abbrev")]
-        data.append(rows)
-    # Convert data list to pandas DataFrame
-    df = pd.DataFrame(data)
-    df.columns=['franchiseID','franchiseName', 'franchiseAbbrev']
+    response = _client.get(urlString)
+    # Stream the xml response straight into columns
+    df = xmlparse.parse_records(response.content, 'franchise', {'franchiseID':'id', 'franchiseName':'name', 'franchiseAbbrev':'abbrev'})
+    return df
+
+# Retrieve the league's starting lineup requirements from My Fantasy League website
+def get_starters(user_league):
+    # Connect to MFL API, which responds with data in xml format
+    urlString = f"https://www54.myfantasyleague.com/2022/export?TYPE=league&L={user_league}"
+    response = _client.get(urlString)
+    # Stream the xml response straight into columns; limit is "min-max" or a single number
+    df = xmlparse.parse_records(
+        response.content, 'position',
+        columns={'pos':'name', 'limit':'limit'},
+        parents={'starters':{'startersMax':'count'}}
+    )
+    df['startersMax'] = pd.to_numeric(df['startersMax'],errors='coerce')
+    return df
+
+# Retrieve the league's scoring rules from My Fantasy League website
+def get_leagueRules(user_league):
+    # Connect to MFL API, which responds with data in xml format
+    urlString = f"https://www54.myfantasyleague.com/2022/export?TYPE=rules&L={user_league}"
+    response = _client.get(urlString)
+    # Stream the xml response straight into columns; each rule applies to the positions of its positionRules group
+    df = xmlparse.parse_records(
+        response.content, 'rule',
+        columns={},
+        children={'event':'event', 'range':'range', 'points':'points'},
+        parents={'positionRules':{'positions':'positions'}}
+    )
+    return df
+
+# Retrieve the league's head-to-head schedule from My Fantasy League website
+def get_schedule(user_league):
+    # Connect to MFL API, which responds with data in xml format
+    urlString = f"https://www54.myfantasyleague.com/2022/export?TYPE=schedule&L={user_league}"
+    response = _client.get(urlString)
+    # Stream the xml response straight into columns; matchup is the 0-based position of the matchup in the schedule
+    df = xmlparse.parse_records(
+        response.content, 'franchise',
+        columns={'franchiseID':'id'},
+        parents={'weeklySchedule':{'week':'week'}, 'matchup':{'matchup':'#'}}
+    )
+    df = df[['week', 'matchup', 'franchiseID']]
+    df['week'] = pd.to_numeric(df['week'],errors='coerce')
+    return df
+
+# Retrieve the league's current standings from My Fantasy League website
+def get_standings(user_league):
+    # Connect to MFL API, which responds with data in xml format
+    urlString = f"https://www54.myfantasyleague.com/2022/export?TYPE=leagueStandings&L={user_league}"
+    response = _client.get(urlString)
+    # Stream the xml response straight into columns
+    df = xmlparse.parse_records(
+        response.content, 'franchise',
+        columns={'franchiseID':'id', 'wins':'h2hw', 'losses':'h2hl', 'ties':'h2ht', 'pointsFor':'pf'}
+    )
+    for colName in ['wins', 'losses', 'ties', 'pointsFor']:
+        df[colName] = pd.to_numeric(df[colName],errors='coerce').fillna(0)
+    return df
+
+# Retrieve the league's draft picks from My Fantasy League website; picks not made yet have no player
+def get_draftResults(user_league):
+    # Connect to MFL API, which responds with data in xml format
+    urlString = f"https://www54.myfantasyleague.com/2022/export?TYPE=draftResults&L={user_league}"
+    response = _client.get(urlString)
+    # Stream the xml response straight into columns, in draft order
+    df = xmlparse.parse_records(
+        response.content, 'draftPick',
+        columns={'round':'round', 'pick':'pick', 'franchiseID':'franchise', 'id_mfl':'player'}
+    )
+    df['round'] = pd.to_numeric(df['round'],errors='coerce')
+    df['pick'] = pd.to_numeric(df['pick'],errors='coerce')
     return df
 
 # Retrieve roster info from My Fantasy League website
 def get_rosters(user_league, user_franchise=""):
     # Connect to MFL API, which responds with data in xml format
     urlString = f"https://www54.myfantasyleague.com/2022/export?TYPE=rosters&L={user_league}&FRANCHISE={user_franchise}"
-    response = requests.get(urlString)
-    # Parse xml response with BeautifulSoup
-    soup = BeautifulSoup(response.content,'xml')
-    # Create empty list to hold data during loop
-    data = []
-    # Tell BeautifulSoup to find each element in the xml structure
-    franchises = soup.find_all('franchise')
-    # Loop through the rows of franchises to get the players within
-    for i in range(0,len(franchises)):
-        current_franchise = franchises[i].find_all('player')
-        # Loop through the players in each franchise to get the player data, then append to empty data list
-        for j in range(0,len(current_franchise)):
-            rows = [franchises[i].get("id"), franchises[i].get("week"), current_franchise[j].get("id"), current_franchise[j].get("status")]
-            data.append(rows)
-    # Convert to pandas dataframe
-    df = pd.DataFrame(data)
-    df.columns=['franchiseID','week', 'id_mfl', 'rosterStatus']
+    response = _client.get(urlString)
+    # Stream the xml response straight into columns; each player carries the id and week of the franchise it sits under
+    df = xmlparse.parse_records(
+        response.content, 'player',
+        columns={'id_mfl':'id', 'rosterStatus':'status'},
+        parents={'franchise':{'franchiseID':'id', 'week':'week'}}
+    )
+    df = df[['franchiseID','week', 'id_mfl', 'rosterStatus']]
     df['week'] = pd.to_numeric(df['week'],errors='coerce')
     return df
 
@@ -90,67 +301,37 @@ def get_rosters(user_league, user_franchise=""):
 def get_freeAgents(user_league):
     # Connect to MFL API, which responds with data in xml format
     urlString = f"https://www54.myfantasyleague.com/2022/export?TYPE=freeAgents&L={user_league}"
-    response = requests.get(urlString)
-    # Parse xml response with BeautifulSoup
-    soup = BeautifulSoup(response.content,'xml')
-    # Create empty list to hold data during loop
-    data = []
-    # Tell BeautifulSoup to find each element in the xml structure
-    freeAgents = soup.find_all('player')
-    # Loop through the rows to get the data within, then append to the empty data list
-    for i in range(len(freeAgents)):
-        rows = ["FA", "", freeAgents[i].get("id"), "Free Agent"]
-        data.append(rows)
-    # Convert to pandas dataframe
-    df = pd.DataFrame(data)
-    df.columns = ['franchiseID', 'week', 'id_mfl', 'rosterStatus']
+    response = _client.get(urlString)
+    # Stream the xml response straight into columns
+    df = xmlparse.parse_records(response.content, 'player', {'id_mfl':'id'})
+    # Free agents belong to the "FA" franchise
+    df.insert(0, 'franchiseID', "FA")
+    df.insert(1, 'week', "")
+    df['rosterStatus'] = "Free Agent"
     return df
 
 # Retrieve live score info from My Fantasy League website
 def get_liveScoring(user_league):
     # Connect to MFL API, which responds with data in xml format
     urlString = f"https://www54.myfantasyleague.com/2022/export?TYPE=liveScoring&DETAILS=1&L={user_league}"
-    response = requests.get(urlString)
-    # Parse xml response with BeautifulSoup
-    soup = BeautifulSoup(response.content,'xml')
-    # Create empty list to hold data during loop
-    data = []
-    # Tell BeautifulSoup to find each element in the xml structure
-    matchups = soup.find_all('matchup')
-    # Loop through the rows to get the data within, then append to the empty data list
-    for k in range(len(matchups)):
-        franchises = matchups[k].find_all('franchise')
-        for i in range(0,len(franchises)):
-            current_franchise = franchises[i].find_all('player')
-            for j in range(0,len(current_franchise)):
-                rows = [k, franchises[i].get("id"), current_franchise[j].get("id"), current_franchise[j].get("score"), current_franchise[j].get("gameSecondsRemaining"), current_franchise[j].get("status")]
-                data.append(rows)
-    # Convert to pandas dataframe
-    df = pd.DataFrame(data)
-    df.columns = ["matchup", "franchiseID", "id_mfl", "liveScore", "secondsRemaining", "status"]
+    response = _client.get(urlString)
+    # Stream the xml response straight into columns; only players inside a matchup's franchise are kept
+    df = xmlparse.parse_records(
+        response.content, 'player',
+        columns={'id_mfl':'id', 'liveScore':'score', 'secondsRemaining':'gameSecondsRemaining', 'status':'status'},
+        parents={'liveScoring':{'week':'week'}, 'matchup':{'matchup':'#'}, 'franchise':{'franchiseID':'id'}}
+    )
+    df = df[["week", "matchup", "franchiseID", "id_mfl", "liveScore", "secondsRemaining", "status"]]
+    df['week'] = pd.to_numeric(df['week'],errors='coerce')
     return df
 
 # Retrieve point predictions based on FantasySharks predictions
 def get_sharkRanks():
     # Connect to MFL API, which responds with data in xml format
     urlString = "https://api.myfantasyleague.com/2022/export?TYPE=playerRanks"
-    response = requests.get(urlString)
-    # Parse xml response with BeautifulSoup
-    soup = BeautifulSoup(response.content,'xml')
-    # Create empty list to hold data during loop
-    data = []
-    # Tell BeautifulSoup to find each element in the xml structure
-    players = soup.find_all('player')
-    # Loop through the rows to get the data within, then append to the empty data list
-    for i in range(len(players)):
-        rows = [players[i].get("id"), players[i].get("rank")]
-        data.append(rows)
-    # Convert to pandas dataframe
-    df = pd.DataFrame(data)
-    # Change column names
-    df.columns=['id_mfl','sharkRank']
-    # Set datatype
-    df['sharkRank'] = df['sharkRank'].astype('int32')
+    response = _client.get(urlString)
+    # Stream the xml response straight into typed columns
+    df = xmlparse.parse_records(response.content, 'player', {'id_mfl':'id', 'sharkRank':'rank'}, dtypes={'sharkRank':'int32'})
     return df
 
 # Retrieve average draft pick info
@@ -158,23 +339,9 @@ def get_adp():
     try:
         # Connect to MFL API, which responds with data in xml format
         urlString = "https://api.myfantasyleague.com/2022/export?TYPE=adp"
-        response = requests.get(urlString)
-        # Parse xml response with BeautifulSoup
-        soup = BeautifulSoup(response.content,'xml')
-        # Create empty list to hold data during loop
-        data = []
-        # Tell BeautifulSoup to find each element in the xml structure
-        players = soup.find_all('player')
-        # Loop through the rows to get the data within, then append to the empty data list
-        for i in range(len(players)):
-            rows = [players[i].get("id"), players[i].get("averagePick")]
-            data.append(rows)
-        # Convert to pandas dataframe
-        df = pd.DataFrame(data)
-        # Change column names
-        df.columns=['id_mfl','adp']
-        # Set datatype
-        df['adp'] = df['adp'].astype('float32')
+        response = _client.get(urlString)
+        # Stream the xml response straight into typed columns
+        df = xmlparse.parse_records(response.content, 'player', {'id_mfl':'id', 'adp':'averagePick'}, dtypes={'adp':'float32'})
         return df
     except:
         df = pd.DataFrame(columns=['id_mfl','adp'])
@@ -184,24 +351,75 @@ def get_adp():
 def get_playerProfiles(idList):
     # Connect to MFL API, which responds with data in xml format
     urlString = f"https://api.myfantasyleague.com/2022/export?TYPE=playerProfile&P={idList}"
-    response = requests.get(urlString)
-    # Parse xml response with BeautifulSoup
-    soup = BeautifulSoup(response.content,'xml')
-    # Create empty list to hold data during loop
-    data = []
-    # Tell BeautifulSoup to find each element in the xml structure
-    profiles = soup.find_all('playerProfile')
-    players = soup.find_all('player')
-    # Loop through the rows to get the data within, then append to the empty data list
-    for i in range(len(profiles)):
-        rows = [profiles[i].get("id"), players[i].get("dob")]
-        data.append(rows)
-    # Convert to pandas dataframe
-    df = pd.DataFrame(data)
-    # Change column names
-    df.columns = ['id_mfl', 'dob']
+    response = _client.get(urlString)
+    # Stream the xml response straight into columns; each player's dob sits inside its playerProfile
+    df = xmlparse.parse_records(
+        response.content, 'player',
+        columns={'dob':'dob'},
+        parents={'playerProfile':{'id_mfl':'id'}}
+    )
+    df = df[['id_mfl', 'dob']]
     return df
 
+# Space out request start times across worker threads
+class RateLimiter:
+    def __init__(self, ratePerSecond):
+        self.interval = 1 / ratePerSecond
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Block until the caller may start its request
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+# Get playerProfiles for many players at once
+# Ids are sent in chunks through a bounded worker pool with rate limiting and retries
+# onChunk(df) is called with each finished chunk's players that have a dob (from the calling thread) so they can be saved as they arrive
+# Returns (profiles, failedIds, emptyIds): the players with a dob, the ids whose chunk kept failing, and the ids MFL has
+# no dob for; neither kind of id is in profiles, so both are looked up again on the next run
+def fetch_playerProfiles(idList, chunkSize=50, maxWorkers=4, ratePerSecond=2, retries=3, onChunk=None):
+    limiter = RateLimiter(ratePerSecond)
+    # Fetch one chunk, retrying with exponential backoff
+    def fetch_chunk(chunk):
+        for attempt in range(retries + 1):
+            limiter.wait()
+            try:
+                df = get_playerProfiles(",".join(chunk))
+                # One row per requested id, in request order
+                return df.drop_duplicates(subset='id_mfl').set_index('id_mfl').reindex(chunk).reset_index()
+            except Exception as error:
+                if attempt == retries:
+                    raise error
+                time.sleep(2 ** attempt)
+    # Break player list into chunks small enough for the API server
+    idList = list(idList)
+    chunks = [idList[i:i+chunkSize] for i in range(0, len(idList), chunkSize)]
+    results = []
+    failedIds = []
+    emptyIds = []
+    with ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="mfl-profiles") as executor:
+        futures = {executor.submit(fetch_chunk, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            try:
+                df = future.result()
+            # A chunk that keeps failing is reported back with its ids
+            except Exception:
+                failedIds += futures[future]
+                continue
+            found = df['dob'].notna()
+            emptyIds += df.loc[~found, 'id_mfl'].tolist()
+            df = df.loc[found].reset_index(drop=True)
+            if onChunk is not None and len(df):
+                onChunk(df)
+            results.append(df)
+    if not results:
+        return (pd.DataFrame(columns=['id_mfl', 'dob']), failedIds, emptyIds)
+    return (pd.concat(results, ignore_index=True), failedIds, emptyIds)
+
 
 
 
@@ -209,13 +427,6 @@ def get_playerProfiles(idList):
 # Retrieve projected score info from My Fantasy League website
 def get_projectedScores(user_league, week):
     urlString = f"https://www54.myfantasyleague.com/2022/export?TYPE=projectedScores&W={week}&L={user_league}"
-    response = requests.get(urlString)
-    soup = BeautifulSoup(response.content,'xml')
-    data = []
-    elems = soup.find_all('playerScore')
-    for i in range(len(elems)):
-        rows = [elems[i].get("id"), elems[i].get("score")]
-        data.append(rows)
-    df = pd.DataFrame(data)
-    df.columns=['id_mfl','sharkProjection']
-    return df
\ No newline at end of file
+    response = _client.get(urlString)
+    df = xmlparse.parse_records(response.content, 'playerScore', {'id_mfl':'id', 'sharkProjection':'score'})
+    return df
@@ -1,95 +1,290 @@
 # Import dependencies
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 # Dependencies for random forest model
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OneHotEncoder
 from joblib import dump, load
+# Internal imports
+from ffpackage import forest, features
 
-### Predict future points based on position
-def makePredictions(df, pos):
-    # Create variables based on player position
-    dummy1 = f'posRank_{pos}1'
-    dummy2 = f'posRank_{pos}2'
-    dummy3 = f'posRank_{pos}3'
-    modelPath = f'../models/rfmodel_{pos}1.joblib'
-    # Specify column names for features and labels
-    featureColumns = [
-        'week', 'age', 'pos', 'posRank', # basic player info
-        'passA_curr', 'passC_curr', 'passY_curr', 'passT_curr', 'passI_curr', 'pass2_curr', # passing
-        'rushA_curr', 'rushY_curr', 'rushT_curr', 'rush2_curr', # rushing
-        'recC_curr', 'recY_curr', 'recT_curr', 'rec2_curr', 'fum_curr', # receiving
-        'XPA_curr', 'XPM_curr', 'FGA_curr', 'FGM_curr', 'FG50_curr', # punt/kicking
-        'defSack_curr', 'defI_curr', 'defSaf_curr', 'defFum_curr', 'defBlk_curr', 'defT_curr', # defensive
-        'defPtsAgainst_curr', 'defPassYAgainst_curr', 'defRushYAgainst_curr', 'defYdsAgainst_curr', # opponent
-        'gamesPlayed_curr', # games played
-        'gamesPlayed_prior1', # games played
-        'passA_prior1', 'passC_prior1', 'passY_prior1', 'passT_prior1', 'passI_prior1', 'pass2_prior1', 
-        'rushA_prior1', 'rushY_prior1', 'rushT_prior1', 'rush2_prior1', 
-        'recC_prior1', 'recY_prior1', 'recT_prior1', 'rec2_prior1', 'fum_prior1', 
-        'XPA_prior1', 'XPM_prior1', 'FGA_prior1', 'FGM_prior1', 'FG50_prior1', 
-        'defSack_prior1', 'defI_prior1', 'defSaf_prior1', 'defFum_prior1', 'defBlk_prior1', 'defT_prior1', 
-        'defPtsAgainst_prior1', 'defPassYAgainst_prior1', 'defRushYAgainst_prior1', 'defYdsAgainst_prior1', 
-        'gamesPlayed_prior2', 
-        'passA_prior2', 'passC_prior2', 'passY_prior2', 'passT_prior2', 'passI_prior2', 'pass2_prior2', 
-        'rushA_prior2', 'rushY_prior2', 'rushT_prior2', 'rush2_prior2', 
-        'recC_prior2', 'recY_prior2', 'recT_prior2', 'rec2_prior2', 'fum_prior2', 
-        'XPA_prior2', 'XPM_prior2', 'FGA_prior2', 'FGM_prior2', 'FG50_prior2', 
-        'defSack_prior2', 'defI_prior2', 'defSaf_prior2', 'defFum_prior2', 'defBlk_prior2', 'defT_prior2', 
-        'defPtsAgainst_prior2', 'defPassYAgainst_prior2', 'defRushYAgainst_prior2', 'defYdsAgainst_prior2', 
-        'defSack_curr_opp', 'defI_curr_opp', 'defSaf_curr_opp', 'defFum_curr_opp', 'defBlk_curr_opp', 'defT_curr_opp', 
-        'defPtsAgainst_curr_opp', 'defPassYAgainst_curr_opp', 'defRushYAgainst_curr_opp', 'defYdsAgainst_curr_opp', 
-        'defSack_prior1_opp', 'defI_prior1_opp', 'defSaf_prior1_opp', 'defFum_prior1_opp', 'defBlk_prior1_opp', 'defT_prior1_opp', 
-        'defPtsAgainst_prior1_opp', 'defPassYAgainst_prior1_opp', 'defRushYAgainst_prior1_opp', 'defYdsAgainst_prior1_opp'
-    ]
-    labelColumns = [
-        'passA', 'passC', 'passY', 'passT', 'passI', 'pass2', 
-        'rushA', 'rushY', 'rushT', 'rush2', 
-        'recC', 'recY', 'recT', 'rec2', 'fum', 
-        'XPA', 'XPM', 'FGA', 'FGM', 'FG50', 
-        'defSack', 'defI', 'defSaf', 'defFum', 'defBlk', 'defT', 
-        'defPtsAgainst', 'defPassYAgainst', 'defRushYAgainst', 'defYdsAgainst'  
-    ]
-    headerColumns = [
-            'id_mfl',
-            'season',
-            'week',
-            'team',
-            'playerName',
-            'age',
-            'sharkRank', 
-            'adp',
-            'KR',
-            'PR',
-            'RES',
-            'pos',
-            'posRank',
-            'opponent'
-        ]
-    # Select only one player position
-    df = df.loc[df['pos']==pos]
-    df = df.dropna()
-    df = df.reset_index(drop=True)
-    # Select features
-    header = df[headerColumns]
-    X = df[featureColumns]
-    # Encode categorical features
-    X = pd.get_dummies(X, columns = ['pos', 'posRank'])
-    # Check if there were the correct number of posRanks in the dataset
-    # (For instance, if there were no TE3s then this would cause a problem for the predictive model)
-    for rank in [dummy1, dummy2, dummy3]:
-        if rank not in list(X.columns):
-            X[rank] = 0
-    # The model did not include DF2s or DF3s)
-    if "posRank_DF3" in X.columns:
-        X = X.drop(columns=['posRank_DF3', 'posRank_DF2'])
-    #load saved model
-    regressor = load(modelPath)
+
+# Positions in the order their predictions are stacked
+positions = ['WR', 'RB', 'QB', 'TE', 'PK', 'DF']
+# Numeric model features, in model order; the pos and posRank dummies follow them
+featureColumns = [
+    'week', 'age',
+    'passA_curr', 'passC_curr', 'passY_curr', 'passT_curr', 'passI_curr', 'pass2_curr',
+    'rushA_curr', 'rushY_curr', 'rushT_curr', 'rush2_curr',
+    'recC_curr', 'recY_curr', 'recT_curr', 'rec2_curr', 'fum_curr',
+    'XPA_curr', 'XPM_curr', 'FGA_curr', 'FGM_curr', 'FG50_curr',
+    'defSack_curr', 'defI_curr', 'defSaf_curr', 'defFum_curr', 'defBlk_curr', 'defT_curr',
+    'defPtsAgainst_curr', 'defPassYAgainst_curr', 'defRushYAgainst_curr', 'defYdsAgainst_curr',
+    'gamesPlayed_curr',
+    'gamesPlayed_prior1',
+    'passA_prior1', 'passC_prior1', 'passY_prior1', 'passT_prior1', 'passI_prior1', 'pass2_prior1',
+    'rushA_prior1', 'rushY_prior1', 'rushT_prior1', 'rush2_prior1',
+    'recC_prior1', 'recY_prior1', 'recT_prior1', 'rec2_prior1', 'fum_prior1',
+    'XPA_prior1', 'XPM_prior1', 'FGA_prior1', 'FGM_prior1', 'FG50_prior1',
+    'defSack_prior1', 'defI_prior1', 'defSaf_prior1', 'defFum_prior1', 'defBlk_prior1', 'defT_prior1',
+    'defPtsAgainst_prior1', 'defPassYAgainst_prior1', 'defRushYAgainst_prior1', 'defYdsAgainst_prior1',
+    'gamesPlayed_prior2',
+    'passA_prior2', 'passC_prior2', 'passY_prior2', 'passT_prior2', 'passI_prior2', 'pass2_prior2',
+    'rushA_prior2', 'rushY_prior2', 'rushT_prior2', 'rush2_prior2',
+    'recC_prior2', 'recY_prior2', 'recT_prior2', 'rec2_prior2', 'fum_prior2',
+    'XPA_prior2', 'XPM_prior2', 'FGA_prior2', 'FGM_prior2', 'FG50_prior2',
+    'defSack_prior2', 'defI_prior2', 'defSaf_prior2', 'defFum_prior2', 'defBlk_prior2', 'defT_prior2',
+    'defPtsAgainst_prior2', 'defPassYAgainst_prior2', 'defRushYAgainst_prior2', 'defYdsAgainst_prior2',
+    'defSack_curr_opp', 'defI_curr_opp', 'defSaf_curr_opp', 'defFum_curr_opp', 'defBlk_curr_opp', 'defT_curr_opp',
+    'defPtsAgainst_curr_opp', 'defPassYAgainst_curr_opp', 'defRushYAgainst_curr_opp', 'defYdsAgainst_curr_opp',
+    'defSack_prior1_opp', 'defI_prior1_opp', 'defSaf_prior1_opp', 'defFum_prior1_opp', 'defBlk_prior1_opp', 'defT_prior1_opp',
+    'defPtsAgainst_prior1_opp', 'defPassYAgainst_prior1_opp', 'defRushYAgainst_prior1_opp', 'defYdsAgainst_prior1_opp'
+]
+# Column position of each numeric feature in the shared feature matrix
+featureIndex = {colName: j for (j, colName) in enumerate(featureColumns)}
+labelColumns = [
+    'passA', 'passC', 'passY', 'passT', 'passI', 'pass2',
+    'rushA', 'rushY', 'rushT', 'rush2',
+    'recC', 'recY', 'recT', 'rec2', 'fum',
+    'XPA', 'XPM', 'FGA', 'FGM', 'FG50',
+    'defSack', 'defI', 'defSaf', 'defFum', 'defBlk', 'defT',
+    'defPtsAgainst', 'defPassYAgainst', 'defRushYAgainst', 'defYdsAgainst'
+]
+headerColumns = [
+    'id_mfl', 'season', 'week', 'team', 'player', 'age', 'sharkRank', 'adp', 'KR', 'PR', 'RES', 'pos', 'posRank', 'opponent'
+]
+
+# Scoring multiplier based on league settings: one weight per label, then the defensive PointsAgainst and YardsAgainst bins
+multiplier = np.array([
+    0,0,.04,4,-2,2,.1,.1,6,2,.25,.1,6,2,-2,0,1,0,3,5,1,2,2,2,1.5,6,0,0,0,0,1,1
+], dtype='float64')
+# Bins for defensive PointsAgainst and YardsAgainst based on MFL scoring categories, and their scores based on league settings
+binList_defPts = [-5,0,6,13,17,21,27,34,45,59,99]
+binList_defYds = [0,274,324,375,425,999]
+ptList_defPts = np.array([10,8,7,5,3,2,0,-1,-3,-5], dtype='float64')
+ptList_defYds = np.array([5,2,0,-2,-5], dtype='float64')
+
+# Saved models live in the repo's models directory, one rfmodel_{pos}1.joblib per position
+defaultModelDir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+modelPattern = re.compile(r'^rfmodel_([A-Z]{2})1\.joblib$')
+
+# Positions predicting at most this many rows use the flattened forest, which avoids sklearn's per-call overhead;
+# larger batches are faster through sklearn's compiled trees
+flatRows = 512
+
+# The model to predict a batch of rows with: the flattened forest for small batches, sklearn's for large ones
+def batch_model(registry, pos, nRows):
+    return registry.get_flat(pos) if nRows <= flatRows else registry.get(pos)
+
+# Load the saved model for one position; its arrays are memory-mapped instead of read into memory
+def load_model(pos, modelDir=defaultModelDir):
+    return load(os.path.join(modelDir, f'rfmodel_{pos}1.joblib'), mmap_mode='r')
+
+# Path of a position's flattened forest, exported next to its model
+def flat_path(pos, modelDir=defaultModelDir):
+    return os.path.join(modelDir, f'rfmodel_{pos}1.flat.joblib')
+
+# Path of a position's feature schema, saved next to its model
+def schema_path(pos, modelDir=defaultModelDir):
+    return os.path.join(modelDir, f'rfmodel_{pos}1.schema.json')
+
+# Save the feature schema of every model in a directory, fixing each model's column layout
+def export_schemas(modelDir=defaultModelDir):
+    registry = get_registry(modelDir)
+    for pos in registry.available():
+        registry.get_schema(pos).save(schema_path(pos, modelDir))
+
+# Export every model in a directory as a flattened forest, so processes can memory-map one shared copy
+def export_flat(modelDir=defaultModelDir):
+    registry = get_registry(modelDir)
+    for pos in registry.available():
+        forest.save_forest(forest.flatten_forest(registry.get(pos)), flat_path(pos, modelDir))
+
+# Check that a loaded model fits the feature matrix predictAll builds for its position, so a stale or misplaced
+# artifact fails when it is loaded instead of partway through a run
+def check_model(model, pos):
+    if getattr(model, 'n_outputs_', len(labelColumns)) != len(labelColumns):
+        raise ValueError(f'{pos} model predicts {model.n_outputs_} stats, expected {len(labelColumns)}')
+    dummies = [f'pos_{pos}', f'posRank_{pos}1', f'posRank_{pos}2', f'posRank_{pos}3']
+    if hasattr(model, 'feature_names_in_'):
+        unknown = [colName for colName in model.feature_names_in_ if colName not in featureIndex and colName not in dummies]
+        if unknown:
+            raise ValueError(f'{pos} model expects columns the feature matrix does not have: {unknown}')
+    elif pos == 'DF':
+        # Defenses only ever got the posRank dummies present in their training data
+        if not len(featureColumns) + 1 <= model.n_features_in_ <= len(featureColumns) + len(dummies):
+            raise ValueError(f'{pos} model expects {model.n_features_in_} features')
+    elif model.n_features_in_ != len(featureColumns) + len(dummies):
+        raise ValueError(f'{pos} model expects {model.n_features_in_} features, expected {len(featureColumns) + len(dummies)}')
+    return model
+
+
+# The saved models in one directory, each loaded and checked the first time it is needed and then kept
+class ModelRegistry:
+    def __init__(self, modelDir=defaultModelDir):
+        self.modelDir = modelDir
+        self.models = {}
+        self.forests = {}
+        self.schemas = {}
+        self.lock = threading.RLock()
+
+    # Positions with a saved model in the directory
+    def available(self):
+        if not os.path.isdir(self.modelDir):
+            return []
+        found = [modelPattern.match(fileName) for fileName in os.listdir(self.modelDir)]
+        return sorted(match.group(1) for match in found if match)
+
+    # The model for one position, loaded once
+    def get(self, pos):
+        with self.lock:
+            if pos not in self.models:
+                self.models[pos] = check_model(load_model(pos, self.modelDir), pos)
+            return self.models[pos]
+
+    # The flattened forest for one position, loaded once: memory-mapped from its export when that is up to date,
+    # otherwise flattened from the model
+    def get_flat(self, pos):
+        with self.lock:
+            if pos not in self.forests:
+                path = flat_path(pos, self.modelDir)
+                modelPath = os.path.join(self.modelDir, f'rfmodel_{pos}1.joblib')
+                if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(modelPath):
+                    self.forests[pos] = check_model(forest.load_forest(path), pos)
+                else:
+                    self.forests[pos] = forest.flatten_forest(self.get(pos))
+            return self.forests[pos]
+
+    # The feature schema for one position, loaded once: the one saved next to the model, or else derived from the model
+    # (`model` is the loaded model or flattened forest, when the caller already has one)
+    def get_schema(self, pos, model=None):
+        with self.lock:
+            if pos not in self.schemas:
+                model = model if model is not None else self.get(pos)
+                path = schema_path(pos, self.modelDir)
+                schema = features.load_schema(path) if os.path.exists(path) else schema_for_model(model, pos)
+                self.schemas[pos] = check_schema(schema, model, pos)
+            return self.schemas[pos]
+
+    # Fail if any of the positions has no saved model
+    def require(self, positionList=positions):
+        missing = [pos for pos in positionList if pos not in self.available()]
+        if missing:
+            raise FileNotFoundError(f'No saved model for {missing} in {self.modelDir}')
+
+    # Load and check every position's model up front
+    def load_all(self, positionList=positions):
+        self.require(positionList)
+        return {pos: self.get(pos) for pos in positionList}
+
+# One registry per model directory, shared by every caller in the process
+_registries = {}
+_registriesLock = threading.Lock()
+
+def get_registry(modelDir=defaultModelDir):
+    with _registriesLock:
+        key = os.path.abspath(modelDir)
+        if key not in _registries:
+            _registries[key] = ModelRegistry(modelDir)
+        return _registries[key]
+
+# Feature schema of a model saved without one: its own column names when it was fitted on a DataFrame, otherwise the
+# layout the scheduler built: the numeric features, pos, then the posRank dummies. Defenses only got the posRanks
+# present in their training data, taken as the top ranks
+def schema_for_model(model, pos):
+    if hasattr(model, 'feature_names_in_'):
+        columns = list(model.feature_names_in_)
+    elif pos == 'DF':
+        nRanks = model.n_features_in_ - len(featureColumns) - 1
+        columns = featureColumns + [f'pos_{pos}'] + [f'posRank_{pos}{rank}' for rank in range(1, nRanks + 1)]
+    else:
+        columns = featureColumns + [f'pos_{pos}'] + [f'posRank_{pos}{rank}' for rank in range(1, 4)]
+    categories = {
+        'pos': [colName[len('pos_'):] for colName in columns if colName.startswith('pos_')],
+        'posRank': [colName[len('posRank_'):] for colName in columns if colName.startswith('posRank_')],
+    }
+    return features.FeatureSchema(columns, categories)
+
+# Check that a schema describes a model's inputs and only uses columns predictAll provides
+def check_schema(schema, model, pos):
+    if len(schema.columns) != model.n_features_in_:
+        raise ValueError(f'{pos} schema has {len(schema.columns)} columns, the model expects {model.n_features_in_}')
+    if hasattr(model, 'feature_names_in_') and list(model.feature_names_in_) != schema.columns:
+        raise ValueError(f'{pos} schema columns do not match the columns the model was fitted on')
+    unknown = [colName for colName in schema.numeric if colName not in featureIndex]
+    unknown += [colName for colName in schema.categories if colName not in ('pos', 'posRank')]
+    if unknown:
+        raise ValueError(f'{pos} schema uses columns the feature matrix does not have: {unknown}')
+    return schema
+
+# Points for each value's bin (pd.cut with include_lowest); values outside every bin score 0
+def binPoints(values, bins, points):
+    codes = pd.cut(values, bins=bins, include_lowest=True, labels=False)
+    codes = np.asarray(codes, dtype='float64')
+    return np.where(np.isnan(codes), 0, points[np.nan_to_num(codes).astype('int64')])
+
+# Calculate FANTASY scores from predicted stats with the league multiplier, for every row at once
+# Only defenses score the PointsAgainst and YardsAgainst bins. The row-major matrix sums each row in the same order as the
+# scheduler's row-wise multer/np.sum did, so the scores are identical
+def scorePredictions(y_pred, pos):
+    scores = np.zeros((len(y_pred), len(multiplier)), dtype='float64')
+    scores[:, :len(labelColumns)] = y_pred
+    if pos == 'DF':
+        scores[:, -2] = binPoints(y_pred[:, labelColumns.index('defPtsAgainst')], binList_defPts, ptList_defPts)
+        scores[:, -1] = binPoints(y_pred[:, labelColumns.index('defYdsAgainst')], binList_defYds, ptList_defYds)
+    scores *= multiplier
+    return scores.sum(axis=1)
+
+### Predict future points for one position
+#   rows: positions of the position's usable rows in df; source: df's FeatureSource, built once for all positions
+#   schema: the model's FeatureSchema
+def makePredictions(df, pos, rows, source, model, schema):
+    # Build the model's float32 input straight from the shared source
+    X = schema.build(source, rows)
     # Run model
-    y_pred = regressor.predict(X)
-    # Format output score projections as dataframe with named columns, then merge back in with player info
-    y_pred = pd.DataFrame(y_pred)
-    y_pred.columns = labelColumns
-    y_pred = header.merge(y_pred, left_index=True, right_index=True)
-    # Return result
-    return y_pred
+    if isinstance(model, forest.FlatForest) or not hasattr(model, 'feature_names_in_'):
+        y_pred = model.predict(X)
+    else:
+        y_pred = model.predict(pd.DataFrame(X, columns=schema.columns))
+    # Merge header columns with the scored predictions
+    header = df.iloc[rows][headerColumns].reset_index(drop=True)
+    header['pred'] = scorePredictions(np.asarray(y_pred, dtype='float64'), pos)
+    return header
+
+
+### Predict future points for every position in one pass
+# The features are converted once and each position's rows are picked out with index arrays; positions are
+# predicted concurrently. The result is stacked in `positions` order, each position's rows numbered from 0, as the
+# scheduler's six position blocks produced it. Models come from the directory's shared registry and are all loaded
+# and checked before any prediction runs; positions with few rows use the flattened forests, whose predictions match
+# sklearn's to float32 precision
+def predictAll(df, modelDir=defaultModelDir, maxWorkers=len(positions)):
+    registry = get_registry(modelDir)
+    registry.require()
+    missing = [colName for colName in headerColumns if colName not in df.columns]
+    if missing:
+        raise KeyError(f'Player data is missing header columns: {missing}')
+    source = features.FeatureSource(df, featureColumns, ['pos', 'posRank'])
+    # Rows a model can use: its position, one of the position's three posRanks, and no missing values
+    usable = df.notna().all(axis=1).to_numpy()
+    pos = df['pos'].to_numpy()
+    posRank = df['posRank'].to_numpy()
+    rowsByPos = {
+        p: np.flatnonzero(usable & (pos == p) & np.isin(posRank, [f'{p}1', f'{p}2', f'{p}3']))
+        for p in positions
+    }
+    # Small batches go through the flattened forests, large ones through sklearn
+    models = {p: batch_model(registry, p, len(rowsByPos[p])) for p in positions}
+    # Each model's feature schema, checked against the model before anything runs
+    schemas = {p: registry.get_schema(p, models[p]) for p in positions}
+    # Run every position's model concurrently
+    def predictPosition(p):
+        return makePredictions(df, p, rowsByPos[p], source, models[p], schemas[p])
+    with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        blocks = list(executor.map(predictPosition, positions))
+    return pd.concat(blocks, axis=0)
@@ -0,0 +1,143 @@
+# Import dependencies
+import numpy as np
+import pandas as pd
+# Internal imports
+from ffpackage import analysis
+
+
+# Spread of a player's weekly score around its prediction: a share of the prediction, with a floor in points
+scoreCV = 0.45
+minSD = 2.0
+# Share of a player's score variance that is shared with the other players on his NFL team that week
+teamCorrelation = 0.25
+# Number of simulated seasons/weeks
+defaultSims = 10000
+
+
+# Standard deviation of each player's weekly score, from his predicted score
+def score_spread(means):
+    return np.maximum(scoreCV * np.abs(means), minSD)
+
+# Draw nSims correlated scores for every player at once, as an (nSims, nPlayers) float32 array
+# Each NFL team gets one shared shock per simulation; players carry teamCorrelation of their variance through it.
+# Players without a team (teamCodes of -1) are drawn independently.
+def draw_scores(means, sds, teamCodes, nSims, rng):
+    nTeams = int(teamCodes.max()) + 1 if len(teamCodes) else 0
+    # The extra last column stays 0, so teamCodes of -1 pick up no shared shock
+    teamShocks = np.zeros((nSims, nTeams + 1), dtype='float32')
+    teamShocks[:, :nTeams] = rng.standard_normal((nSims, nTeams), dtype='float32')
+    hasTeam = teamCodes >= 0
+    ownScale = (np.where(hasTeam, np.sqrt(1 - teamCorrelation), 1) * sds).astype('float32')
+    teamScale = (np.where(hasTeam, np.sqrt(teamCorrelation), 0) * sds).astype('float32')
+    # Build the samples in place: own shock plus team shock, each scaled by the player's spread, then shifted to his mean
+    draws = rng.standard_normal((nSims, len(means)), dtype='float32')
+    draws *= ownScale
+    teamPart = np.take(teamShocks, teamCodes, axis=1)
+    teamPart *= teamScale
+    draws += teamPart
+    draws += means.astype('float32')
+    return draws
+
+# Sum player draws into franchise totals with one matrix product, as an (nSims, nFranchises) array
+def franchise_totals(draws, franchiseCodes, nFranchises):
+    incidence = np.zeros((len(franchiseCodes), nFranchises), dtype='float32')
+    incidence[np.arange(len(franchiseCodes)), franchiseCodes] = 1
+    return draws @ incidence
+
+# The two franchise codes of every matchup, as arrays
+# Matchups without exactly two known franchises (a bye, or a franchise missing from franchiseIndex) are skipped
+def _matchup_pairs(matchups, franchiseIndex):
+    codes = franchiseIndex.get_indexer(matchups['franchiseID'])
+    matchupCodes = pd.factorize(matchups['matchup'])[0]
+    known = (codes >= 0) & (matchupCodes >= 0)
+    sizes = np.bincount(matchupCodes[known], minlength=matchupCodes.max(initial=-1) + 1)
+    rows = np.flatnonzero(known)
+    rows = rows[sizes[matchupCodes[rows]] == 2]
+    pairs = codes[rows[np.argsort(matchupCodes[rows], kind='stable')]].reshape(-1, 2)
+    return (pairs[:, 0], pairs[:, 1])
+
+# Win probability for each franchise in the week being played, from MFL liveScoring and the week's predictions
+# Finished games count as scored; the rest of each player's game is drawn around his expected live score,
+# with the spread shrinking as the game runs down
+#   live: mfl.get_liveScoring; predictions: one row per player for the week with id_mfl, week, team and the `how` score
+def matchup_odds(live, predictions, how='scoreTotal', nSims=defaultSims, seed=None):
+    rng = np.random.default_rng(seed)
+    starters = live.loc[live['status'] == 'starter'].merge(
+        predictions[['id_mfl', 'week', 'pos', 'team', how]], how='left', on=['id_mfl', 'week']
+    )
+    starters['liveScore'] = starters['liveScore'].astype('float64')
+    starters['secondsRemaining'] = starters['secondsRemaining'].astype('float64')
+    # Players without a prediction keep the points they have
+    predicted = starters[how].notna().to_numpy()
+    starters['scoreTotal'] = starters[how].fillna(0)
+    means = analysis.expectedLiveScores(starters).to_numpy(dtype='float64')
+    remaining = starters['secondsRemaining'].to_numpy(dtype='float64') / 3600
+    sds = np.where(predicted, score_spread(starters['scoreTotal'].to_numpy(dtype='float64')) * np.sqrt(remaining), 0)
+    teamCodes = pd.factorize(starters['team'])[0]
+    # Simulate every starter, then every franchise total and matchup at once
+    franchiseIndex = pd.Index(starters['franchiseID'].unique())
+    draws = draw_scores(means, sds, teamCodes, nSims, rng)
+    totals = franchise_totals(draws, franchiseIndex.get_indexer(starters['franchiseID']), len(franchiseIndex))
+    matchups = live[['matchup', 'franchiseID']].drop_duplicates()
+    matchups = matchups.loc[matchups['franchiseID'].isin(franchiseIndex)]
+    (home, away) = _matchup_pairs(matchups, franchiseIndex)
+    homeWins = (totals[:, home] > totals[:, away]).mean(axis=0) + 0.5 * (totals[:, home] == totals[:, away]).mean(axis=0)
+    winProbability = np.zeros(len(franchiseIndex))
+    winProbability[home] = homeWins
+    winProbability[away] = 1 - homeWins
+    # Summary table
+    odds = pd.DataFrame({
+        'franchiseID': franchiseIndex,
+        'expectedScore': totals.mean(axis=0),
+        'winProbability': winProbability,
+    })
+    return odds.merge(matchups, how='left', on='franchiseID')
+
+# Playoff odds for every franchise, simulating the rest of the regular season from current standings
+# Each week's lineups are the optimal ones for that week's predictions; every week's matchups are settled across all
+# simulations at once, and the final standings (wins, then points for) are ranked per simulation
+#   predictions: one row per player per week with id_mfl, week, pos, team and the `how` score
+#   rosters: mfl.get_rosters; schedule: mfl.get_schedule; standings: mfl.get_standings
+def playoff_odds(predictions, rosters, schedule, standings, fromWeek, startersMax, posMax, posMin,
+                 how='scoreTotal', playoffTeams=6, nSims=defaultSims, seed=None):
+    rng = np.random.default_rng(seed)
+    franchiseIndex = pd.Index(standings['franchiseID'])
+    nFranchises = len(franchiseIndex)
+    # Current standings, one column per franchise, carried forward in every simulation
+    wins = np.broadcast_to(standings['wins'].to_numpy(dtype='float64') + 0.5 * standings['ties'].to_numpy(dtype='float64'), (nSims, nFranchises)).copy()
+    pointsFor = np.broadcast_to(standings['pointsFor'].to_numpy(dtype='float64'), (nSims, nFranchises)).copy()
+    # Every remaining week's best lineups, from the current rosters
+    remaining = schedule.loc[schedule['week'] >= fromWeek]
+    lineups = rosters[['franchiseID', 'id_mfl', 'rosterStatus']].drop_duplicates().merge(
+        predictions.loc[predictions['week'].isin(remaining['week'].unique()), ['id_mfl', 'week', 'pos', 'team', how]], on='id_mfl'
+    )
+    lineups = analysis.optimalStarters(lineups, how, startersMax, posMax, posMin, groups=('franchiseID', 'week'))
+    lineups = lineups.loc[(lineups['startSelector'] == 'Starter') & lineups['franchiseID'].isin(franchiseIndex)]
+    teamCodes = pd.factorize(lineups['team'])[0]
+    franchiseCodes = franchiseIndex.get_indexer(lineups['franchiseID'])
+    means = lineups[how].to_numpy(dtype='float64')
+    sds = score_spread(means)
+    weeks = lineups['week'].to_numpy()
+    for (week, matchups) in remaining.groupby('week'):
+        # All simulations of this week's games at once
+        thisWeek = weeks == week
+        draws = draw_scores(means[thisWeek], sds[thisWeek], teamCodes[thisWeek], nSims, rng)
+        totals = franchise_totals(draws, franchiseCodes[thisWeek], nFranchises)
+        (home, away) = _matchup_pairs(matchups.loc[matchups['franchiseID'].isin(franchiseIndex)], franchiseIndex)
+        homeResult = (totals[:, home] > totals[:, away]) + 0.5 * (totals[:, home] == totals[:, away])
+        wins[:, home] += homeResult
+        wins[:, away] += 1 - homeResult
+        pointsFor += totals
+    # Rank each simulation's final standings: most wins first, points for breaking ties
+    order = np.lexsort((-pointsFor, -wins), axis=1)
+    seeding = np.empty_like(order)
+    np.put_along_axis(seeding, order, np.arange(nFranchises)[None, :], axis=1)
+    # Summary table
+    odds = pd.DataFrame({
+        'franchiseID': franchiseIndex,
+        'expectedWins': wins.mean(axis=0),
+        'expectedPointsFor': pointsFor.mean(axis=0),
+        'playoffOdds': (seeding < playoffTeams).mean(axis=0),
+        'firstSeedOdds': (seeding == 0).mean(axis=0),
+    })
+    return odds
@@ -0,0 +1,133 @@
+# Import dependencies
+import os
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError
+import numpy as np
+import pandas as pd
+# Internal imports
+from ffpackage import analysis
+
+
+# Trade shapes as (players the user gives, players the user gets): 1x1, 2x1 and 1x2
+tradeShapes = [(1, 1), (2, 1), (1, 2)]
+# Candidate trades scored per batch; the latency budget is checked between batches
+batchSize = 4096
+
+# Worker processes are started on first use and reused across requests
+_executor = None
+
+# Return the shared worker pool, starting it on first use
+def executor(maxWorkers=None):
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=maxWorkers or min(4, os.cpu_count() or 1))
+    return _executor
+
+# A forked child must not reuse its parent's worker pool
+def _reset():
+    global _executor
+    _executor = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
+
+
+# Gain in a roster's lineup value from adding each of another roster's players on its own
+def _add_gains(roster, other, limits, baseValue):
+    joining = np.arange(len(other.ids))[:, None]
+    leaving = np.empty((len(joining), 0), dtype='int64')
+    return roster.values_after(leaving, joining, other, limits) - baseValue
+
+# Index combinations of size `size` from `useful` players; pairs need at least one useful player, the other can be anyone
+def _combinations(useful, nPlayers, size):
+    if size == 1:
+        return useful[:, None]
+    pairs = np.array(list(itertools.combinations(range(nPlayers), 2)), dtype='int64').reshape(-1, 2)
+    isUseful = np.zeros(nPlayers, dtype=bool)
+    isUseful[useful] = True
+    return pairs[isUseful[pairs].any(axis=1)]
+
+# Score every pruned 1x1, 2x1 and 1x2 trade between the user and one partner, stopping at the deadline
+# When no projection is negative, adding players never lowers a lineup and lineup value has diminishing returns, so a
+# trade can only help a side if some player it receives would improve that side's lineup on his own; every other player
+# is dominated and skipped. A negative projection can make dropping a starter help, so then nobody is pruned
+def partner_trades(user, partner, limits, deadline, topK):
+    userBase = limits.values(user.table[None])[0]
+    partnerBase = limits.values(partner.table[None])[0]
+    if (user.scores >= 0).all() and (partner.scores >= 0).all():
+        # Players that would improve the other side's lineup on their own
+        userWants = np.flatnonzero(_add_gains(user, partner, limits, userBase) > 0)
+        partnerWants = np.flatnonzero(_add_gains(partner, user, limits, partnerBase) > 0)
+    else:
+        userWants = np.arange(len(partner.ids))
+        partnerWants = np.arange(len(user.ids))
+    found = []
+    complete = True
+    for (giveCount, getCount) in tradeShapes:
+        gives = _combinations(partnerWants, len(user.ids), giveCount)
+        gets = _combinations(userWants, len(partner.ids), getCount)
+        if len(gives) == 0 or len(gets) == 0:
+            continue
+        # Every give combination against every get combination, scored in batches
+        (giveIndex, getIndex) = np.meshgrid(np.arange(len(gives)), np.arange(len(gets)), indexing='ij')
+        giveIndex = giveIndex.ravel()
+        getIndex = getIndex.ravel()
+        for start in range(0, len(giveIndex), batchSize):
+            if time.time() > deadline:
+                complete = False
+                break
+            give = gives[giveIndex[start:start + batchSize]]
+            get = gets[getIndex[start:start + batchSize]]
+            userGain = user.values_after(give, get, partner, limits) - userBase
+            partnerGain = partner.values_after(get, give, user, limits) - partnerBase
+            # Keep trades that improve both lineups
+            keep = np.flatnonzero((userGain > 1e-9) & (partnerGain > 1e-9))
+            for i in keep:
+                found.append((tuple(user.ids[give[i]]), tuple(partner.ids[get[i]]), userGain[i], partnerGain[i]))
+        if not complete:
+            break
+    # Best trades for the user first
+    found.sort(key=lambda trade: (-trade[2], -trade[3], trade[0], trade[1]))
+    return (found[:topK], complete)
+
+# Suggest the trades that most improve the user's starting lineup while also improving the partner's
+# df holds one row per player with franchiseID, id_mfl, pos, rosterStatus and the `how` score; only ROSTER players are traded
+# Partners are scored in this process by default, which is faster than the worker pool once the pruning has run; pass
+# maxWorkers to spread them over worker processes instead
+# Trades not scored within budgetSeconds are left out and `complete` is False
+def suggest_trades(df, user_franchise, how, startersMax, posMax, posMin, topK=10, budgetSeconds=2.0, maxWorkers=0):
+    deadline = time.time() + budgetSeconds
+    # Tradeable players: on a franchise's ROSTER with a prediction
+    players = df.loc[(df['rosterStatus'] == 'ROSTER') & df[how].notna() & (df['franchiseID'] != 'FA')]
+    (posCodes, positions) = pd.factorize(players['pos'])
+    limits = analysis.LineupLimits(positions, startersMax, posMax, posMin)
+    rosters = {}
+    for (franchiseID, rows) in players.groupby('franchiseID').indices.items():
+        rosters[franchiseID] = analysis.RosterTable(
+            players['id_mfl'].to_numpy()[rows], players[how].to_numpy(dtype='float64')[rows], posCodes[rows], len(positions)
+        )
+    user = rosters.pop(user_franchise)
+    # Score each partner in this process, or in the worker pool when maxWorkers is set
+    results = []
+    complete = True
+    if maxWorkers == 0:
+        for (partnerID, partner) in rosters.items():
+            (trades, partnerComplete) = partner_trades(user, partner, limits, deadline, topK)
+            results += [(partnerID,) + trade for trade in trades]
+            complete = complete and partnerComplete
+    else:
+        futures = {executor(maxWorkers).submit(partner_trades, user, partner, limits, deadline, topK): partnerID for (partnerID, partner) in rosters.items()}
+        try:
+            # Workers stop themselves at the deadline; the margin covers handing their results back
+            for future in as_completed(futures, timeout=max(deadline - time.time(), 0) + 1):
+                (trades, partnerComplete) = future.result()
+                results += [(futures[future],) + trade for trade in trades]
+                complete = complete and partnerComplete
+        except TimeoutError:
+            complete = False
+    # Top-k trades across all partners
+    trades = pd.DataFrame(results, columns=['partnerID', 'give', 'get', 'userGain', 'partnerGain'])
+    trades = trades.sort_values(['userGain', 'partnerGain'], ascending=False, kind='stable').head(topK).reset_index(drop=True)
+    trades.attrs['complete'] = complete
+    return trades
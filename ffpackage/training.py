@@ -0,0 +1,187 @@
+# Train the six position models from weekly stat history
+# Usage:
+#   python -m ffpackage.training onetimeData/modelSource.csv --seasons 2021 2022 [--trees 100] [--seed 0] [--workers 2] [--promote]
+# Each position's training matrix is built once per history and cached as .npy under the model directory; positions are
+# fitted in parallel processes with fixed seeds. Every run writes a versioned directory of artifacts (model, flattened
+# forest, feature schema) with fit-time and memory metrics, and --promote copies the artifacts where the scheduler loads them.
+# Import dependencies
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import resource
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+from joblib import dump
+# Internal imports
+from ffpackage import forest, features, predictions
+
+
+# Stats recorded for every player-week; the model predicts them and their averages are its features
+statColumns = predictions.labelColumns
+# Defensive stats of the opponent the player faces
+defenseColumns = [colName for colName in statColumns if colName.startswith('def')]
+# Bump to invalidate cached training matrices when the way they are built changes
+cacheVersion = 1
+
+
+# Average stats and games played per player over some seasons of history, with a suffix on every column
+def season_averages(history, seasons, suffix):
+    rows = history.loc[history['season'].isin(seasons)]
+    averages = rows.groupby('player')[statColumns].mean()
+    averages.insert(0, 'gamesPlayed', rows.groupby('player')['week'].count())
+    averages.columns = [f'{colName}_{suffix}' for colName in averages.columns]
+    return averages.reset_index()
+
+# Season-to-date averages before each week, and the games they cover, for every player-week of one season
+def to_date_averages(season):
+    season = season.sort_values(['player', 'week'], kind='stable')
+    totals = season.groupby('player')[statColumns].cumsum() - season[statColumns]
+    games = season.groupby('player').cumcount()
+    curr = totals.div(games.where(games > 0), axis=0).fillna(0)
+    curr.insert(0, 'gamesPlayed', games)
+    curr.columns = [f'{colName}_curr' for colName in curr.columns]
+    return pd.concat([season[['player', 'week']], curr], axis=1)
+
+# Model inputs and actual stats for every player-week of one season, built the way the scheduler builds player_df:
+# season-to-date, last-season and last-two-seasons averages, and the opposing defense's season-to-date and last-season
+# defensive averages
+def training_frame(history, season):
+    weeks = history.loc[history['season'] == season]
+    frame = weeks.merge(to_date_averages(weeks), how='left', on=['player', 'week'])
+    frame = frame.merge(season_averages(history, [season - 1], 'prior1'), how='left', on='player')
+    frame = frame.merge(season_averages(history, [season - 2, season - 1], 'prior2'), how='left', on='player')
+    # Players without prior data get zeros, as in the scheduler
+    priorColumns = [colName for colName in frame.columns if colName.endswith(('_curr', '_prior1', '_prior2'))]
+    frame[priorColumns] = frame[priorColumns].fillna(0)
+    # Each defense's numbers, keyed by the team it plays for, joined onto the players who face it
+    defenses = frame.loc[frame['pos'] == 'DF', ['team', 'week'] + [f'{colName}_curr' for colName in defenseColumns] + [f'{colName}_prior1' for colName in defenseColumns]]
+    defenses = defenses.drop_duplicates(subset=['team', 'week'])
+    defenses.columns = ['opponent', 'week'] + [f'{colName}_opp' for colName in defenses.columns[2:]]
+    return frame.merge(defenses, how='left', on=['opponent', 'week'])
+
+# Fixed schema of one position's model: the numeric features, pos, then all three posRank dummies
+def position_schema(pos):
+    ranks = [f'{pos}1', f'{pos}2', f'{pos}3']
+    columns = predictions.featureColumns + [f'pos_{pos}'] + [f'posRank_{rank}' for rank in ranks]
+    return features.FeatureSchema(columns, {'pos': [pos], 'posRank': ranks})
+
+# Hash of the history and the seasons trained on, which keys the cached training matrices
+def data_hash(history, seasons):
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(history, index=False).to_numpy().tobytes())
+    digest.update(json.dumps({'seasons': sorted(seasons), 'features': predictions.featureColumns, 'cacheVersion': cacheVersion}).encode())
+    return digest.hexdigest()[:16]
+
+# Build every position's training matrix for the seasons, or reuse the cached ones for the same data
+# Returns {pos: (X path, y path)}, float32 inputs in the position's schema and float64 stats
+def training_matrices(history, seasons, cacheDir):
+    missing = [colName for colName in ['season', 'week', 'team', 'opponent', 'player', 'age', 'pos', 'posRank'] + statColumns if colName not in history.columns]
+    if missing:
+        raise KeyError(f'History is missing columns: {missing}')
+    matrixDir = os.path.join(cacheDir, data_hash(history, seasons))
+    paths = {pos: (os.path.join(matrixDir, f'{pos}_X.npy'), os.path.join(matrixDir, f'{pos}_y.npy')) for pos in predictions.positions}
+    if all(os.path.exists(path) for pair in paths.values() for path in pair):
+        return paths
+    frame = pd.concat([training_frame(history, season) for season in seasons], ignore_index=True)
+    # Rows a model can use, as in predictAll: the position's three posRanks and no missing values
+    frame = frame.loc[frame[predictions.featureColumns + statColumns].notna().all(axis=1)].reset_index(drop=True)
+    source = features.FeatureSource(frame, predictions.featureColumns, ['pos', 'posRank'])
+    pos = frame['pos'].to_numpy()
+    posRank = frame['posRank'].to_numpy()
+    os.makedirs(matrixDir, exist_ok=True)
+    for p in predictions.positions:
+        rows = np.flatnonzero((pos == p) & np.isin(posRank, [f'{p}1', f'{p}2', f'{p}3']))
+        (xPath, yPath) = paths[p]
+        # Written under a temporary name first, so an interrupted build is never mistaken for a cached one
+        np.save(xPath + '.tmp.npy', position_schema(p).build(source, rows))
+        np.save(yPath + '.tmp.npy', frame[statColumns].to_numpy(dtype='float64')[rows])
+        os.replace(xPath + '.tmp.npy', xPath)
+        os.replace(yPath + '.tmp.npy', yPath)
+    return paths
+
+# Fit one position's model and write its artifacts; runs in its own process, so peak memory is the position's own
+def fit_position(pos, xPath, yPath, outDir, nTrees, seed):
+    start = time.perf_counter()
+    X = np.load(xPath, mmap_mode='r')
+    y = np.load(yPath, mmap_mode='r')
+    if len(X) == 0:
+        raise ValueError(f'No training rows for {pos}')
+    model = RandomForestRegressor(n_estimators=nTrees, random_state=seed, n_jobs=1).fit(X, y)
+    fitSeconds = time.perf_counter() - start
+    # Artifacts: the model uncompressed so it can be memory-mapped, its flattened forest and its feature schema
+    dump(model, os.path.join(outDir, f'rfmodel_{pos}1.joblib'))
+    forest.save_forest(forest.flatten_forest(model), predictions.flat_path(pos, outDir))
+    position_schema(pos).save(predictions.schema_path(pos, outDir))
+    return {
+        'rows': len(X),
+        'seed': seed,
+        'fitSeconds': round(fitSeconds, 3),
+        'peakMemoryMB': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'nodes': int(sum(estimator.tree_.node_count for estimator in model.estimators_)),
+    }
+
+# Train every position from a history frame and write a versioned artifact directory under modelDir/versions
+def train(history, seasons, modelDir=predictions.defaultModelDir, nTrees=100, seed=0, workers=None, promote=False):
+    start = time.perf_counter()
+    paths = training_matrices(history, seasons, os.path.join(modelDir, 'cache'))
+    buildSeconds = time.perf_counter() - start
+    hashKey = os.path.basename(os.path.dirname(paths[predictions.positions[0]][0]))
+    version = f'{datetime.now():%Y%m%d-%H%M%S}-{hashKey[:8]}'
+    outDir = os.path.join(modelDir, 'versions', version)
+    os.makedirs(outDir)
+    # Each position gets a fixed seed of its own and a fresh process; the biggest positions start first
+    order = sorted(predictions.positions, key=lambda pos: -os.path.getsize(paths[pos][0]))
+    metrics = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, mp_context=multiprocessing.get_context('spawn'), max_tasks_per_child=1) as executor:
+        futures = {
+            executor.submit(fit_position, pos, paths[pos][0], paths[pos][1], outDir, nTrees, seed + predictions.positions.index(pos)): pos
+            for pos in order
+        }
+        for future in as_completed(futures):
+            metrics[futures[future]] = future.result()
+    summary = {
+        'version': version,
+        'dataHash': hashKey,
+        'seasons': sorted(seasons),
+        'trees': nTrees,
+        'seed': seed,
+        'sklearn': sklearn.__version__,
+        'buildSeconds': round(buildSeconds, 3),
+        'totalSeconds': round(time.perf_counter() - start, 3),
+        'positions': {pos: metrics[pos] for pos in predictions.positions},
+    }
+    with open(os.path.join(outDir, 'metrics.json'), 'w') as metricsFile:
+        json.dump(summary, metricsFile, indent=1)
+    # Copy the artifacts where the registry loads them, model first so the exports stay newer than it
+    if promote:
+        for pos in predictions.positions:
+            for fileName in [f'rfmodel_{pos}1.joblib', f'rfmodel_{pos}1.flat.joblib', f'rfmodel_{pos}1.schema.json']:
+                shutil.copy2(os.path.join(outDir, fileName), os.path.join(modelDir, fileName))
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the position models from weekly stat history')
+    parser.add_argument('history', help='CSV with one row per player-week: season, week, team, opponent, player, age, pos, posRank and the stats')
+    parser.add_argument('--seasons', type=int, nargs='+', required=True, help='Seasons to train on; the two before each are its priors')
+    parser.add_argument('--model-dir', default=predictions.defaultModelDir)
+    parser.add_argument('--trees', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--promote', action='store_true', help='Copy the new artifacts into the model directory')
+    args = parser.parse_args()
+
+    history = pd.read_csv(args.history, index_col=0)
+    summary = train(history, args.seasons, args.model_dir, args.trees, args.seed, args.workers, args.promote)
+    print(f"{summary['version']}: matrices {summary['buildSeconds']:.1f}s, total {summary['totalSeconds']:.1f}s")
+    for (pos, positionMetrics) in summary['positions'].items():
+        print(f"  {pos}  {positionMetrics['rows']:>7,} rows  fit {positionMetrics['fitSeconds']:>7.1f}s  peak {positionMetrics['peakMemoryMB']:>7.1f} MB")
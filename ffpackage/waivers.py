@@ -0,0 +1,59 @@
+# Import dependencies
+import numpy as np
+import pandas as pd
+# Internal imports
+from ffpackage import analysis
+
+
+# Free agents scored per batch, to bound the size of the (free agents x roster) table batch
+batchSize = 256
+
+# Rank free agents by how much they would improve a franchise's starting lineup
+# For each free agent: the gain from just adding him, and the gain from adding him and dropping the best drop candidate
+# (the rostered player whose loss hurts the new lineup least). Every (free agent, drop) pair is scored in one batch per chunk.
+# df holds one row per player with franchiseID, id_mfl, pos, rosterStatus and the `how` score; free agents have franchiseID "FA"
+def rank_freeAgents(df, user_franchise, how, startersMax, posMax, posMin, topK=10):
+    # The franchise's lineup-eligible players and the free agents with a prediction
+    roster = df.loc[(df['franchiseID'] == user_franchise) & (df['rosterStatus'] == 'ROSTER') & df[how].notna()]
+    freeAgents = df.loc[(df['franchiseID'] == 'FA') & df[how].notna()]
+    (posCodes, positions) = pd.factorize(pd.concat([roster['pos'], freeAgents['pos']]))
+    limits = analysis.LineupLimits(positions, startersMax, posMax, posMin)
+    user = analysis.RosterTable(roster['id_mfl'].to_numpy(), roster[how].to_numpy(dtype='float64'), posCodes[:len(roster)], len(positions))
+    pool = analysis.RosterTable(freeAgents['id_mfl'].to_numpy(), freeAgents[how].to_numpy(dtype='float64'), posCodes[len(roster):], len(positions))
+    baseValue = limits.values(user.table[None])[0]
+    nFree = len(freeAgents)
+    nRoster = len(roster)
+    addGain = np.zeros(nFree)
+    dropGain = np.full(nFree, -np.inf)
+    dropIndex = np.full(nFree, -1)
+    for start in range(0, nFree, batchSize):
+        chunk = np.arange(start, min(start + batchSize, nFree))
+        # Gain from adding each free agent without a drop
+        addGain[chunk] = user.values_after(np.empty((len(chunk), 0), dtype='int64'), chunk[:, None], pool, limits) - baseValue
+        if nRoster == 0:
+            continue
+        # Gain from every (free agent, dropped player) pair, laid out free agent major
+        joining = np.repeat(chunk, nRoster)[:, None]
+        leaving = np.tile(np.arange(nRoster), len(chunk))[:, None]
+        swapGain = (user.values_after(leaving, joining, pool, limits) - baseValue).reshape(len(chunk), nRoster)
+        # Best drop candidate for each free agent
+        dropIndex[chunk] = swapGain.argmax(axis=1)
+        dropGain[chunk] = swapGain[np.arange(len(chunk)), dropIndex[chunk]]
+    # Top-k free agents by gain with a drop (a full roster must drop someone); argpartition finds them without a full sort
+    ranking = dropGain if nRoster else addGain
+    k = min(topK, nFree)
+    if k == 0:
+        top = np.empty(0, dtype='int64')
+    else:
+        top = np.argpartition(-ranking, k - 1)[:k]
+        top = top[np.lexsort((pool.ids[top].astype(str), -ranking[top]))]
+    # Summary table
+    ranked = pd.DataFrame({
+        'id_mfl': pool.ids[top],
+        'pos': positions[pool.posCodes[top]],
+        how: pool.scores[top],
+        'addGain': addGain[top],
+        'dropID': user.ids[dropIndex[top]] if nRoster else None,
+        'dropGain': dropGain[top] if nRoster else np.nan,
+    })
+    return ranked
@@ -0,0 +1,70 @@
+# Import dependencies
+import io
+import xml.etree.ElementTree as ET
+import pandas as pd
+
+
+# Stream an xml response and collect one row per recordTag element straight into column lists
+# The document is read with iterparse and every element is cleared once it has been handled, so the full tree is never built
+#   columns: {output column: attribute of the record element}
+#   parents: {enclosing tag: {output column: attribute of the enclosing element}}
+#            the pseudo-attribute "#" gives the 0-based position of the enclosing element in the document
+#            records are only kept while every listed parent tag is open (e.g. players inside a matchup's franchise)
+#   children: {output column: tag of a child element of the record} whose text is read (e.g. <rule><event>PY</event></rule>)
+#   dtypes:  {output column: pandas dtype} applied to the finished DataFrame
+def parse_records(content, recordTag, columns, parents=None, dtypes=None, children=None):
+    parents = parents or {}
+    children = children or {}
+    # One list per output column, in output order: record columns, then child columns, then parent columns
+    data = {name: [] for name in columns}
+    for name in children:
+        data[name] = []
+    for parentColumns in parents.values():
+        for name in parentColumns:
+            data[name] = []
+    # Current values of the parent columns, and how many parent tags are currently open
+    context = {}
+    openParents = 0
+    parentCounts = {tag: 0 for tag in parents}
+    # Track depth so the root can drop each finished top-level child
+    root = None
+    depth = 0
+    # Elements inside an open record are kept until the record ends, so its children can still be read
+    openRecords = 0
+    for (event, elem) in ET.iterparse(io.BytesIO(content), events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            if elem.tag == recordTag:
+                openRecords += 1
+            if elem.tag in parents:
+                for (name, attribute) in parents[elem.tag].items():
+                    context[name] = parentCounts[elem.tag] if attribute == "#" else elem.get(attribute)
+                parentCounts[elem.tag] += 1
+                openParents += 1
+            continue
+        # End of an element: all of its attributes and children are available now
+        depth -= 1
+        if elem.tag == recordTag:
+            openRecords -= 1
+            if openParents == len(parents):
+                for (name, attribute) in columns.items():
+                    data[name].append(elem.get(attribute))
+                for (name, childTag) in children.items():
+                    data[name].append(elem.findtext(childTag))
+                for parentColumns in parents.values():
+                    for name in parentColumns:
+                        data[name].append(context[name])
+        elif elem.tag in parents:
+            openParents -= 1
+        # Free the element; once a top-level child is finished, drop it from the root as well
+        if openRecords == 0:
+            elem.clear()
+        if depth == 1:
+            root.clear()
+    # Build the DataFrame directly from the column lists
+    df = pd.DataFrame(data)
+    if dtypes:
+        df = df.astype(dtypes)
+    return df
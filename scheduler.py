@@ -35,6 +35,9 @@ from joblib import dump, load
 
 # Internal imports
 from db import get_df
+from ffpackage import mfl
+from ffpackage.predictions import predictAll
+from appmanager import db, snapshot
 
 # Find environment variables
 DATABASE_URL = os.environ.get("DATABASE_URL", None)
@@ -85,31 +88,23 @@ adp_df['ADP'] = adp_df['ADP'].astype('float32')
 # Get player ages
 # Get any player dobs who are already in the db
 player_dobs = get_df('player_dobs')
+# Rows saved without a dob by earlier runs are ignored, so those players are looked up again
+player_dobs = player_dobs.loc[player_dobs['DOB'].notna()]
 # Check for any players whose ages are not already in the db
 to_query_age = scrape1[~scrape1['PlayerID'].isin(player_dobs['PlayerID'])]
 if len(to_query_age)>0:
-    # Break player list into chunks small enough for the API server
-    n = 50  #chunk row size
-    list_df = [to_query_age.PlayerID[i:i+n] for i in range(0,to_query_age.PlayerID.shape[0],n)]
-
-    for i in range(len(list_df)):
-        idList = ",".join(list_df[i])
-
-        # Get playerProfiles
-        urlString = f"https://api.myfantasyleague.com/2022/export?TYPE=playerProfile&P={idList}"
-        response = requests.get(urlString)
-        soup = BeautifulSoup(response.content,'xml')
-        data = []
-        profiles = soup.find_all('playerProfile')
-        players = soup.find_all('player')
-        for i in range(len(profiles)):
-            rows = [profiles[i].get("id"), players[i].get("dob")]
-            data.append(rows)
-        data_df = pd.DataFrame(data)
-        age = pd.DataFrame(columns=['PlayerID', 'DOB'])
-        age['PlayerID'] = data_df[0]
-        age['DOB'] = data_df[1]
-        player_dobs = player_dobs.append(age)
+    # Save each chunk of newly fetched DOBs as soon as it arrives, so every player with a dob is only ever looked up once
+    def save_dobs(chunk):
+        chunk = chunk.rename(columns={'id_mfl':'PlayerID', 'dob':'DOB'})
+        db.append_df(chunk, 'player_dobs')
+    # Fetch playerProfiles in parallel chunks of 50; players without a dob are not saved, so they are looked up again next run
+    (new_dobs, failed_ids, empty_ids) = mfl.fetch_playerProfiles(to_query_age['PlayerID'], chunkSize=50, onChunk=save_dobs)
+    if failed_ids:
+        print(f"playerProfiles failed for {len(failed_ids)} players; they will be fetched on the next run")
+    if empty_ids:
+        print(f"No dob on MFL for {len(empty_ids)} players")
+    new_dobs = new_dobs.rename(columns={'id_mfl':'PlayerID', 'dob':'DOB'})
+    player_dobs = pd.concat([player_dobs, new_dobs], axis=0, ignore_index=True)
 
 # Convert string to datetime
 player_dobs['DOB'] = pd.to_datetime(player_dobs['DOB'])
@@ -494,602 +489,8 @@ player_df = player_df[[
     'defYdsAgainst_prior1_opp']]
 
 # %%
-labels = [
-    'passA', 'passC', 'passY', 'passT', 'passI', 'pass2', 
-    'rushA', 'rushY', 'rushT', 'rush2', 
-    'recC', 'recY', 'recT', 'rec2', 'fum', 
-    'XPA', 'XPM', 'FGA', 'FGM', 'FG50', 
-    'defSack', 'defI', 'defSaf', 'defFum', 'defBlk', 'defT', 
-    'defPtsAgainst', 'defPassYAgainst', 'defRushYAgainst', 'defYdsAgainst'  
-]
-
-features = [
-    'week', 'age', 
-    'passA_curr', 'passC_curr', 'passY_curr', 'passT_curr', 'passI_curr', 'pass2_curr', 
-    'rushA_curr', 'rushY_curr', 'rushT_curr', 'rush2_curr', 
-    'recC_curr', 'recY_curr', 'recT_curr', 'rec2_curr', 'fum_curr', 
-    'XPA_curr', 'XPM_curr', 'FGA_curr', 'FGM_curr', 'FG50_curr', 
-    'defSack_curr', 'defI_curr', 'defSaf_curr', 'defFum_curr', 'defBlk_curr', 'defT_curr', 
-    'defPtsAgainst_curr', 'defPassYAgainst_curr', 'defRushYAgainst_curr', 'defYdsAgainst_curr', 
-    'gamesPlayed_curr', 
-    'gamesPlayed_prior1', 
-    'passA_prior1', 'passC_prior1', 'passY_prior1', 'passT_prior1', 'passI_prior1', 'pass2_prior1', 
-    'rushA_prior1', 'rushY_prior1', 'rushT_prior1', 'rush2_prior1', 
-    'recC_prior1', 'recY_prior1', 'recT_prior1', 'rec2_prior1', 'fum_prior1', 
-    'XPA_prior1', 'XPM_prior1', 'FGA_prior1', 'FGM_prior1', 'FG50_prior1', 
-    'defSack_prior1', 'defI_prior1', 'defSaf_prior1', 'defFum_prior1', 'defBlk_prior1', 'defT_prior1', 
-    'defPtsAgainst_prior1', 'defPassYAgainst_prior1', 'defRushYAgainst_prior1', 'defYdsAgainst_prior1', 
-    'gamesPlayed_prior2', 
-    'passA_prior2', 'passC_prior2', 'passY_prior2', 'passT_prior2', 'passI_prior2', 'pass2_prior2', 
-    'rushA_prior2', 'rushY_prior2', 'rushT_prior2', 'rush2_prior2', 
-    'recC_prior2', 'recY_prior2', 'recT_prior2', 'rec2_prior2', 'fum_prior2', 
-    'XPA_prior2', 'XPM_prior2', 'FGA_prior2', 'FGM_prior2', 'FG50_prior2', 
-    'defSack_prior2', 'defI_prior2', 'defSaf_prior2', 'defFum_prior2', 'defBlk_prior2', 'defT_prior2', 
-    'defPtsAgainst_prior2', 'defPassYAgainst_prior2', 'defRushYAgainst_prior2', 'defYdsAgainst_prior2', 
-    'defSack_curr_opp', 'defI_curr_opp', 'defSaf_curr_opp', 'defFum_curr_opp', 'defBlk_curr_opp', 'defT_curr_opp', 
-    'defPtsAgainst_curr_opp', 'defPassYAgainst_curr_opp', 'defRushYAgainst_curr_opp', 'defYdsAgainst_curr_opp', 
-    'defSack_prior1_opp', 'defI_prior1_opp', 'defSaf_prior1_opp', 'defFum_prior1_opp', 'defBlk_prior1_opp', 'defT_prior1_opp', 
-    'defPtsAgainst_prior1_opp', 'defPassYAgainst_prior1_opp', 'defRushYAgainst_prior1_opp', 'defYdsAgainst_prior1_opp', 
-    'pos', 'posRank'
-]
-
-
-# %%
-### WR Predictions
-# Read player model and ages
-xl2 = player_df.copy()
-# Select only one player position
-xl2 = xl2.loc[xl2.posRank.isin(['WR1', 'WR2', 'WR3'])]
-xl2 = xl2.loc[xl2.pos=='WR']
-xl2 = xl2.dropna()
-xl2.reset_index(inplace=True, drop=True)
-
-# Select features
-X = xl2[features]
-header = xl2[[
-    'id_mfl',
-    'season',
-    'week',
-    'team',
-    'player',
-    'age',
-    'sharkRank', 
-    'adp',
-    'KR',
-    'PR',
-    'RES',
-    'pos',
-    'posRank',
-    'opponent'
-]]
-
-# Encode categorical features
-X = pd.get_dummies(X, columns = ['pos', 'posRank'])
-
-# Check if there were the correct number of posRanks in the dataset
-for rank in ["posRank_WR1", "posRank_WR2", "posRank_WR3"]:
-    if rank not in list(X.columns):
-        X[rank] = 0
-
-# Make sure we have the necessary columns
-X = X[['week', 'age', 'passA_curr', 'passC_curr', 'passY_curr', 'passT_curr', 'passI_curr', 'pass2_curr', 'rushA_curr', 'rushY_curr', 
-'rushT_curr', 'rush2_curr', 'recC_curr', 'recY_curr', 'recT_curr', 'rec2_curr', 'fum_curr', 'XPA_curr', 'XPM_curr', 'FGA_curr', 'FGM_curr', 
-'FG50_curr', 'defSack_curr', 'defI_curr', 'defSaf_curr', 'defFum_curr', 'defBlk_curr', 'defT_curr', 'defPtsAgainst_curr', 
-'defPassYAgainst_curr', 'defRushYAgainst_curr', 'defYdsAgainst_curr', 'gamesPlayed_curr', 'gamesPlayed_prior1', 'passA_prior1', 
-'passC_prior1', 'passY_prior1', 'passT_prior1', 'passI_prior1', 'pass2_prior1', 'rushA_prior1', 'rushY_prior1', 'rushT_prior1', 
-'rush2_prior1', 'recC_prior1', 'recY_prior1', 'recT_prior1', 'rec2_prior1', 'fum_prior1', 'XPA_prior1', 'XPM_prior1', 'FGA_prior1', 
-'FGM_prior1', 'FG50_prior1', 'defSack_prior1', 'defI_prior1', 'defSaf_prior1', 'defFum_prior1', 'defBlk_prior1', 'defT_prior1', 
-'defPtsAgainst_prior1', 'defPassYAgainst_prior1', 'defRushYAgainst_prior1', 'defYdsAgainst_prior1', 'gamesPlayed_prior2', 'passA_prior2', 
-'passC_prior2', 'passY_prior2', 'passT_prior2', 'passI_prior2', 'pass2_prior2', 'rushA_prior2', 'rushY_prior2', 'rushT_prior2', 
-'rush2_prior2', 'recC_prior2', 'recY_prior2', 'recT_prior2', 'rec2_prior2', 'fum_prior2', 'XPA_prior2', 'XPM_prior2', 'FGA_prior2', 
-'FGM_prior2', 'FG50_prior2', 'defSack_prior2', 'defI_prior2', 'defSaf_prior2', 'defFum_prior2', 'defBlk_prior2', 'defT_prior2', 
-'defPtsAgainst_prior2', 'defPassYAgainst_prior2', 'defRushYAgainst_prior2', 'defYdsAgainst_prior2', 'defSack_curr_opp', 'defI_curr_opp', 
-'defSaf_curr_opp', 'defFum_curr_opp', 'defBlk_curr_opp', 'defT_curr_opp', 'defPtsAgainst_curr_opp', 'defPassYAgainst_curr_opp', 
-'defRushYAgainst_curr_opp', 'defYdsAgainst_curr_opp', 'defSack_prior1_opp', 'defI_prior1_opp', 'defSaf_prior1_opp', 'defFum_prior1_opp', 
-'defBlk_prior1_opp', 'defT_prior1_opp', 'defPtsAgainst_prior1_opp', 'defPassYAgainst_prior1_opp', 'defRushYAgainst_prior1_opp', 
-'defYdsAgainst_prior1_opp', 'pos_WR', 'posRank_WR1', 'posRank_WR2', 'posRank_WR3']]
-
-#load saved model
-regressor = load('models/rfmodel_WR1.joblib')
-
-# Run model
-y_pred = regressor.predict(X)
-y_pred = pd.DataFrame(y_pred)
-y_pred.columns = labels
-y_pred
-
-# Calculate FANTASY scores
-# Define scoring multiplier based on league settings
-multiplier = [
-    0,0,.04,4,-2,2,.1,.1,6,2,.25,.1,6,2,-2,0,1,0,3,5,1,2,2,2,1.5,6,0,0,0,0,1,1
-]
-# Define bins for defensive PointsAgainst and YardsAgainst based on MFL scoring categories
-binList_defPts = [-5,0,6,13,17,21,27,34,45,59,99]
-binList_defYds = [0,274,324,375,425,999]
-# Define correlating scores for defensive PointsAgainst and YardsAgainst based on league settings
-ptList_defPts = [10,8,7,5,3,2,0,-1,-3,-5]
-ptList_defYds = [5,2,0,-2,-5]
-# Bin and cut the defensive predictions
-y_pred['defPtsBin'] = pd.cut(y_pred['defPtsAgainst'], bins=binList_defPts, include_lowest=True, labels=ptList_defPts)
-y_pred['defYdsBin'] = pd.cut(y_pred['defYdsAgainst'], bins=binList_defYds, include_lowest=True, labels=ptList_defYds)
-# Merge predictions with header columns so we know the players' position
-a_pred = header.merge(y_pred, left_index=True, right_index=True)
-# Assign value of zero to all non-defensive players' bins
-a_pred.loc[a_pred['pos']!='DF', 'defPtsBin'] = 0
-a_pred.loc[a_pred['pos']!='DF', 'defYdsBin'] = 0
-# Drop the header columns again
-a_pred = a_pred.drop(columns=['id_mfl', 'week','season','team','player','age','sharkRank','adp','pos','KR','PR','RES','posRank','opponent'])
-# Create function to apply scoring multiplier
-def multer(row):
-    return row.multiply(multiplier)
-# Apply scoring multiplier to predictions
-c = a_pred.apply(multer, axis=1)
-c = c.apply(np.sum, axis=1)
-c = pd.DataFrame(c, columns=['pred'])
-
-# Merge header columns with predictions
-WRdf = header.merge(c, left_index=True, right_index=True)
-
-# %%
-### RB Predictions
-# Read player model and ages
-xl2 = player_df.copy()
-# Select only one player position
-xl2 = xl2.loc[xl2.posRank.isin(['RB1', 'RB2', 'RB3'])]
-xl2 = xl2.loc[xl2.pos=='RB']
-xl2 = xl2.dropna()
-xl2.reset_index(inplace=True, drop=True)
-
-# Select features
-X = xl2[features]
-header = xl2[[
-    'id_mfl',
-    'season',
-    'week',
-    'team',
-    'player',
-    'age',
-    'sharkRank', 
-    'adp',
-    'KR',
-    'PR',
-    'RES',
-    'pos',
-    'posRank',
-    'opponent'
-]]
-
-# Encode categorical features
-X = pd.get_dummies(X, columns = ['pos', 'posRank'])
-
-# Check if there were the correct number of posRanks in the dataset
-for rank in ["posRank_RB1", "posRank_RB2", "posRank_RB3"]:
-    if rank not in list(X.columns):
-        X[rank] = 0
-
-# Make sure we have the necessary columns
-X = X[['week', 'age', 'passA_curr', 'passC_curr', 'passY_curr', 'passT_curr', 'passI_curr', 'pass2_curr', 'rushA_curr', 'rushY_curr', 
-'rushT_curr', 'rush2_curr', 'recC_curr', 'recY_curr', 'recT_curr', 'rec2_curr', 'fum_curr', 'XPA_curr', 'XPM_curr', 'FGA_curr', 'FGM_curr', 
-'FG50_curr', 'defSack_curr', 'defI_curr', 'defSaf_curr', 'defFum_curr', 'defBlk_curr', 'defT_curr', 'defPtsAgainst_curr', 
-'defPassYAgainst_curr', 'defRushYAgainst_curr', 'defYdsAgainst_curr', 'gamesPlayed_curr', 'gamesPlayed_prior1', 'passA_prior1', 
-'passC_prior1', 'passY_prior1', 'passT_prior1', 'passI_prior1', 'pass2_prior1', 'rushA_prior1', 'rushY_prior1', 'rushT_prior1', 
-'rush2_prior1', 'recC_prior1', 'recY_prior1', 'recT_prior1', 'rec2_prior1', 'fum_prior1', 'XPA_prior1', 'XPM_prior1', 'FGA_prior1', 
-'FGM_prior1', 'FG50_prior1', 'defSack_prior1', 'defI_prior1', 'defSaf_prior1', 'defFum_prior1', 'defBlk_prior1', 'defT_prior1', 
-'defPtsAgainst_prior1', 'defPassYAgainst_prior1', 'defRushYAgainst_prior1', 'defYdsAgainst_prior1', 'gamesPlayed_prior2', 'passA_prior2', 
-'passC_prior2', 'passY_prior2', 'passT_prior2', 'passI_prior2', 'pass2_prior2', 'rushA_prior2', 'rushY_prior2', 'rushT_prior2', 
-'rush2_prior2', 'recC_prior2', 'recY_prior2', 'recT_prior2', 'rec2_prior2', 'fum_prior2', 'XPA_prior2', 'XPM_prior2', 'FGA_prior2', 
-'FGM_prior2', 'FG50_prior2', 'defSack_prior2', 'defI_prior2', 'defSaf_prior2', 'defFum_prior2', 'defBlk_prior2', 'defT_prior2', 
-'defPtsAgainst_prior2', 'defPassYAgainst_prior2', 'defRushYAgainst_prior2', 'defYdsAgainst_prior2', 'defSack_curr_opp', 'defI_curr_opp', 
-'defSaf_curr_opp', 'defFum_curr_opp', 'defBlk_curr_opp', 'defT_curr_opp', 'defPtsAgainst_curr_opp', 'defPassYAgainst_curr_opp', 
-'defRushYAgainst_curr_opp', 'defYdsAgainst_curr_opp', 'defSack_prior1_opp', 'defI_prior1_opp', 'defSaf_prior1_opp', 'defFum_prior1_opp', 
-'defBlk_prior1_opp', 'defT_prior1_opp', 'defPtsAgainst_prior1_opp', 'defPassYAgainst_prior1_opp', 'defRushYAgainst_prior1_opp', 
-'defYdsAgainst_prior1_opp', 'pos_RB', 'posRank_RB1', 'posRank_RB2', 'posRank_RB3']]
-
-#load saved model
-regressor = load('models/rfmodel_RB1.joblib')
-
-# Run model
-y_pred = regressor.predict(X)
-y_pred = pd.DataFrame(y_pred)
-y_pred.columns = labels
-y_pred
-
-# Calculate FANTASY scores
-# Define scoring multiplier based on league settings
-multiplier = [
-    0,0,.04,4,-2,2,.1,.1,6,2,.25,.1,6,2,-2,0,1,0,3,5,1,2,2,2,1.5,6,0,0,0,0,1,1
-]
-# Define bins for defensive PointsAgainst and YardsAgainst based on MFL scoring categories
-binList_defPts = [-5,0,6,13,17,21,27,34,45,59,99]
-binList_defYds = [0,274,324,375,425,999]
-# Define correlating scores for defensive PointsAgainst and YardsAgainst based on league settings
-ptList_defPts = [10,8,7,5,3,2,0,-1,-3,-5]
-ptList_defYds = [5,2,0,-2,-5]
-# Bin and cut the defensive predictions
-y_pred['defPtsBin'] = pd.cut(y_pred['defPtsAgainst'], bins=binList_defPts, include_lowest=True, labels=ptList_defPts)
-y_pred['defYdsBin'] = pd.cut(y_pred['defYdsAgainst'], bins=binList_defYds, include_lowest=True, labels=ptList_defYds)
-# Merge predictions with header columns so we know the players' position
-a_pred = header.merge(y_pred, left_index=True, right_index=True)
-# Assign value of zero to all non-defensive players' bins
-a_pred.loc[a_pred['pos']!='DF', 'defPtsBin'] = 0
-a_pred.loc[a_pred['pos']!='DF', 'defYdsBin'] = 0
-# Drop the header columns again
-a_pred = a_pred.drop(columns=['id_mfl', 'week','season','team','player','age','sharkRank','adp','pos','KR','PR','RES','posRank','opponent'])
-# Create function to apply scoring multiplier
-def multer(row):
-    return row.multiply(multiplier)
-# Apply scoring multiplier to predictions
-c = a_pred.apply(multer, axis=1)
-c = c.apply(np.sum, axis=1)
-c = pd.DataFrame(c, columns=['pred'])
-
-# Merge header columns with predictions
-RBdf = header.merge(c, left_index=True, right_index=True)
-
-# %%
-### QB Predictions
-# Read player model and ages
-xl2 = player_df.copy()
-# Select only one player position
-xl2 = xl2.loc[xl2.posRank.isin(['QB1', 'QB2', 'QB3'])]
-xl2 = xl2.loc[xl2.pos=='QB']
-xl2 = xl2.dropna()
-xl2.reset_index(inplace=True, drop=True)
-
-# Select features
-X = xl2[features]
-header = xl2[[
-    'id_mfl',
-    'season',
-    'week',
-    'team',
-    'player',
-    'age',
-    'sharkRank', 
-    'adp',
-    'KR',
-    'PR',
-    'RES',
-    'pos',
-    'posRank',
-    'opponent'
-]]
-
-# Encode categorical features
-X = pd.get_dummies(X, columns = ['pos', 'posRank'])
-
-# Check if there were the correct number of posRanks in the dataset
-for rank in ["posRank_QB1", "posRank_QB2", "posRank_QB3"]:
-    if rank not in list(X.columns):
-        X[rank] = 0
-
-# Make sure we have the necessary columns
-X = X[['week', 'age', 'passA_curr', 'passC_curr', 'passY_curr', 'passT_curr', 'passI_curr', 'pass2_curr', 'rushA_curr', 'rushY_curr', 
-'rushT_curr', 'rush2_curr', 'recC_curr', 'recY_curr', 'recT_curr', 'rec2_curr', 'fum_curr', 'XPA_curr', 'XPM_curr', 'FGA_curr', 'FGM_curr', 
-'FG50_curr', 'defSack_curr', 'defI_curr', 'defSaf_curr', 'defFum_curr', 'defBlk_curr', 'defT_curr', 'defPtsAgainst_curr', 
-'defPassYAgainst_curr', 'defRushYAgainst_curr', 'defYdsAgainst_curr', 'gamesPlayed_curr', 'gamesPlayed_prior1', 'passA_prior1', 
-'passC_prior1', 'passY_prior1', 'passT_prior1', 'passI_prior1', 'pass2_prior1', 'rushA_prior1', 'rushY_prior1', 'rushT_prior1', 
-'rush2_prior1', 'recC_prior1', 'recY_prior1', 'recT_prior1', 'rec2_prior1', 'fum_prior1', 'XPA_prior1', 'XPM_prior1', 'FGA_prior1', 
-'FGM_prior1', 'FG50_prior1', 'defSack_prior1', 'defI_prior1', 'defSaf_prior1', 'defFum_prior1', 'defBlk_prior1', 'defT_prior1', 
-'defPtsAgainst_prior1', 'defPassYAgainst_prior1', 'defRushYAgainst_prior1', 'defYdsAgainst_prior1', 'gamesPlayed_prior2', 'passA_prior2', 
-'passC_prior2', 'passY_prior2', 'passT_prior2', 'passI_prior2', 'pass2_prior2', 'rushA_prior2', 'rushY_prior2', 'rushT_prior2', 
-'rush2_prior2', 'recC_prior2', 'recY_prior2', 'recT_prior2', 'rec2_prior2', 'fum_prior2', 'XPA_prior2', 'XPM_prior2', 'FGA_prior2', 
-'FGM_prior2', 'FG50_prior2', 'defSack_prior2', 'defI_prior2', 'defSaf_prior2', 'defFum_prior2', 'defBlk_prior2', 'defT_prior2', 
-'defPtsAgainst_prior2', 'defPassYAgainst_prior2', 'defRushYAgainst_prior2', 'defYdsAgainst_prior2', 'defSack_curr_opp', 'defI_curr_opp', 
-'defSaf_curr_opp', 'defFum_curr_opp', 'defBlk_curr_opp', 'defT_curr_opp', 'defPtsAgainst_curr_opp', 'defPassYAgainst_curr_opp', 
-'defRushYAgainst_curr_opp', 'defYdsAgainst_curr_opp', 'defSack_prior1_opp', 'defI_prior1_opp', 'defSaf_prior1_opp', 'defFum_prior1_opp', 
-'defBlk_prior1_opp', 'defT_prior1_opp', 'defPtsAgainst_prior1_opp', 'defPassYAgainst_prior1_opp', 'defRushYAgainst_prior1_opp', 
-'defYdsAgainst_prior1_opp', 'pos_QB', 'posRank_QB1', 'posRank_QB2', 'posRank_QB3']]
-
-#load saved model
-regressor = load('models/rfmodel_QB1.joblib')
-
-# Run model
-y_pred = regressor.predict(X)
-y_pred = pd.DataFrame(y_pred)
-y_pred.columns = labels
-y_pred
-
-# Calculate FANTASY scores
-# Define scoring multiplier based on league settings
-multiplier = [
-    0,0,.04,4,-2,2,.1,.1,6,2,.25,.1,6,2,-2,0,1,0,3,5,1,2,2,2,1.5,6,0,0,0,0,1,1
-]
-# Define bins for defensive PointsAgainst and YardsAgainst based on MFL scoring categories
-binList_defPts = [-5,0,6,13,17,21,27,34,45,59,99]
-binList_defYds = [0,274,324,375,425,999]
-# Define correlating scores for defensive PointsAgainst and YardsAgainst based on league settings
-ptList_defPts = [10,8,7,5,3,2,0,-1,-3,-5]
-ptList_defYds = [5,2,0,-2,-5]
-# Bin and cut the defensive predictions
-y_pred['defPtsBin'] = pd.cut(y_pred['defPtsAgainst'], bins=binList_defPts, include_lowest=True, labels=ptList_defPts)
-y_pred['defYdsBin'] = pd.cut(y_pred['defYdsAgainst'], bins=binList_defYds, include_lowest=True, labels=ptList_defYds)
-# Merge predictions with header columns so we know the players' position
-a_pred = header.merge(y_pred, left_index=True, right_index=True)
-# Assign value of zero to all non-defensive players' bins
-a_pred.loc[a_pred['pos']!='DF', 'defPtsBin'] = 0
-a_pred.loc[a_pred['pos']!='DF', 'defYdsBin'] = 0
-# Drop the header columns again
-a_pred = a_pred.drop(columns=['id_mfl', 'week','season','team','player','age','sharkRank','adp','pos','KR','PR','RES','posRank','opponent'])
-# Create function to apply scoring multiplier
-def multer(row):
-    return row.multiply(multiplier)
-# Apply scoring multiplier to predictions
-c = a_pred.apply(multer, axis=1)
-c = c.apply(np.sum, axis=1)
-c = pd.DataFrame(c, columns=['pred'])
-
-# Merge header columns with predictions
-QBdf = header.merge(c, left_index=True, right_index=True)
-
-# %%
-### TE Predictions
-# Read player model and ages
-xl2 = player_df.copy()
-# Select only one player position
-xl2 = xl2.loc[xl2.posRank.isin(['TE1', 'TE2', 'TE3'])]
-xl2 = xl2.loc[xl2.pos=='TE']
-xl2 = xl2.dropna()
-xl2.reset_index(inplace=True, drop=True)
-
-# Select features
-X = xl2[features]
-header = xl2[[
-    'id_mfl',
-    'season',
-    'week',
-    'team',
-    'player',
-    'age',
-    'sharkRank', 
-    'adp',
-    'KR',
-    'PR',
-    'RES',
-    'pos',
-    'posRank',
-    'opponent'
-]]
-
-# Encode categorical features
-X = pd.get_dummies(X, columns = ['pos', 'posRank'])
-
-# Check if there were the correct number of posRanks in the dataset
-for rank in ["posRank_TE1", "posRank_TE2", "posRank_TE3"]:
-    if rank not in list(X.columns):
-        X[rank] = 0
-
-# Make sure we have the necessary columns
-X = X[['week', 'age', 'passA_curr', 'passC_curr', 'passY_curr', 'passT_curr', 'passI_curr', 'pass2_curr', 'rushA_curr', 'rushY_curr', 
-'rushT_curr', 'rush2_curr', 'recC_curr', 'recY_curr', 'recT_curr', 'rec2_curr', 'fum_curr', 'XPA_curr', 'XPM_curr', 'FGA_curr', 'FGM_curr', 
-'FG50_curr', 'defSack_curr', 'defI_curr', 'defSaf_curr', 'defFum_curr', 'defBlk_curr', 'defT_curr', 'defPtsAgainst_curr', 
-'defPassYAgainst_curr', 'defRushYAgainst_curr', 'defYdsAgainst_curr', 'gamesPlayed_curr', 'gamesPlayed_prior1', 'passA_prior1', 
-'passC_prior1', 'passY_prior1', 'passT_prior1', 'passI_prior1', 'pass2_prior1', 'rushA_prior1', 'rushY_prior1', 'rushT_prior1', 
-'rush2_prior1', 'recC_prior1', 'recY_prior1', 'recT_prior1', 'rec2_prior1', 'fum_prior1', 'XPA_prior1', 'XPM_prior1', 'FGA_prior1', 
-'FGM_prior1', 'FG50_prior1', 'defSack_prior1', 'defI_prior1', 'defSaf_prior1', 'defFum_prior1', 'defBlk_prior1', 'defT_prior1', 
-'defPtsAgainst_prior1', 'defPassYAgainst_prior1', 'defRushYAgainst_prior1', 'defYdsAgainst_prior1', 'gamesPlayed_prior2', 'passA_prior2', 
-'passC_prior2', 'passY_prior2', 'passT_prior2', 'passI_prior2', 'pass2_prior2', 'rushA_prior2', 'rushY_prior2', 'rushT_prior2', 
-'rush2_prior2', 'recC_prior2', 'recY_prior2', 'recT_prior2', 'rec2_prior2', 'fum_prior2', 'XPA_prior2', 'XPM_prior2', 'FGA_prior2', 
-'FGM_prior2', 'FG50_prior2', 'defSack_prior2', 'defI_prior2', 'defSaf_prior2', 'defFum_prior2', 'defBlk_prior2', 'defT_prior2', 
-'defPtsAgainst_prior2', 'defPassYAgainst_prior2', 'defRushYAgainst_prior2', 'defYdsAgainst_prior2', 'defSack_curr_opp', 'defI_curr_opp', 
-'defSaf_curr_opp', 'defFum_curr_opp', 'defBlk_curr_opp', 'defT_curr_opp', 'defPtsAgainst_curr_opp', 'defPassYAgainst_curr_opp', 
-'defRushYAgainst_curr_opp', 'defYdsAgainst_curr_opp', 'defSack_prior1_opp', 'defI_prior1_opp', 'defSaf_prior1_opp', 'defFum_prior1_opp', 
-'defBlk_prior1_opp', 'defT_prior1_opp', 'defPtsAgainst_prior1_opp', 'defPassYAgainst_prior1_opp', 'defRushYAgainst_prior1_opp', 
-'defYdsAgainst_prior1_opp', 'pos_TE', 'posRank_TE1', 'posRank_TE2', 'posRank_TE3']]
-
-#load saved model
-regressor = load('models/rfmodel_TE1.joblib')
-
-# Run model
-y_pred = regressor.predict(X)
-y_pred = pd.DataFrame(y_pred)
-y_pred.columns = labels
-y_pred
-
-# Calculate FANTASY scores
-# Define scoring multiplier based on league settings
-multiplier = [
-    0,0,.04,4,-2,2,.1,.1,6,2,.25,.1,6,2,-2,0,1,0,3,5,1,2,2,2,1.5,6,0,0,0,0,1,1
-]
-# Define bins for defensive PointsAgainst and YardsAgainst based on MFL scoring categories
-binList_defPts = [-5,0,6,13,17,21,27,34,45,59,99]
-binList_defYds = [0,274,324,375,425,999]
-# Define correlating scores for defensive PointsAgainst and YardsAgainst based on league settings
-ptList_defPts = [10,8,7,5,3,2,0,-1,-3,-5]
-ptList_defYds = [5,2,0,-2,-5]
-# Bin and cut the defensive predictions
-y_pred['defPtsBin'] = pd.cut(y_pred['defPtsAgainst'], bins=binList_defPts, include_lowest=True, labels=ptList_defPts)
-y_pred['defYdsBin'] = pd.cut(y_pred['defYdsAgainst'], bins=binList_defYds, include_lowest=True, labels=ptList_defYds)
-# Merge predictions with header columns so we know the players' position
-a_pred = header.merge(y_pred, left_index=True, right_index=True)
-# Assign value of zero to all non-defensive players' bins
-a_pred.loc[a_pred['pos']!='DF', 'defPtsBin'] = 0
-a_pred.loc[a_pred['pos']!='DF', 'defYdsBin'] = 0
-# Drop the header columns again
-a_pred = a_pred.drop(columns=['id_mfl', 'week','season','team','player','age','sharkRank','adp','pos','KR','PR','RES','posRank','opponent'])
-# Create function to apply scoring multiplier
-def multer(row):
-    return row.multiply(multiplier)
-# Apply scoring multiplier to predictions
-c = a_pred.apply(multer, axis=1)
-c = c.apply(np.sum, axis=1)
-c = pd.DataFrame(c, columns=['pred'])
-
-# Merge header columns with predictions
-TEdf = header.merge(c, left_index=True, right_index=True)
-
-# %%
-### PK Predictions
-# Read player model and ages
-xl2 = player_df.copy()
-# Select only one player position
-xl2 = xl2.loc[xl2.posRank.isin(['PK1', 'PK2', 'PK3'])]
-xl2 = xl2.loc[xl2.pos=='PK']
-xl2 = xl2.dropna()
-xl2.reset_index(inplace=True, drop=True)
-
-# Select features
-X = xl2[features]
-header = xl2[[
-    'id_mfl',
-    'season',
-    'week',
-    'team',
-    'player',
-    'age',
-    'sharkRank', 
-    'adp',
-    'KR',
-    'PR',
-    'RES',
-    'pos',
-    'posRank',
-    'opponent'
-]]
-
-# Encode categorical features
-X = pd.get_dummies(X, columns = ['pos', 'posRank'])
-
-# Check if there were the correct number of posRanks in the dataset
-for rank in ["posRank_PK1", "posRank_PK2", "posRank_PK3"]:
-    if rank not in list(X.columns):
-        X[rank] = 0
-
-# Make sure we have the necessary columns
-X = X[['week', 'age', 'passA_curr', 'passC_curr', 'passY_curr', 'passT_curr', 'passI_curr', 'pass2_curr', 'rushA_curr', 'rushY_curr', 
-'rushT_curr', 'rush2_curr', 'recC_curr', 'recY_curr', 'recT_curr', 'rec2_curr', 'fum_curr', 'XPA_curr', 'XPM_curr', 'FGA_curr', 'FGM_curr', 
-'FG50_curr', 'defSack_curr', 'defI_curr', 'defSaf_curr', 'defFum_curr', 'defBlk_curr', 'defT_curr', 'defPtsAgainst_curr', 
-'defPassYAgainst_curr', 'defRushYAgainst_curr', 'defYdsAgainst_curr', 'gamesPlayed_curr', 'gamesPlayed_prior1', 'passA_prior1', 
-'passC_prior1', 'passY_prior1', 'passT_prior1', 'passI_prior1', 'pass2_prior1', 'rushA_prior1', 'rushY_prior1', 'rushT_prior1', 
-'rush2_prior1', 'recC_prior1', 'recY_prior1', 'recT_prior1', 'rec2_prior1', 'fum_prior1', 'XPA_prior1', 'XPM_prior1', 'FGA_prior1', 
-'FGM_prior1', 'FG50_prior1', 'defSack_prior1', 'defI_prior1', 'defSaf_prior1', 'defFum_prior1', 'defBlk_prior1', 'defT_prior1', 
-'defPtsAgainst_prior1', 'defPassYAgainst_prior1', 'defRushYAgainst_prior1', 'defYdsAgainst_prior1', 'gamesPlayed_prior2', 'passA_prior2', 
-'passC_prior2', 'passY_prior2', 'passT_prior2', 'passI_prior2', 'pass2_prior2', 'rushA_prior2', 'rushY_prior2', 'rushT_prior2', 
-'rush2_prior2', 'recC_prior2', 'recY_prior2', 'recT_prior2', 'rec2_prior2', 'fum_prior2', 'XPA_prior2', 'XPM_prior2', 'FGA_prior2', 
-'FGM_prior2', 'FG50_prior2', 'defSack_prior2', 'defI_prior2', 'defSaf_prior2', 'defFum_prior2', 'defBlk_prior2', 'defT_prior2', 
-'defPtsAgainst_prior2', 'defPassYAgainst_prior2', 'defRushYAgainst_prior2', 'defYdsAgainst_prior2', 'defSack_curr_opp', 'defI_curr_opp', 
-'defSaf_curr_opp', 'defFum_curr_opp', 'defBlk_curr_opp', 'defT_curr_opp', 'defPtsAgainst_curr_opp', 'defPassYAgainst_curr_opp', 
-'defRushYAgainst_curr_opp', 'defYdsAgainst_curr_opp', 'defSack_prior1_opp', 'defI_prior1_opp', 'defSaf_prior1_opp', 'defFum_prior1_opp', 
-'defBlk_prior1_opp', 'defT_prior1_opp', 'defPtsAgainst_prior1_opp', 'defPassYAgainst_prior1_opp', 'defRushYAgainst_prior1_opp', 
-'defYdsAgainst_prior1_opp', 'pos_PK', 'posRank_PK1', 'posRank_PK2', 'posRank_PK3']]
-
-#load saved model
-regressor = load('models/rfmodel_PK1.joblib')
-
-# Run model
-y_pred = regressor.predict(X)
-y_pred = pd.DataFrame(y_pred)
-y_pred.columns = labels
-y_pred
-
-# Calculate FANTASY scores
-# Define scoring multiplier based on league settings
-multiplier = [
-    0,0,.04,4,-2,2,.1,.1,6,2,.25,.1,6,2,-2,0,1,0,3,5,1,2,2,2,1.5,6,0,0,0,0,1,1
-]
-# Define bins for defensive PointsAgainst and YardsAgainst based on MFL scoring categories
-binList_defPts = [-5,0,6,13,17,21,27,34,45,59,99]
-binList_defYds = [0,274,324,375,425,999]
-# Define correlating scores for defensive PointsAgainst and YardsAgainst based on league settings
-ptList_defPts = [10,8,7,5,3,2,0,-1,-3,-5]
-ptList_defYds = [5,2,0,-2,-5]
-# Bin and cut the defensive predictions
-y_pred['defPtsBin'] = pd.cut(y_pred['defPtsAgainst'], bins=binList_defPts, include_lowest=True, labels=ptList_defPts)
-y_pred['defYdsBin'] = pd.cut(y_pred['defYdsAgainst'], bins=binList_defYds, include_lowest=True, labels=ptList_defYds)
-# Merge predictions with header columns so we know the players' position
-a_pred = header.merge(y_pred, left_index=True, right_index=True)
-# Assign value of zero to all non-defensive players' bins
-a_pred.loc[a_pred['pos']!='DF', 'defPtsBin'] = 0
-a_pred.loc[a_pred['pos']!='DF', 'defYdsBin'] = 0
-# Drop the header columns again
-a_pred = a_pred.drop(columns=['id_mfl', 'week','season','team','player','age','sharkRank','adp','pos','KR','PR','RES','posRank','opponent'])
-# Create function to apply scoring multiplier
-def multer(row):
-    return row.multiply(multiplier)
-# Apply scoring multiplier to predictions
-c = a_pred.apply(multer, axis=1)
-c = c.apply(np.sum, axis=1)
-c = pd.DataFrame(c, columns=['pred'])
-
-# Merge header columns with predictions
-PKdf = header.merge(c, left_index=True, right_index=True)
-
-# %%
-### DF Predictions
-# Read player model and ages
-xl2 = player_df.copy()
-# Select only one player position
-xl2 = xl2.loc[xl2.posRank.isin(['DF1', 'DF2', 'DF3'])]
-xl2 = xl2.loc[xl2.pos=='DF']
-xl2 = xl2.dropna()
-xl2.reset_index(inplace=True, drop=True)
-
-# Select features
-X = xl2[features]
-header = xl2[[
-    'id_mfl',
-    'season',
-    'week',
-    'team',
-    'player',
-    'age',
-    'sharkRank', 
-    'adp',
-    'KR',
-    'PR',
-    'RES',
-    'pos',
-    'posRank',
-    'opponent'
-]]
-
-# Encode categorical features
-X = pd.get_dummies(X, columns = ['pos', 'posRank'])
-
-#load saved model
-regressor = load('models/rfmodel_DF1.joblib')
-
-# Run model
-y_pred = regressor.predict(X)
-y_pred = pd.DataFrame(y_pred)
-y_pred.columns = labels
-y_pred
-
-# Calculate FANTASY scores
-# Define scoring multiplier based on league settings
-multiplier = [
-    0,0,.04,4,-2,2,.1,.1,6,2,.25,.1,6,2,-2,0,1,0,3,5,1,2,2,2,1.5,6,0,0,0,0,1,1
-]
-# Define bins for defensive PointsAgainst and YardsAgainst based on MFL scoring categories
-binList_defPts = [-5,0,6,13,17,21,27,34,45,59,99]
-binList_defYds = [0,274,324,375,425,999]
-# Define correlating scores for defensive PointsAgainst and YardsAgainst based on league settings
-ptList_defPts = [10,8,7,5,3,2,0,-1,-3,-5]
-ptList_defYds = [5,2,0,-2,-5]
-# Bin and cut the defensive predictions
-y_pred['defPtsBin'] = pd.cut(y_pred['defPtsAgainst'], bins=binList_defPts, include_lowest=True, labels=ptList_defPts)
-y_pred['defYdsBin'] = pd.cut(y_pred['defYdsAgainst'], bins=binList_defYds, include_lowest=True, labels=ptList_defYds)
-# Merge predictions with header columns so we know the players' position
-a_pred = header.merge(y_pred, left_index=True, right_index=True)
-# Assign value of zero to all non-defensive players' bins
-a_pred.loc[a_pred['pos']!='DF', 'defPtsBin'] = 0
-a_pred.loc[a_pred['pos']!='DF', 'defYdsBin'] = 0
-# Drop the header columns again
-a_pred = a_pred.drop(columns=['id_mfl', 'week','season','team','player','age','sharkRank','adp','pos','KR','PR','RES','posRank','opponent'])
-# Create function to apply scoring multiplier
-def multer(row):
-    return row.multiply(multiplier)
-# Apply scoring multiplier to predictions
-c = a_pred.apply(multer, axis=1)
-c = c.apply(np.sum, axis=1)
-c = pd.DataFrame(c, columns=['pred'])
-
-# Merge header columns with predictions
-DFdf = header.merge(c, left_index=True, right_index=True)
-
-# %%
-# Merge all positions' predictions
-complete = pd.concat([WRdf, RBdf, QBdf, TEdf, PKdf, DFdf], axis=0)
+# Predict every position in one pass: one feature matrix, each position's saved model run on its rows
+complete = predictAll(player_df)
 complete
 
 # %%
@@ -1193,36 +594,12 @@ predictions
 
 # %%
 # Send predictions to database
-# Prepare predictions df
-# Build the SQL query that will list columns and datatypes
-string1 = [x + " VARCHAR(32)" for x in predictions.columns[:2]] + [
-    x + " SMALLINT" for x in predictions.columns[2:3]] + [
-    x + " VARCHAR(32)" for x in predictions.columns[3:9]] + [
-    x + " FLOAT(8)" for x in predictions.columns[9:]]
-string1 = str(string1)
-string1 = string1.replace("'", "")
-string1 = string1.replace("[", "")
-string1 = string1.replace("]", "")
-#print(f'CREATE TABLE IF NOT EXISTS predictions({string1})')
-
-
-# Write the df to the Postgresql database
-try:
-    # connect to database
-    conn = psycopg2.connect(DATABASE_URL, sslmode='require')
-    engine = create_engine(DATABASE_URL)
-    cursor = conn.cursor()
-    # Create table for schedule
-    cursor.execute(f'CREATE TABLE IF NOT EXISTS predictions({string1})')
-    conn.commit()
-    # Populate table with data
-    predictions.to_sql('predictions', engine, if_exists='replace', index = False)
-except Exception as error:
-    print(error)
-finally:
-    if conn:
-        cursor.close()
-        conn.close()
+# The rows are bulk loaded and indexed in a staging table, then swapped in atomically so the app never sees a missing or partial table
+# Roll back to the previous run with db.rollback_publish('predictions')
+# The memory-mappable Arrow snapshot for the web workers is written first, so it is in place when the publish notifies them
+version = db.new_version()
+snapshot.write_snapshot(predictions, 'predictions', version)
+db.publish_df(predictions, 'predictions', indexes=['id_mfl', 'pos'], version=version)
 
 # %%
 